@@ -26,13 +26,74 @@ ITALY_CAPITAL_GAINS_TAX = 0.26  # 26% tax on capital gains
 MT5_ACCOUNT     = "77777777"
 MT5_PASSWORD    = "password"
 MT5_SERVER      = "FirstPrudentialMarkets-Demo"
+MT5_SERVER_TIMEZONE = "Europe/Athens" #Broker server time of the deal timestamps (most brokers: GMT+2, GMT+3 in summer)
 MAGIC_NUMBER    = "09031994"
 LOT_SIZE        = 1.0
 SLIPPAGE        = 20
+MT5_TICK_CACHE_SECONDS = 1.0 #Reuse a symbol's tick for all profiles sent within this time
+
+#Market sessions: run each symbol's cycle this long after its exchange closes, retry while the new bar is missing
+SESSION_CLOSE_DELAY_MINUTES = 15
+SESSION_RETRY_MINUTES = 10
+SESSION_MAX_RETRIES = 6
+
+#Pipeline scheduler: max tasks running at the same time (threads for I/O, processes for CPU-bound stages, 0 = threads only)
+PIPELINE_WORKERS = 4
+PIPELINE_PROCESSES = 2
+
+#Paper trading: step the backtest position/stop state machine on every new bar (paper_trading.py)
+PAPER_TRADING = True
+
+#Backtest cache: reuse results of identical prices/signals and parameters (output/backtest_cache.sqlite, LRU beyond the size cap)
+BACKTEST_CACHE = True
+BACKTEST_CACHE_MB = 256
+
+#Parameter sweep (sweep.py): coordinator port and shared secret of a cluster (the channel runs pickles: keep it secret,
+#the SWEEP_AUTHKEY environment variable overrides it, empty = generated by the coordinator, local runs use a random one),
+#parameter sets per work unit, retries per unit, seconds a worker may hold a unit, local worker processes
+SWEEP_PORT = 6000
+SWEEP_AUTHKEY = ""
+SWEEP_BLOCK_SIZE = 64
+SWEEP_MAX_RETRIES = 3
+SWEEP_LEASE_SECONDS = 600
+SWEEP_WORKERS = 4
+#Workers on the coordinator's machine read prices from OS shared memory instead of receiving a copy (shared_arrays.py)
+SWEEP_SHARED_MEMORY = True
+
+#Successive-halving optimizer (optimizer.py): keep 1/HALVING_ETA of the parameter sets at every step,
+#bars of the first (shortest) span
+HALVING_ETA = 3
+HALVING_MIN_BARS = 126
+
+#Warm restart: checkpoint the bot's state (schedule, live engine, cycle counter) every CHECKPOINT_EVERY cycles and
+#resume from it on startup (checkpoint.py), zlib level of the checkpoint file
+CHECKPOINT_ENABLED = True
+CHECKPOINT_EVERY = 1
+CHECKPOINT_COMPRESSION = 6
+
+#Results store: keep every cycle's parameters, equity curves, trades and metrics in output/results.sqlite (results_store.py)
+RESULTS_STORE = True
+
+#Backtest outputs: 'csv' (equity_curve_*.csv, backtest_trades_*.csv) or 'columnar' (compressed binary files written in
+#chunks of RESULTS_CHUNK_ROWS rows, columnar.py), RESULTS_CSV also writes the CSV files in columnar mode
+RESULTS_FORMAT = 'csv'
+RESULTS_CSV = False
+RESULTS_CHUNK_ROWS = 65536
+RESULTS_COMPRESSION = 6
+
+#Low-memory mode: float32 prices/equity, per-symbol data released as soon as it is used (memory.py)
+LOW_MEMORY = False
+
+#Instrumentation: per stage/task timings and memory (output/instrumentation.jsonl and .prom)
+INSTRUMENTATION_ENABLED = True
 
 #Output directory for saving data
 OUTPUT_DIR      = "./output"
 
+#Intrabar stops: resolve the days whose range reaches the stop from minute bars (intrabar.py), stored per day here
+INTRABAR_STOPS = False
+MINUTE_DIR      = f"{OUTPUT_DIR}/minute"
+
 #Yfinance Config
 START_DATE      = "2018-01-01"
 
@@ -42,6 +103,13 @@ ROBO_LOW_RISK   = 0.018 #1,8% net returns from 01-01-2018, From MoneyFarm websit
 ROBO_MEDIUM_RISK = 0.349 #34,9% net returns from 01-01-2018, From MoneyFarm website (medium)    
 ROBO_HIGH_RISK  = 0.888 #88,8% net returns from 01-01-2018, From MoneyFarm website (high)
 
+#Portfolio aggregation: "intersection" (only dates common to all symbols) or "union" (all dates, forward-filled)
+PORTFOLIO_ALIGNMENT = "intersection"
+
+#Trading days per year (annualization) and rolling analytics window (trading days)
+TRADING_DAYS   = 252
+ROLLING_WINDOW = 252
+
 #Graphics Config
 FONT_CONFIG = {
     # Main elements
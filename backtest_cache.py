@@ -0,0 +1,134 @@
+#MEMOIZED BACKTEST RESULTS: SAME PRICE/SIGNAL ARRAYS + SAME PARAMETERS + SAME ENGINE VERSION = SAME RESULT
+
+#CACHE: 1. The key is a hash of the input arrays (dates, prices, signals), the profile's parameters (stop loss,
+#          trailing stop, commission, tax, capital) and backtesting.ENGINE_VERSION.
+#       2. Results (equity, trades, summary metrics) are pickled into output/backtest_cache.sqlite, shared by the
+#          worker processes; the total size is capped at BACKTEST_CACHE_MB, least recently used entries go first.
+#       3. Hits, misses and evictions are counted in the same file (python backtest_cache.py shows them).
+
+#Libraries
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+import lazy
+np = lazy.module('numpy')
+
+#Files
+from account_data import *
+
+#Config
+CACHE_PATH = f"{OUTPUT_DIR}/backtest_cache.sqlite"
+enabled = BACKTEST_CACHE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+_conn = None
+_conn_pid = None
+
+def enable(flag=True):
+    global enabled
+    enabled = flag
+
+#One connection per process (a connection must not be shared with forked workers)
+def _connection(path=CACHE_PATH):
+    global _conn, _conn_pid
+    if _conn is None or _conn_pid != os.getpid():
+        _conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.executescript(SCHEMA)
+        _conn_pid = os.getpid()
+    return _conn
+
+def _count(conn, name, n=1):
+    conn.execute("INSERT INTO stats (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?",
+                 (name, n, n))
+
+#Cache key of a set of arrays and a JSON-serializable parameter dict
+def fingerprint(arrays, params):
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode())
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(array.view(np.uint8))
+    return digest.hexdigest()
+
+#Cached result or None (a miss)
+def get(key):
+    if not enabled:
+        return None
+    conn = _connection()
+    row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        _count(conn, 'misses')
+        return None
+    conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+    _count(conn, 'hits')
+    return pickle.loads(row[0])
+
+#Store a result and evict the least recently used entries beyond BACKTEST_CACHE_MB
+def put(key, value):
+    if not enabled:
+        return
+    blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    conn = _connection()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("INSERT OR REPLACE INTO entries (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                     (key, blob, len(blob), time.time()))
+        evicted = conn.execute("""DELETE FROM entries WHERE key IN (
+                                      SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC) AS kept FROM entries)
+                                      WHERE kept > ?)""", (BACKTEST_CACHE_MB * 1024 * 1024,)).rowcount
+        if evicted:
+            _count(conn, 'evictions', evicted)
+
+#Hits, misses, evictions, hit rate, number and size of the entries
+def stats():
+    conn = _connection()
+    counts = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+    entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+    hits, misses = counts.get('hits', 0), counts.get('misses', 0)
+    return {'hits': hits, 'misses': misses, 'evictions': counts.get('evictions', 0),
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'entries': entries, 'size_mb': size / 1024 / 1024}
+
+def clear():
+    conn = _connection()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM entries")
+        conn.execute("DELETE FROM stats")
+    conn.execute("VACUUM")
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest cache statistics")
+    parser.add_argument('--clear', action='store_true', help="Drop every cached result and reset the statistics")
+    args = parser.parse_args()
+
+    if args.clear:
+        clear()
+    s = stats()
+    print(f"\n======= BACKTEST CACHE ({CACHE_PATH}) =======")
+    print(f"Hits      : {s['hits']} ({s['hit_rate']:.1%})")
+    print(f"Misses    : {s['misses']}")
+    print(f"Evictions : {s['evictions']}")
+    print(f"Entries   : {s['entries']} ({s['size_mb']:.1f} / {BACKTEST_CACHE_MB} MB)")
+
+if __name__ == "__main__":
+    main()
@@ -1,194 +1,240 @@
 #BACKTESTING TOOL FOR EVERY SYMBOL, CHECKS STRATEGY AND GENERATES P/L RESULTS
 
 #Libraries
-import pandas as pd
+import lazy
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
 
 #Files
 from account_data import *
+import backtest_cache
+import columnar
+import instrumentation
+import intrabar
+import memory
+import pac
+import positions
+import resample
 
 #Calculate and deducts taxes (Italy)
 def apply_italy_tax(equity_series, dates):
-    equity_after_tax = equity_series.copy()
+    return pd.Series(italy_tax(equity_series.to_numpy(), dates.year.to_numpy()), index=equity_series.index)
+
+#Same on arrays: equity before tax and the year of every bar (sorted dates), returns the equity after tax
+def italy_tax(equity, years):
+    equity_after_tax = np.array(equity, dtype=np.float64)
+    if len(equity_after_tax) == 0:
+        return equity_after_tax
     yearly_start_equity = INITIAL_DEPOSIT / len(SYMBOLS)  # Adjusted for split capital
-    
-    #Group by year
-    years = dates.year.unique()
-    
-    for year in years:
-        year_mask = dates.year == year
-        year_dates = dates[year_mask]
-        
-        if len(year_dates) == 0:
-            continue
-            
-        #Get last day of the year in our data
-        last_day_idx = year_dates[-1]
-        last_day_position = dates.get_loc(last_day_idx)
-        
-        if last_day_position >= len(equity_after_tax):
-            continue
-            
-        year_end_equity = equity_after_tax.iloc[last_day_position]
-        
+
+    #Last day of every year in our data
+    year_ends = np.flatnonzero(np.append(years[1:] != years[:-1], True))
+
+    for last_day_position in year_ends:
+        year_end_equity = equity_after_tax[last_day_position]
+
         #Calculate gain for the year
         yearly_gain = year_end_equity - yearly_start_equity
-        
+
         if yearly_gain > 0:
             #Apply 26% tax on gains
             tax_amount = yearly_gain * ITALY_CAPITAL_GAINS_TAX
-            
+
             #Deduct tax from equity for all subsequent days
-            equity_after_tax.iloc[last_day_position:] -= tax_amount
-            
+            equity_after_tax[last_day_position:] -= tax_amount
+
             #Update starting equity for next year (after tax)
-            yearly_start_equity = equity_after_tax.iloc[last_day_position]
+            yearly_start_equity = equity_after_tax[last_day_position]
         else:
             #No tax on losses, but update starting equity for next year
             yearly_start_equity = year_end_equity
-    
+
     return equity_after_tax
 
-def backtest_symbol(symbol, profile):
+#Same tax applied one calendar year at a time, as the years close (same values as italy_tax): year() takes a year's
+#equity before tax and returns it after tax, final from then on (later years only change later days)
+class YearlyTax:
+    def __init__(self):
+        self.start_equity = INITIAL_DEPOSIT / len(SYMBOLS)  # Adjusted for split capital
+        self.taxes = []  #Paid so far, deducted one after the other from every later day
+
+    def year(self, equity):
+        equity_after_tax = np.array(equity, dtype=np.float64)
+        for tax_amount in self.taxes:
+            equity_after_tax -= tax_amount
+
+        #Calculate gain for the year
+        yearly_gain = equity_after_tax[-1] - self.start_equity
+
+        if yearly_gain > 0:
+            #Apply 26% tax on gains, from the last day of the year
+            self.taxes.append(yearly_gain * ITALY_CAPITAL_GAINS_TAX)
+            equity_after_tax[-1] -= self.taxes[-1]
+
+        #Starting equity for next year (after tax; no tax on losses)
+        self.start_equity = equity_after_tax[-1]
+        return equity_after_tax
+
+#Bump when the backtest logic changes: cached results of older versions are not reused
+ENGINE_VERSION = 1
+
+#Parameters a backtest result depends on besides the price/signal arrays (part of the cache key)
+def backtest_params(profile, stop_loss=None, trail=None):
+    params = {'engine': ENGINE_VERSION, 'profile': profile, 'capital': INITIAL_DEPOSIT / len(SYMBOLS),
+              'commission': COMMISSION, 'tax': ITALY_CAPITAL_GAINS_TAX, 'low_memory': memory.enabled}
+    if profile == 'pac':
+        params['monthly_investment'] = PAC_MONTHLY_INVESTMENT / len(SYMBOLS)
+    else:
+        profile_idx = PROFILES.index(profile)
+        params.update({'stop_loss': STOP_LOSS[profile_idx] if stop_loss is None else stop_loss,
+                       'trail': TRAIL_PERCENT[profile_idx] if trail is None else trail})
+    return params
+
+#Equity curve, trades and summary of one profile on a signals frame, served from the cache when the same
+#arrays were already backtested with the same parameters (stop_loss/trail override the profile's)
+#sink: the equity curve goes to sink(frame) instead of the result (see simulate); a cached curve is passed whole
+def run_backtest(df, profile, stop_loss=None, trail=None, minute_bars=None, sink=None):
+    if minute_bars is not None:
+        return simulate(df, profile, stop_loss, trail, minute_bars, sink)  #Depends on the minute bars too: not cached
+    key = backtest_cache.fingerprint([df.index.to_numpy(), df['close'].to_numpy(), df['high'].to_numpy(),
+                                      df['low'].to_numpy(), df['Signal'].to_numpy()],
+                                     backtest_params(profile, stop_loss, trail))
+    result = backtest_cache.get(key)
+    if result is None:
+        result = simulate(df, profile, stop_loss, trail, sink=sink)
+        if sink is None:  #A streamed result keeps no equity curve to cache
+            backtest_cache.put(key, result)
+    elif sink is not None:
+        sink(result['equity'])
+        result = {**result, 'equity': None}
+    return result
+
+#Run the strategy bar by bar
+#minute_bars: resolve the stops of the days whose range reaches them from minute bars (intrabar.MinuteBars)
+#sink: called with the equity frame of every calendar year as soon as it is over (its tax is then final) instead of
+#keeping the curve, the result's equity is None (PAC plans are computed at once and passed whole)
+def simulate(df, profile, stop_loss=None, trail=None, minute_bars=None, sink=None):
     #Calculate max potential spending based on number of symbols
     capital_per_symbol = INITIAL_DEPOSIT / len(SYMBOLS)
-    
-    signals_path = f"{OUTPUT_DIR}/{symbol.lower().replace('^','')}_signals_{profile}.csv"
-    
-    try:
-        df = pd.read_csv(signals_path, index_col='date', parse_dates=True).sort_index()
-    except FileNotFoundError:
-        print(f"[WARNING] Signal file not found: {signals_path}")
-        return False
 
     if profile == 'pac':
-        #PAC Strategy: Buy fixed amount monthly, never sell, split monthly investment across symbols
+        #PAC Strategy: Buy fixed amount monthly, never sell, split monthly investment across symbols (pac.py)
         monthly_investment_per_symbol = PAC_MONTHLY_INVESTMENT / len(SYMBOLS)
-        
-        cash = capital_per_symbol
-        total_shares = 0
-        equity = []
-        trades = []
-        
-        for date, row in df.iterrows():
-            price = row['close']
-            signal = row['Signal']
-            
-            #Buy signal (first day of month)
-            if signal == 1 and cash >= monthly_investment_per_symbol:
-                #Account for commission when buying
-                shares_to_buy = monthly_investment_per_symbol / (price * (1 + COMMISSION))
-                commission_cost = shares_to_buy * price * COMMISSION
-                total_shares += shares_to_buy
-                cash -= monthly_investment_per_symbol
-                trades.append({'date': date, 'action': 'buy', 'price': price, 'amount': monthly_investment_per_symbol, 'shares': shares_to_buy, 'commission': commission_cost})
-            
-            #Daily equity (cash + value of holdings)
-            equity.append(cash + total_shares * price)
-        
+        equity, trades_df = pac.backtest(df, df['Signal'].to_numpy() == 1, monthly_investment_per_symbol, capital_per_symbol)
+
         #Detract taxes
-        equity_series = pd.Series(equity, index=df.index)
-        equity_after_tax = apply_italy_tax(equity_series, df.index)
-        equity = equity_after_tax.tolist()
-        
-    else:
-        #Original trading strategy: buy/sell following signals
-        cash = capital_per_symbol
-        position = 0
-        entry_price = sl_price = max_price = min_price = 0.0
-        profile_idx = PROFILES.index(profile)
-        stop_loss_pct = STOP_LOSS[profile_idx]
-        trail_pct = TRAIL_PERCENT[profile_idx]
+        equity = italy_tax(equity, df.index.year.to_numpy()).tolist()
 
-        equity = []
+    else:
+        #Original trading strategy: buy/sell following signals (positions.py holds the position/stop logic)
+        machine = positions.PositionStateMachine(profile, capital_per_symbol, stop_loss, trail)
+        tax = YearlyTax()
+        equity = []  #Current year, before tax
+        years_after_tax = []
         trades = []
 
-        for date, row in df.iterrows():
-            price, high, low, signal = row['close'], row['high'], row['low'], row['Signal']
-
-            #Trailing stop update
-            if position > 0:                                    
-                max_price = max(max_price, high)
-                sl_price = max(sl_price, max_price * (1 - trail_pct))
-            elif position < 0:                                 
-                min_price = min(min_price, low)
-                sl_price = min(sl_price, min_price * (1 + trail_pct))
-
-            #Stop-loss check
-            if position > 0 and low <= sl_price:
-                pnl = position * (sl_price - entry_price)
-                commission_cost = position * sl_price * COMMISSION
-                cash = position * sl_price - commission_cost
-                trades.append({'date': date, 'action': 'sell (SL)', 'price': sl_price, 'pnl': pnl, 'commission': commission_cost})
-                position = 0
-            elif position < 0 and high >= sl_price:
-                pnl = abs(position) * (entry_price - sl_price)
-                commission_cost = abs(position) * sl_price * COMMISSION
-                cash += abs(position) * sl_price - commission_cost
-                trades.append({'date': date, 'action': 'buy (SL)', 'price': sl_price, 'pnl': pnl, 'commission': commission_cost})
-                position = 0
-
-            #New entries (only when flat)
-            if position == 0:
-                if signal == 1:                                      
-                    shares = cash / (price * (1 + COMMISSION))  #Account for commission on entry
-                    position = shares
-                    entry_price = price
-                    commission_cost = shares * price * COMMISSION
-                    sl_price = price * (1 - stop_loss_pct)
-                    max_price = price
-                    trades.append({'date': date, 'action': 'buy', 'price': price, 'pnl': 0, 'commission': commission_cost})
-                    cash = 0
-                elif signal == -1:
-                    shares = cash / (price * (1 + COMMISSION))  #Account for commission on entry
-                    position = -shares
-                    entry_price = price
-                    commission_cost = shares * price * COMMISSION
-                    sl_price = price * (1 + stop_loss_pct)
-                    min_price = price
-                    trades.append({'date': date, 'action': 'sell', 'price': price, 'pnl': 0, 'commission': commission_cost})
-                    cash += shares * price - commission_cost
+        year_ends = iter((np.flatnonzero(np.append(df.index.year[1:] != df.index.year[:-1], True)) + 1).tolist())
+        next_year_end = next(year_ends, None)
+        bars = zip(df.index, df['close'].tolist(), df['high'].tolist(), df['low'].tolist(), df['Signal'].tolist())
+        for i, (date, price, high, low, signal) in enumerate(bars, 1):
+            minutes = minute_bars.day(date) if minute_bars is not None and minute_bars.needed(machine, high, low) else None
+            if minutes is not None:
+                fills = machine.step_intrabar(date, minutes, price, signal)
+            else:
+                fills = machine.step(date, price, high, low, signal)
+            if fills:
+                trades.extend(fills)
 
             #Daily equity
-            equity.append(cash + position * price)
-        
-        #Deduct taxes (italy)
-        equity_series = pd.Series(equity, index=df.index)
-        equity_after_tax = apply_italy_tax(equity_series, df.index)
-        equity = equity_after_tax.tolist()
+            equity.append(machine.equity(price))
 
-    #Save results
-    equity_df = pd.DataFrame({'date': df.index, 'close': df['close'], 'equity': equity}).set_index('date')
-    trades_df = pd.DataFrame(trades)
+            #Year over: deduct taxes (italy)
+            if i == next_year_end:
+                equity_after_tax = tax.year(equity)
+                if sink is None:
+                    years_after_tax.append(equity_after_tax)
+                else:
+                    rows = slice(i - len(equity), i)
+                    year_df = memory.compact(pd.DataFrame({'date': df.index[rows], 'close': df['close'].iloc[rows],
+                                                           'equity': equity_after_tax}).set_index('date'))
+                    final_equity = year_df['equity'].iloc[-1]
+                    sink(year_df)
+                equity = []
+                next_year_end = next(year_ends, None)
 
-    equity_df.to_csv(f"{OUTPUT_DIR}/equity_curve_{symbol.lower().replace('^','')}_{profile}.csv")
-    trades_df.to_csv(f"{OUTPUT_DIR}/backtest_trades_{symbol.lower().replace('^','')}_{profile}.csv", index=False)
+        if sink is None:
+            equity = np.concatenate(years_after_tax).tolist() if years_after_tax else []
+        trades_df = pd.DataFrame(trades)
+
+    equity_df = None
+    if sink is None or profile == 'pac':
+        equity_df = memory.compact(pd.DataFrame({'date': df.index, 'close': df['close'], 'equity': equity}).set_index('date'))
+        final_equity = equity_df['equity'].iloc[-1]
+        if sink is not None:
+            sink(equity_df)
+            equity_df = None
 
-    print(f"{symbol} — {profile} backtest completed")
-    
     #Summary calculations
     if profile == 'pac':
-        total_invested = capital_per_symbol + (len(trades) * monthly_investment_per_symbol)
-        total_closed = len(trades)
+        total_closed = len(trades_df)
         win_rate = 0  # N/A for PAC
     else:
         total_closed = len(trades_df[trades_df['pnl'] != 0]) if 'pnl' in trades_df.columns else 0
         winning_trades = len(trades_df[trades_df['pnl'] > 0]) if 'pnl' in trades_df.columns else 0
         win_rate = winning_trades / total_closed if total_closed > 0 else 0
+
+    summary = {'final_equity': final_equity, 'total_pnl': final_equity - capital_per_symbol,
+               'total_closed': total_closed, 'win_rate': win_rate}
+    return {'equity': equity_df, 'trades': trades_df, 'summary': summary}
+
+@instrumentation.timed('backtest')
+def backtest_symbol(symbol, profile, timeframe='D'):
+    #Calculate max potential spending based on number of symbols
+    capital_per_symbol = INITIAL_DEPOSIT / len(SYMBOLS)
+    tf = resample.suffix(timeframe)
+    
+    signals_path = f"{OUTPUT_DIR}/{symbol.lower().replace('^','')}_signals_{profile}{tf}.csv"
     
-    total_pnl = equity_df['equity'].iloc[-1] - capital_per_symbol
-    final_equity = equity_df['equity'].iloc[-1]
+    try:
+        if profile == 'pac':
+            #No signals file: purchase days come from the prices
+            signals_path = resample.timeframe_path(symbol, 'D')
+            df = resample.load(symbol, timeframe)
+            df['Signal'] = pac.schedule(df.index).astype(memory.SIGNAL_DTYPE)
+        else:
+            df = memory.compact(pd.read_csv(signals_path, index_col='date', parse_dates=True).sort_index())
+    except FileNotFoundError:
+        print(f"[WARNING] Signal file not found: {signals_path}")
+        return False
+    instrumentation.set_rows(len(df))
+
+    #Minute bars refine daily stops only
+    minute_bars = intrabar.MinuteBars(symbol) if INTRABAR_STOPS and profile != 'pac' and timeframe == 'D' else None
+    #Save results: columnar equity curves are written year by year while the backtest runs
+    if RESULTS_FORMAT == 'columnar':
+        with columnar.ResultWriter(symbol, profile, 'equity', timeframe) as writer:
+            result = run_backtest(df, profile, minute_bars=minute_bars, sink=writer.append)
+    else:
+        result = run_backtest(df, profile, minute_bars=minute_bars)
+        columnar.write_result(result['equity'], symbol, profile, 'equity', timeframe)
+    columnar.write_result(result['trades'], symbol, profile, 'trades', timeframe)
+    summary = result['summary']
+
+    print(f"{symbol} — {profile} backtest completed")
     
     #Print summary
+    total_pnl = summary['total_pnl']
     print(f"\n======= {symbol} {profile.upper()} =======")
     print(f"Initial capital : ${capital_per_symbol:,.2f} (${INITIAL_DEPOSIT:,.2f} / {len(SYMBOLS)} symbols)")
     if profile == 'pac':
+        total_invested = capital_per_symbol + (summary['total_closed'] * PAC_MONTHLY_INVESTMENT / len(SYMBOLS))
         print(f"Total invested  : ${total_invested:,.2f}")
-        print(f"Monthly buys    : {total_closed}")
-    print(f"Final equity    : ${final_equity:,.2f}")
+        print(f"Monthly buys    : {summary['total_closed']}")
+    print(f"Final equity    : ${summary['final_equity']:,.2f}")
     print(f"Total P/L       : ${total_pnl:,.2f} ({total_pnl / capital_per_symbol * 100:+.2f}%)")
     if profile != 'pac':
-        print(f"Number of trades: {total_closed}")
-        print(f"Win rate        : {win_rate:.1%}")
+        print(f"Number of trades: {summary['total_closed']}")
+        print(f"Win rate        : {summary['win_rate']:.1%}")
     print()
     
     return True
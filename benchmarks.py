@@ -0,0 +1,295 @@
+#STAGE-LEVEL BENCHMARKS ON SYNTHETIC DATA, WITH RESULTS STORED AS JSON AND REGRESSION CHECKS BETWEEN COMMITS
+
+#BENCHMARKS: 1. Generates synthetic OHLCV price stores (geometric Brownian motion) for N symbols x M bars in a
+#               temporary working directory: runs offline and never touches ./output.
+#            2. Scales the pipeline through the shared config lists (SYMBOLS, PROFILES and the per-profile
+#               parameters are changed in place and restored at the end).
+#            3. The backtest cache is off except in backtest_cached (all backtests again on a warm cache), so the
+#               other stages always measure the real work.
+#            4. Times every stage (best and mean of --repeat runs) and writes the results to a JSON file.
+#            5. --compare: fails (exit code 1) if a stage is slower than the baseline by more than --threshold.
+#            6. Peak resident memory is recorded per stage (Linux) and for the whole run, --low-memory runs the
+#               pipeline in low-memory mode (memory.py) to compare both.
+#            7. write_csv/write_columnar write every backtest output again in one format (columnar.py) and also
+#               record the rows written per second and the disk used.
+
+#Libraries
+import os
+os.environ.setdefault('MPLBACKEND', 'Agg')  #Headless charts for the full cycle
+import argparse
+import contextlib
+import io
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+#Files
+import account_data
+from account_data import *
+import backtest_cache
+import columnar
+import instrumentation
+import market_sessions
+import memory
+
+#Config
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results")
+DEFAULT_STAGES = ['import_cache', 'signals', 'backtest_pac', 'backtest_trading', 'backtest_cached', 'write_csv',
+                  'write_columnar', 'italy_tax', 'metrics', 'portfolio', 'run_cycle', 'run_cycle_unchanged']
+WRITE_STAGES = {'write_csv': 'csv', 'write_columnar': 'columnar'}
+PROFILE_PARAMS = ['SHORT_MA', 'LONG_MA', 'RSI_PERIOD', 'RSI_OVERBOUGHT', 'RSI_OVERSOLD']
+TRADING_PARAMS = ['STOP_LOSS', 'TRAIL_PERCENT', 'TAKE_PROFIT']  #No PAC entry
+
+#Synthetic daily bars ending at the last closed session (so the price store is up to date and never downloaded)
+def synthetic_prices(bars, seed, end_date):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=end_date, periods=bars, name='date')
+    returns = rng.normal(0.0003, 0.012, bars)
+    close = 1000 * np.exp(np.cumsum(returns))
+    open_ = close * np.exp(rng.normal(0, 0.003, bars))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.005, bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.005, bars)))
+    volume = rng.integers(1_000_000, 5_000_000, bars)
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}, index=dates)
+
+#Point the shared config lists at the synthetic universe (restored on exit). Worker processes see it when forked
+#(Linux), spawned workers (Windows/macOS) import the original config
+@contextlib.contextmanager
+def scaled_config(symbols, profiles):
+    saved = {name: list(getattr(account_data, name)) for name in ['SYMBOLS', 'PROFILES'] + PROFILE_PARAMS + TRADING_PARAMS}
+    saved_exchanges = dict(market_sessions.SYMBOL_EXCHANGE)
+    try:
+        indexes = [saved['PROFILES'].index(p) for p in profiles]
+        account_data.SYMBOLS[:] = symbols
+        account_data.PROFILES[:] = profiles
+        for name in PROFILE_PARAMS:
+            getattr(account_data, name)[:] = [saved[name][i] for i in indexes]
+        for name in TRADING_PARAMS:
+            getattr(account_data, name)[:] = [saved[name][i] for i in indexes if i < len(saved[name])]
+        market_sessions.SYMBOL_EXCHANGE.update({sym: 'XNYS' for sym in symbols})
+        yield
+    finally:
+        for name, values in saved.items():
+            getattr(account_data, name)[:] = values
+        market_sessions.SYMBOL_EXCHANGE.clear()
+        market_sessions.SYMBOL_EXCHANGE.update(saved_exchanges)
+
+#Best and mean wall time of a stage, and its peak resident memory where it can be measured
+def time_stage(func, repeat, setup=None):
+    times = []
+    reset = instrumentation.reset_peak_rss()
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+    result = {'best_s': min(times), 'mean_s': sum(times) / len(times), 'runs': len(times)}
+    if reset:
+        result['peak_rss_mb'] = instrumentation.peak_rss_mb()
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+#Run the selected stages on a synthetic universe, returns the results record
+def run_benchmarks(n_symbols=5, bars=1500, profiles=None, repeat=3, stages=DEFAULT_STAGES, seed=0):
+    profiles = profiles or list(PROFILES)
+    symbols = [f"^SYN{i:04d}" for i in range(n_symbols)]
+    trading = [p for p in profiles if p != 'pac']
+    workdir = tempfile.mkdtemp(prefix="trading_bench_")
+    cwd = os.getcwd()
+    results = {}
+    cache_enabled = backtest_cache.enabled
+
+    try:
+        backtest_cache.enable(False)
+        os.chdir(workdir)
+        os.makedirs(OUTPUT_DIR)
+        with scaled_config(symbols, profiles):
+            import import_data, signals_generation, backtesting, metrics, portfolio, main as bot
+
+            end_date = market_sessions.last_session_date(symbols[0])
+            for i, sym in enumerate(symbols):
+                synthetic_prices(bars, seed + i, end_date).to_csv(signals_generation.historical_path(sym))
+
+            #Stages run in pipeline order, each one uses the outputs of the previous ones
+            def backtest_all(profile_list):
+                for sym in symbols:
+                    for profile in profile_list:
+                        backtesting.backtest_symbol(sym, profile)
+
+            equity_series = pd.Series(np.linspace(INITIAL_DEPOSIT, 2 * INITIAL_DEPOSIT, bars) / len(symbols),
+                                      index=pd.bdate_range(end=end_date, periods=bars))
+            loaded = {}
+
+            def load_and_compute_metrics():
+                loaded['matrix'] = metrics.load_equity_matrix(symbols, profiles)
+                metrics.compute_metrics(*loaded['matrix'])
+
+            def backtest_cached():
+                backtest_cache.enable(True)
+                try:
+                    backtest_all(profiles)
+                finally:
+                    backtest_cache.enable(False)
+
+            #Backtest outputs as the backtests return them (trade dates as timestamps), written again per format
+            outputs = {'frames': None}
+
+            def load_outputs():
+                if not os.path.exists(columnar.result_path(symbols[-1], profiles[-1], 'trades')):
+                    signals_generation.main()
+                    backtest_all(profiles)
+                outputs['frames'] = []
+                for sym in symbols:
+                    for profile in profiles:
+                        try:
+                            trades = columnar.read_result(sym, profile, 'trades')
+                        except pd.errors.EmptyDataError:  #No trades
+                            trades = pd.DataFrame()
+                        if 'date' in trades:
+                            trades['date'] = pd.to_datetime(trades['date'])
+                        outputs['frames'] += [(sym, profile, 'equity', columnar.read_result(sym, profile, 'equity')),
+                                              (sym, profile, 'trades', trades)]
+
+            def write_outputs(fmt):
+                outputs[fmt] = [path for sym, profile, kind, frame in outputs['frames']
+                                for path in columnar.write_result(frame, sym, profile, kind, fmt=fmt)]
+
+            def reset_pipeline_state():
+                if os.path.exists(bot.scheduler.STATE_PATH):
+                    os.remove(bot.scheduler.STATE_PATH)
+
+            benchmarks = {
+                'import_cache': (lambda: [import_data.fetch_and_save_yfinance_data(sym) for sym in symbols], None),
+                'signals': (signals_generation.main, None),
+                'backtest_pac': (lambda: backtest_all(['pac'] if 'pac' in profiles else []), None),
+                'backtest_trading': (lambda: backtest_all(trading), None),
+                'backtest_cached': (backtest_cached, None),
+                'write_csv': (lambda: write_outputs('csv'), None),
+                'write_columnar': (lambda: write_outputs('columnar'), None),
+                'italy_tax': (lambda: [backtesting.apply_italy_tax(equity_series, equity_series.index) for _ in symbols], None),
+                'metrics': (load_and_compute_metrics, None),
+                'portfolio': (lambda: portfolio.build_portfolios(loaded['matrix'][0]), None),
+                'run_cycle': (bot.run_cycle, reset_pipeline_state),
+                'run_cycle_unchanged': (bot.run_cycle, None),
+            }
+            for stage in stages:
+                if stage == 'portfolio' and 'matrix' not in loaded:
+                    load_and_compute_metrics()
+                if stage == 'backtest_cached':
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        backtest_cached()  #Warm up
+                if stage in WRITE_STAGES and outputs['frames'] is None:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        load_outputs()
+                func, setup = benchmarks[stage]
+                results[stage] = time_stage(func, repeat, setup)
+                memory_note = f" | peak {results[stage]['peak_rss_mb']:.0f} MB" if 'peak_rss_mb' in results[stage] else ""
+                if stage in WRITE_STAGES:
+                    rows = sum(len(frame) for _, _, _, frame in outputs['frames'])
+                    disk_mb = sum(os.path.getsize(path) for path in outputs[WRITE_STAGES[stage]]) / 2**20
+                    results[stage].update(rows=rows, rows_per_s=rows / results[stage]['best_s'], disk_mb=disk_mb)
+                    memory_note += f" | {results[stage]['rows_per_s']:,.0f} rows/s | {disk_mb:.2f} MB on disk"
+                print(f"{stage:<22} best {results[stage]['best_s']:.4f}s | mean {results[stage]['mean_s']:.4f}s{memory_note}")
+
+        #Per-stage measurements restart the peak, so the run peak is the largest of them
+        peaks = [result['peak_rss_mb'] for result in results.values() if 'peak_rss_mb' in result]
+        peak_rss = max(peaks + [instrumentation.peak_rss_mb() or 0]) if peaks else instrumentation.peak_rss_mb()
+    finally:
+        backtest_cache.enable(cache_enabled)
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'scale': {'symbols': n_symbols, 'bars': bars, 'profiles': profiles, 'repeat': repeat, 'low_memory': memory.enabled},
+        'peak_rss_mb': peak_rss,
+        'results': results,
+    }
+
+#Stages slower than the baseline by more than threshold (best times, same scale only),
+#differences below min_delta seconds are timer noise
+def compare(record, baseline, threshold, min_delta=0.005):
+    if record['scale'] != baseline['scale']:
+        print(f"[WARNING] Baseline scale {baseline['scale']} differs from {record['scale']}, comparison skipped")
+        return []
+    regressions = []
+    for stage, result in record['results'].items():
+        base = baseline['results'].get(stage)
+        if base is None:
+            continue
+        change = result['best_s'] / base['best_s'] - 1 if base['best_s'] > 0 else 0.0
+        regression = change > threshold and result['best_s'] - base['best_s'] > min_delta
+        print(f"{stage:<22} {base['best_s']:.4f}s -> {result['best_s']:.4f}s ({change:+.1%}) {'REGRESSION' if regression else ''}")
+        if regression:
+            regressions.append(stage)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic data")
+    parser.add_argument('--symbols', type=int, default=5)
+    parser.add_argument('--bars', type=int, default=1500)
+    parser.add_argument('--profiles', default=','.join(PROFILES), help="Comma separated subset of PROFILES")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--stages', default=','.join(DEFAULT_STAGES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--low-memory', action='store_true', help="Run the pipeline in low-memory mode")
+    parser.add_argument('--output', default=None, help="Results file (default benchmark_results/<commit>.json)")
+    parser.add_argument('--compare', default=None, help="Baseline results file")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown vs the baseline (0.2 = 20%%)")
+    parser.add_argument('--min-delta', type=float, default=0.005, help="Ignore slowdowns below this many seconds")
+    args = parser.parse_args()
+
+    profiles = [p.strip() for p in args.profiles.split(',') if p.strip()]
+    unknown = [p for p in profiles if p not in PROFILES]
+    if unknown:
+        parser.error(f"Unknown profiles: {unknown}")
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    unknown = [s for s in stages if s not in DEFAULT_STAGES]
+    if unknown:
+        parser.error(f"Unknown stages: {unknown}")
+
+    if args.low_memory:
+        memory.enable()
+
+    print(f"\n======= BENCHMARKS ({args.symbols} symbols x {args.bars} bars x {len(profiles)} profiles"
+          f"{', low memory' if memory.enabled else ''}) =======")
+    record = run_benchmarks(args.symbols, args.bars, profiles, args.repeat, stages, args.seed)
+    if record['peak_rss_mb'] is not None:
+        print(f"Peak RSS               {record['peak_rss_mb']:.0f} MB")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{record['commit'] or datetime.now().strftime('%Y%m%d%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(record, f, indent=1)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\n======= COMPARISON WITH {baseline.get('commit')} (threshold {args.threshold:.0%}) =======")
+        regressions = compare(record, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print(f"[ERROR] Slower than the baseline: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#WARM RESTART: THE BOT'S IN-MEMORY STATE SAVED ATOMICALLY AFTER EVERY CYCLE AND RESTORED ON STARTUP
+
+#CHECKPOINT: 1. State: cycle counter, next trigger and retries per symbol, the live engine (rolling indicators,
+#               position/stop state machines), last bar fed to it per symbol, and references to the price files
+#               (path, size, mtime) instead of the price arrays.
+#            2. Format: header (magic, format version, CRC32) + zlib-compressed pickle, written to a temporary file,
+#               fsynced and renamed over the previous checkpoint (a crash leaves the old or the new one, never half).
+#            3. On startup the bot resumes the schedule (missed triggers run at once, the others wait) instead of
+#               running a catch-up cycle for every symbol; the engine only takes the bars added since the checkpoint.
+#               A checkpoint of another format or strategy configuration is ignored (cold start).
+
+#Libraries
+import hashlib
+import os
+import pickle
+import struct
+import time
+import zlib
+
+#Files
+from account_data import *
+import live_engine
+import signals_generation
+
+#Config
+CHECKPOINT_PATH = f"{OUTPUT_DIR}/bot_checkpoint.bin"
+MAGIC = b"TBOT"
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHI')  #magic, format version, CRC32 of the payload
+
+#Fingerprint of the settings the engine state depends on (a checkpoint taken with other settings is discarded)
+def config_fingerprint(symbols=SYMBOLS):
+    settings = (symbols, PROFILES, SHORT_MA, LONG_MA, RSI_PERIOD, RSI_OVERBOUGHT, RSI_OVERSOLD, STOP_LOSS,
+                TRAIL_PERCENT, TAKE_PROFIT, INITIAL_DEPOSIT, COMMISSION)
+    return hashlib.sha1(repr(settings).encode()).hexdigest()
+
+def save(state, path=CHECKPOINT_PATH):
+    payload = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), CHECKPOINT_COMPRESSION)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, zlib.crc32(payload)))
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(payload) + HEADER.size
+
+#Saved state, None if there is none or it cannot be used
+def load(path=CHECKPOINT_PATH):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    if len(data) < HEADER.size:
+        print(f"[WARNING] Checkpoint {path} is truncated, cold start")
+        return None
+    magic, version, crc = HEADER.unpack_from(data)
+    payload = data[HEADER.size:]
+    if magic != MAGIC or version != FORMAT_VERSION or zlib.crc32(payload) != crc:
+        print(f"[WARNING] Checkpoint {path} has another format or is corrupted, cold start")
+        return None
+    try:
+        return pickle.loads(zlib.decompress(payload))
+    except Exception as e:
+        print(f"[WARNING] Checkpoint {path} cannot be read ({e}), cold start")
+        return None
+
+#State of a fresh start: every symbol due now, engine without history
+def cold_state(symbols=SYMBOLS, now=None):
+    return {'config': config_fingerprint(symbols), 'saved_at': None, 'cycle_count': 0,
+            'schedule': {sym: now for sym in symbols}, 'retries': {sym: 0 for sym in symbols},
+            'engine': live_engine.LiveEngine(symbols), 'last_bar': {}, 'prices': {}}
+
+#Checkpointed state if it matches the current settings, otherwise a cold one
+def restore(symbols=SYMBOLS, now=None, path=CHECKPOINT_PATH):
+    state = load(path)
+    if state is not None and state.get('config') != config_fingerprint(symbols):
+        print("[WARNING] Checkpoint taken with other symbols or strategy settings, cold start")
+        state = None
+    if state is None:
+        return cold_state(symbols, now)
+    age = (time.time() - state['saved_at']) / 3600
+    print(f"[INFO] Resumed from checkpoint: cycle #{state['cycle_count']}, saved {age:.1f} hours ago")
+    return state
+
+def _file_ref(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+#Feed the engine the bars of the price store it has not seen yet, returns the order intents they generated
+#(price files unchanged since the last sync are not read; a symbol whose past bars changed is replayed from scratch)
+def sync_engine(state, symbols=SYMBOLS):
+    engine, last_bar = state['engine'], state['last_bar']
+    intents = []
+    for sym in symbols:
+        path = signals_generation.historical_path(sym)
+        ref = _file_ref(path)
+        if ref is None or state['prices'].get(sym) == ref:
+            continue
+        df = signals_generation.load_prices(sym)
+
+        seen = last_bar.get(sym)
+        if seen is not None and (seen[0] not in df.index or df.at[seen[0], 'close'] != seen[1]):
+            print(f"[WARNING] {sym}: price history changed, replaying it in the live engine")
+            engine.states[sym] = live_engine.LiveEngine([sym]).states[sym]
+            seen = None
+        new = df if seen is None else df[df.index > seen[0]]
+
+        for bar in zip(new.index, new['open'].tolist(), new['high'].tolist(), new['low'].tolist(), new['close'].tolist()):
+            intents.extend(engine.on_bar(live_engine.Bar(sym, *bar)))
+        if len(df):
+            last_bar[sym] = (df.index[-1], df['close'].iloc[-1])
+        state['prices'][sym] = ref
+    return intents
+
+#Checkpoint the bot's state, returns the bytes written
+def checkpoint(state, path=CHECKPOINT_PATH):
+    state['saved_at'] = time.time()
+    return save(state, path)
@@ -0,0 +1,145 @@
+#COMMAND LINE ENTRY POINT: ONE SUBCOMMAND PER STAGE, EACH ONE LOADS ONLY THE MODULES IT NEEDS
+
+#CLI: 1. Single-task commands (latest signal, one order, one symbol's signals/backtest) start in well under 200 ms:
+#        pandas/TA-Lib are loaded on first use (lazy.py) and matplotlib only by the graphs stage.
+#     2. Whole-pipeline commands (cycle, bot) are the same as running main.py.
+#     Examples: python cli.py latest ^SPX --profile high
+#               python cli.py signals ^NDX
+#               python cli.py order ^GDAXI --profile low
+
+#Libraries
+import argparse
+import sys
+
+#Files
+from account_data import *
+import resample
+
+def profiles_of(args):
+    return [args.profile] if args.profile else PROFILES
+
+def cmd_fetch(args):
+    import import_data
+    for sym in args.symbols or SYMBOLS:
+        import_data.fetch_and_save_yfinance_data(sym)
+
+def cmd_signals(args):
+    import signals_generation
+    for sym in args.symbols or SYMBOLS:
+        df_base = signals_generation.load_prices(sym, args.timeframe)
+        for profile in profiles_of(args):
+            signals_generation.generate_signals(sym, profile, df_base, args.timeframe)
+
+def cmd_backtest(args):
+    import backtesting
+    results = [backtesting.backtest_symbol(sym, profile, args.timeframe)
+               for sym in args.symbols or SYMBOLS for profile in profiles_of(args)]
+    return all(results)
+
+def cmd_latest(args):
+    import metatrader_integration
+    for sym in args.symbols or SYMBOLS:
+        for profile in profiles_of(args):
+            state = metatrader_integration.get_latest_state(sym, profile)
+            if state is None:
+                print(f"{sym:<8} {profile:<7} no bars")
+                continue
+            signal = metatrader_integration.get_latest_signal(sym, profile)
+            print(f"{sym:<8} {profile:<7} {state['bar_date']}  signal {signal:+d}  close {state['close']:.2f}")
+
+def cmd_order(args):
+    import metatrader_integration
+    signal = metatrader_integration.get_latest_signal(args.symbol, args.profile)
+    result = metatrader_integration.send_order_to_mt5(signal, args.symbol, args.profile)
+    return result['status'] != 'error'
+
+def cmd_metrics(args):
+    import metrics
+    metrics.main()
+
+def cmd_graphs(args):
+    import print_graphs
+    print_graphs.main(args.run)
+
+def cmd_runs(args):
+    import results_store
+    print(results_store.list_runs().to_string(index=False))
+
+def cmd_best(args):
+    import results_store
+    print(results_store.best(args.metric, args.profile, args.start, args.end, args.top, ascending=args.ascending)
+          .to_string(index=False))
+
+def cmd_cache(args):
+    import backtest_cache
+    if args.clear:
+        backtest_cache.clear()
+    print(backtest_cache.stats())
+
+def cmd_paper(args):
+    import paper_trading
+    for sym in args.symbols or SYMBOLS:
+        paper_trading.update_symbol(sym)
+    print(paper_trading.positions_table().to_string(index=False))
+
+def cmd_sessions(args):
+    import market_sessions
+    market_sessions.main()
+
+def cmd_cycle(args):
+    import main
+    return main.run_cycle()
+
+def cmd_bot(args):
+    import main
+    main.main()
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Trading bot stages")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add(name, func, help, symbols=True, profile=False):
+        command = commands.add_parser(name, help=help)
+        if symbols:
+            command.add_argument('symbols', nargs='*', help="Symbols (default: all SYMBOLS)")
+        if profile:
+            command.add_argument('--profile', choices=PROFILES, help="Single profile (default: all PROFILES)")
+        command.set_defaults(func=func)
+        return command
+
+    add('fetch', cmd_fetch, "Update the price store")
+    for name, func, help in (('signals', cmd_signals, "Generate signals"),
+                             ('backtest', cmd_backtest, "Backtest from the saved signals")):
+        command = add(name, func, help, profile=True)
+        command.add_argument('--timeframe', choices=['D', *resample.TIMEFRAMES], default='D',
+                             help="Bars: daily store or a cached timeframe of it (resample.py)")
+    add('latest', cmd_latest, "Show the latest signal", profile=True)
+    order = add('order', cmd_order, "Send the latest signal of one symbol/profile to MT5", symbols=False)
+    order.add_argument('symbol')
+    order.add_argument('--profile', choices=PROFILES, required=True)
+    add('metrics', cmd_metrics, "Compute the performance metrics", symbols=False)
+    graphs = add('graphs', cmd_graphs, "Metrics and all the charts", symbols=False)
+    graphs.add_argument('--run', type=int, default=None, help="Draw a stored run (results store)")
+    add('runs', cmd_runs, "List the stored runs", symbols=False)
+    best = add('best', cmd_best, "Rank stored results by a metric across runs", symbols=False, profile=True)
+    best.add_argument('metric', help="e.g. 'Sharpe Ratio'")
+    best.add_argument('--start', default=None, help="Period start (YYYY-MM-DD), metrics recomputed on the period")
+    best.add_argument('--end', default=None)
+    best.add_argument('--top', type=int, default=10)
+    best.add_argument('--ascending', action=argparse.BooleanOptionalAction, default=None,
+                      help="Lowest first (default: only for risk measures such as volatility)")
+    cache = add('cache', cmd_cache, "Backtest cache statistics", symbols=False)
+    cache.add_argument('--clear', action='store_true', help="Drop every cached result")
+    add('paper', cmd_paper, "Step the paper accounts")
+    add('sessions', cmd_sessions, "Show the next cycle of every symbol", symbols=False)
+    add('cycle', cmd_cycle, "Run one full cycle", symbols=False)
+    add('bot', cmd_bot, "Run the bot (same as main.py)", symbols=False)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    result = args.func(args)
+    return 1 if result is False else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+#COMPRESSED COLUMNAR FILES FOR THE BACKTEST OUTPUTS, WRITTEN IN CHUNKS, EXPORTABLE TO CSV
+
+#COLUMNAR: 1. A file is a short header followed by chunks of up to RESULTS_CHUNK_ROWS rows, written as the rows are
+#             appended (the writer never holds more than one chunk). A chunk is a JSON directory (rows, name, kind,
+#             dtype and size of each column) followed by one zlib block per column.
+#          2. Columns are encoded before compression: timestamps and integers as differences from the previous value
+#             (consecutive dates compress to almost nothing), floats byte-shuffled (sign/exponent bytes of neighbouring
+#             values end up next to each other), text as a dictionary + int32 codes.
+#          3. Written to <path>.tmp and renamed on close: readers never see half a file. Reading decodes only the
+#             requested columns, chunk by chunk.
+#          4. Backtest outputs (RESULTS_FORMAT = 'columnar'): equity_curve_*.tcol and backtest_trades_*.tcol, with the
+#             usual CSV files next to them when RESULTS_CSV is set. The equity curve is appended while the backtest
+#             runs, one calendar year at a time (a year is final once its tax is deducted), so neither the simulation
+#             nor the writer holds the whole curve. read_result() loads either format.
+#          Example: python columnar.py (exports every .tcol file of the output folder to CSV)
+
+#Libraries
+import argparse
+import glob
+import json
+import os
+import struct
+import zlib
+import lazy
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+#Files
+from account_data import *
+import resample
+
+#Config
+EXTENSION = '.tcol'
+MAGIC = b"TCOL"
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sH')  #magic, format version
+DIRECTORY = struct.Struct('<I')  #size of the chunk's JSON directory
+
+#Encode one column: (kind, dtype, raw bytes, dictionary of the text columns)
+def _encode(values):
+    dtype = values.dtype
+    if dtype.kind == 'M':
+        ints = values.view(np.int64)
+        return 'delta', str(dtype), np.diff(ints, prepend=np.int64(0)).tobytes(), None
+    if dtype.kind in 'iu':
+        ints = values.astype(np.int64)
+        return 'delta', str(dtype), np.diff(ints, prepend=np.int64(0)).tobytes(), None
+    if dtype.kind == 'b':
+        return 'raw', str(dtype), values.tobytes(), None
+    if dtype.kind == 'f':
+        return 'shuffle', str(dtype), np.ascontiguousarray(values).view(np.uint8).reshape(-1, dtype.itemsize).T.tobytes(), None
+    raise TypeError(f"Unsupported column dtype {dtype}")
+
+def _decode(kind, dtype, raw, rows, dictionary=None):
+    if kind == 'text':
+        codes = np.frombuffer(raw, dtype=np.int32)
+        return np.array([None if c < 0 else dictionary[c] for c in codes.tolist()], dtype=object)
+    dtype = np.dtype(dtype)
+    if kind == 'delta':
+        return np.cumsum(np.frombuffer(raw, dtype=np.int64)).astype(np.int64).view(dtype) if dtype.kind == 'M' \
+            else np.cumsum(np.frombuffer(raw, dtype=np.int64)).astype(dtype)
+    if kind == 'shuffle':
+        return np.frombuffer(raw, dtype=np.uint8).reshape(dtype.itemsize, rows).T.copy().view(dtype).ravel()
+    return np.frombuffer(raw, dtype=dtype).copy()
+
+#Chunked writer of one frame's columns (index stored as a column when index=True)
+#with ColumnWriter(path) as writer: writer.append(frame) ... (file renamed into place on exit)
+class ColumnWriter:
+    def __init__(self, path, index=True, chunk_rows=RESULTS_CHUNK_ROWS, level=RESULTS_COMPRESSION):
+        self.path = path
+        self.index = index
+        self.chunk_rows = chunk_rows
+        self.level = level
+        self.rows = 0
+        self.chunks = 0
+        self.bytes_written = HEADER.size
+        self._pending = []
+        self._pending_rows = 0
+        self._schema = None  #Empty frame of the columns, written alone if no rows come
+        self._tmp_path = f"{path}.tmp"
+        self._file = open(self._tmp_path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION))
+
+    def append(self, frame):
+        if self.index:
+            frame = frame.reset_index()
+        if self._schema is None:
+            self._schema = (frame.iloc[:0], frame.columns[0] if self.index else None)
+        if not len(frame):
+            return
+        self._pending.append(frame)
+        self._pending_rows += len(frame)
+        while self._pending_rows >= self.chunk_rows:
+            pending = pd.concat(self._pending) if len(self._pending) > 1 else self._pending[0]
+            self._write_chunk(pending.iloc[:self.chunk_rows])
+            rest = pending.iloc[self.chunk_rows:]
+            self._pending, self._pending_rows = ([rest] if len(rest) else []), len(rest)
+
+    def _write_chunk(self, frame):
+        columns, blocks = [], []
+        for name in frame.columns:
+            values = frame[name]
+            if values.dtype.kind in 'OUT' or pd.api.types.is_string_dtype(values.dtype):
+                codes, uniques = pd.factorize(values, use_na_sentinel=True)
+                kind, raw, dictionary = 'text', codes.astype(np.int32).tobytes(), [str(u) for u in uniques]
+                dtype = str(values.dtype)
+            else:
+                kind, dtype, raw, dictionary = _encode(values.to_numpy())
+            block = zlib.compress(raw, self.level)
+            columns.append({'name': name, 'kind': kind, 'dtype': dtype, 'size': len(block), 'dictionary': dictionary})
+            blocks.append(block)
+
+        directory = json.dumps({'rows': len(frame), 'index': self._schema[1], 'columns': columns}).encode()
+        self._file.write(DIRECTORY.pack(len(directory)))
+        self._file.write(directory)
+        for block in blocks:
+            self._file.write(block)
+        self.rows += len(frame)
+        self.chunks += 1
+        self.bytes_written += DIRECTORY.size + len(directory) + sum(len(b) for b in blocks)
+
+    def close(self):
+        if self._pending_rows:
+            pending = pd.concat(self._pending) if len(self._pending) > 1 else self._pending[0]
+            self._write_chunk(pending)
+            self._pending, self._pending_rows = [], 0
+        if not self.chunks:
+            if self._schema is None:
+                self._schema = (pd.DataFrame(), None)
+            self._write_chunk(self._schema[0])
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+#Frames of the file's chunks, with only the given columns (all by default)
+def iter_chunks(path, columns=None):
+    with open(path, 'rb') as f:
+        magic, version = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a columnar file of version {FORMAT_VERSION}")
+        while True:
+            size = f.read(DIRECTORY.size)
+            if not size:
+                return
+            directory = json.loads(f.read(DIRECTORY.unpack(size)[0]))
+            data = {}
+            for column in directory['columns']:
+                if columns is not None and column['name'] not in columns and column['name'] != directory['index']:
+                    f.seek(column['size'], os.SEEK_CUR)
+                    continue
+                values = _decode(column['kind'], column['dtype'], zlib.decompress(f.read(column['size'])),
+                                 directory['rows'], column['dictionary'])
+                data[column['name']] = pd.Series(values, dtype=column['dtype']) if column['kind'] == 'text' else values
+            frame = pd.DataFrame(data)
+            yield frame.set_index(directory['index']) if directory['index'] is not None else frame
+
+def read(path, columns=None):
+    chunks = list(iter_chunks(path, columns))
+    if len(chunks) == 1:
+        return chunks[0]
+    #Without a stored index every chunk restarts at 0: number the rows again
+    return pd.concat(chunks, ignore_index=chunks[0].index.name is None)
+
+#Export to CSV chunk by chunk, returns the CSV path
+def to_csv(path, csv_path=None):
+    csv_path = csv_path or path[:-len(EXTENSION)] + '.csv'
+    tmp_path = f"{csv_path}.tmp"
+    with open(tmp_path, 'w', newline='') as f:
+        for i, chunk in enumerate(iter_chunks(path)):
+            has_index = chunk.index.name is not None
+            chunk.to_csv(f, header=i == 0, index=has_index)
+    os.replace(tmp_path, csv_path)
+    return csv_path
+
+#Backtest outputs: kind 'equity' (equity_curve_*) or 'trades' (backtest_trades_*)
+def result_path(symbol, profile, kind, timeframe='D', fmt=None):
+    prefix = 'equity_curve' if kind == 'equity' else 'backtest_trades'
+    extension = EXTENSION if (fmt or RESULTS_FORMAT) == 'columnar' else '.csv'
+    return f"{OUTPUT_DIR}/{prefix}_{symbol.lower().replace('^', '')}_{profile}{resample.suffix(timeframe)}{extension}"
+
+#Chunked writer of one backtest output in the configured format (plus the CSV when RESULTS_CSV), every file
+#written to .tmp and renamed on close. with ResultWriter(symbol, profile, 'equity') as writer: writer.append(frame) ...
+class ResultWriter:
+    def __init__(self, symbol, profile, kind, timeframe='D', fmt=None):
+        fmt = fmt or RESULTS_FORMAT
+        self.index = kind == 'equity'
+        self.paths = []
+        self._columns = None
+        self._csv = None
+        self._csv_header = True
+        if fmt == 'columnar':
+            self.paths.append(result_path(symbol, profile, kind, timeframe, fmt))
+            self._columns = ColumnWriter(self.paths[-1], index=self.index)
+        if fmt == 'csv' or RESULTS_CSV:
+            self.paths.append(result_path(symbol, profile, kind, timeframe, 'csv'))
+            self._csv_path = self.paths[-1]
+            self._csv = open(f"{self._csv_path}.tmp", 'w', newline='')
+
+    def append(self, frame):
+        if self._columns is not None:
+            self._columns.append(frame)
+        if self._csv is not None:
+            frame.to_csv(self._csv, header=self._csv_header, index=self.index)
+            self._csv_header = False
+
+    def close(self):
+        if self._columns is not None:
+            self._columns.close()
+        if self._csv is not None:
+            self._csv.close()
+            os.replace(f"{self._csv_path}.tmp", self._csv_path)
+
+    def abort(self):
+        if self._columns is not None:
+            self._columns.abort()
+        if self._csv is not None:
+            self._csv.close()
+            os.remove(f"{self._csv_path}.tmp")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+#Write one backtest output at once, returns the paths written
+def write_result(frame, symbol, profile, kind, timeframe='D', fmt=None):
+    with ResultWriter(symbol, profile, kind, timeframe, fmt) as writer:
+        for start in range(0, max(len(frame), 1), RESULTS_CHUNK_ROWS):
+            writer.append(frame.iloc[start:start + RESULTS_CHUNK_ROWS])
+    return writer.paths
+
+#One backtest output as the readers expect it, from the configured format: equity indexed by date,
+#trades with the dates as text (like the CSV)
+def read_result(symbol, profile, kind, timeframe='D'):
+    path = result_path(symbol, profile, kind, timeframe)
+    if RESULTS_FORMAT != 'columnar':
+        return pd.read_csv(path, index_col=0, parse_dates=True) if kind == 'equity' else pd.read_csv(path)
+    frame = read(path)
+    if kind == 'trades':
+        for name in frame.columns:
+            if frame[name].dtype.kind == 'M':
+                frame[name] = frame[name].astype(str)
+    return frame
+
+def main():
+    parser = argparse.ArgumentParser(description="Export columnar backtest outputs to CSV")
+    parser.add_argument('paths', nargs='*', help=f"Default: every {EXTENSION} file of {OUTPUT_DIR}")
+    args = parser.parse_args()
+
+    for path in args.paths or sorted(glob.glob(f"{OUTPUT_DIR}/*{EXTENSION}")):
+        print(f"{path} → {to_csv(path)}")
+
+if __name__ == "__main__":
+    main()
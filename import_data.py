@@ -1,32 +1,33 @@
 #IMPORTS DATA FROM YFINANCE AND CREATES A .CSV FILE FOR PRICE HISTORY
 
 #Libraries
-import pandas as pd
 from datetime import datetime, timedelta
 import os
+import lazy
+pd = lazy.module('pandas')
 
 #Files
 from account_data import *
+import instrumentation
+import market_sessions
 
-#Config
-end_date = datetime.now().strftime("%Y-%m-%d")
-
-#Check correct installation
-try:
-    import yfinance as yf
-    _HAS_YFINANCE = True
-except ImportError:
-    _HAS_YFINANCE = False
+#Check correct installation (loaded on the first download)
+_HAS_YFINANCE = lazy.available('yfinance')
+if _HAS_YFINANCE:
+    yf = lazy.module('yfinance')
+else:
     print("yfinance not installed. Install with: pip install yfinance")
 
 
 #FETCH FROM YFINANCE
+@instrumentation.timed('import')
 def fetch_and_save_yfinance_data(symbol):
     historical_path = f"{OUTPUT_DIR}/{symbol.lower().replace('^', '')}_historical.csv"  #Creates a .csv file
 
+    last_session = market_sessions.last_session_date(symbol)
     if os.path.exists(historical_path):
         df = pd.read_csv(historical_path, index_col=0, parse_dates=True)
-        if df.index.max() >= (datetime.now() - timedelta(days=1)):
+        if df.index.max().date() >= last_session:
             print(f"Data for {symbol} loaded from yfinance cache (up-to-date).")
             return df
         else:
@@ -35,7 +36,8 @@ def fetch_and_save_yfinance_data(symbol):
         df = pd.DataFrame()
         print(f"Fetching new data for {symbol}.")
 
-    #Fetching data from yfinance
+    #Fetching data from yfinance (end is exclusive: include today's bar, dropped below while its session is open)
+    end_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
     new_data = yf.download(symbol, start=START_DATE, end=end_date)
     new_data.index = pd.to_datetime(new_data.index)
 
@@ -46,14 +48,29 @@ def fetch_and_save_yfinance_data(symbol):
         new_data.columns = new_data.columns.str.lower()
     new_data = new_data[["open", "high", "low", "close", "volume"]]  # Select main columns
 
-    #Data filtering and concat (if updating)
-    df = pd.concat([df, new_data]).drop_duplicates().sort_index()
+    #Data filtering and concat (if updating): a bar downloaded again replaces the stored one, the bar of a session
+    #still open is not stored (it would look final and never be downloaded again)
+    df = pd.concat([df, new_data])
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    df = df[df.index.date <= last_session]
 
     #Save in .CSV format
     df.to_csv(historical_path, index_label="date")
     print(f"Data for {symbol} saved to {historical_path}.")
     return df
 
+#Date of the newest bar in the local price store (reads only the end of the file), None if there is none
+def last_bar_date(symbol):
+    historical_path = f"{OUTPUT_DIR}/{symbol.lower().replace('^', '')}_historical.csv"
+    try:
+        with open(historical_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - 512, 0))
+            last_line = f.read().strip().splitlines()[-1].decode()
+        return pd.Timestamp(last_line.split(',')[0]).date()
+    except (FileNotFoundError, IndexError, ValueError):
+        return None
+
 #Execute functions for both sources and for each symbol
 def main():
     for sym in SYMBOLS:
@@ -0,0 +1,187 @@
+#RECORDS WALL TIME, CPU TIME, PEAK RSS AND ROW COUNTS OF EVERY STAGE/TASK OF THE TRADING CYCLE
+
+#OUTPUT: 1. JSON lines appended to instrumentation.jsonl (one record per stage/task run).
+#        2. Prometheus textfile snapshot instrumentation.prom (latest value per task, totals per stage).
+#        Collection costs a few microseconds per task and is skipped entirely when disabled.
+
+#Libraries
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+#Files
+from account_data import *
+
+#Check availability (resource module is not available on Windows)
+try:
+    import resource
+    _HAS_RESOURCE = True
+except ImportError:
+    _HAS_RESOURCE = False
+
+#Config
+JSONL_PATH = f"{OUTPUT_DIR}/instrumentation.jsonl"
+PROM_PATH = f"{OUTPUT_DIR}/instrumentation.prom"
+enabled = INSTRUMENTATION_ENABLED
+
+_records = []
+_latest = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+def enable(flag=True):
+    global enabled
+    enabled = flag
+
+#Peak resident memory of the process so far (MB), None where not available.
+#On Linux VmHWM is used since, unlike ru_maxrss, it can be reset (reset_peak_rss) to measure a single stage
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if not _HAS_RESOURCE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #Linux reports KB, macOS bytes
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+#Restart the peak from the current resident memory (Linux only), returns False where not supported
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+#Start measuring a stage/task, returns the record to pass to stop()
+def start(stage, symbol=None, profile=None):
+    if not enabled:
+        return None
+    record = {'stage': stage, 'symbol': symbol, 'profile': profile, 'rows': None,
+              '_wall': time.perf_counter(), '_cpu': time.thread_time()}
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(record)
+    return record
+
+#Finish a record and store it
+def stop(record, rows=None, status='ok'):
+    if record is None:
+        return
+    wall = time.perf_counter() - record.pop('_wall')
+    cpu = time.thread_time() - record.pop('_cpu')
+    _local.stack.remove(record)
+
+    if rows is not None:
+        record['rows'] = rows
+    record.update({'status': status, 'wall_s': wall, 'cpu_s': cpu, 'peak_rss_mb': peak_rss_mb(),
+                   'timestamp': time.time()})
+    with _lock:
+        _records.append(record)
+
+#Row count of the stage/task currently measured on this thread
+def set_rows(rows):
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        stack[-1]['rows'] = rows
+
+#Decorator for stage functions f(symbol, profile, ...): symbol/profile come from the first positional arguments,
+#rows from the length of a returned DataFrame unless set_rows() was called
+def timed(stage):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            names = [a for a in args[:2] if isinstance(a, str)]
+            record = start(stage, *names)
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                stop(record, status='error')
+                raise
+            rows = len(result) if record['rows'] is None and hasattr(result, 'columns') else None
+            stop(record, rows=rows, status='failed' if result is False else 'ok')
+            return result
+        return wrapper
+    return decorator
+
+#Prometheus label string
+def _labels(record):
+    labels = [f'{key}="{record[key]}"' for key in ('stage', 'symbol', 'profile') if record.get(key) is not None]
+    return '{' + ','.join(labels) + '}'
+
+#Prometheus textfile snapshot (latest run of every task + totals per stage of the last emit)
+def _write_prometheus(batch, path):
+    lines = []
+    gauges = [('wall_s', 'trading_task_wall_seconds', 'Wall time of the last run of each task'),
+              ('cpu_s', 'trading_task_cpu_seconds', 'CPU time of the last run of each task'),
+              ('rows', 'trading_task_rows', 'Rows processed by the last run of each task')]
+    for key, name, help_text in gauges:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for record in _latest.values():
+            if record.get(key) is not None:
+                lines.append(f"{name}{_labels(record)} {record[key]}")
+
+    stages = {}
+    for record in batch:
+        total = stages.setdefault(record['stage'], [0.0, 0.0])
+        total[0] += record['wall_s']
+        total[1] += record['cpu_s']
+    lines += ["# HELP trading_stage_wall_seconds Total wall time of each stage in the last cycle",
+              "# TYPE trading_stage_wall_seconds gauge"]
+    lines += [f'trading_stage_wall_seconds{{stage="{stage}"}} {wall}' for stage, (wall, cpu) in stages.items()]
+    lines += ["# HELP trading_stage_cpu_seconds Total CPU time of each stage in the last cycle",
+              "# TYPE trading_stage_cpu_seconds gauge"]
+    lines += [f'trading_stage_cpu_seconds{{stage="{stage}"}} {cpu}' for stage, (wall, cpu) in stages.items()]
+
+    rss = peak_rss_mb()
+    if rss is not None:
+        lines += ["# HELP trading_peak_rss_bytes Peak resident memory of the bot process",
+                  "# TYPE trading_peak_rss_bytes gauge", f"trading_peak_rss_bytes {int(rss * 1024 * 1024)}"]
+    lines += ["# HELP trading_last_emit_timestamp_seconds Time of the last snapshot",
+              "# TYPE trading_last_emit_timestamp_seconds gauge", f"trading_last_emit_timestamp_seconds {time.time()}"]
+
+    #Atomic replace so the node exporter never reads a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+#Take the records collected so far (e.g. to send them back from a worker process)
+def drain():
+    global _records
+    with _lock:
+        batch, _records = _records, []
+    return batch
+
+#Add records collected elsewhere (e.g. in a worker process)
+def extend(records):
+    with _lock:
+        _records.extend(records)
+
+#Write collected records as JSON lines and refresh the Prometheus snapshot
+def emit(jsonl_path=JSONL_PATH, prom_path=PROM_PATH):
+    if not enabled:
+        return []
+    batch = drain()
+    if not batch:
+        return batch
+
+    with open(jsonl_path, 'a') as f:
+        for record in batch:
+            f.write(json.dumps(record) + '\n')
+
+    for record in batch:
+        _latest[(record['stage'], record['symbol'], record['profile'])] = record
+    _write_prometheus(batch, prom_path)
+    return batch
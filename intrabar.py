@@ -0,0 +1,152 @@
+#INTRABAR STOP RESOLUTION: DAILY BACKTEST, MINUTE BARS LOADED ONLY FOR THE DAYS WHOSE RANGE REACHES THE STOP
+
+#INTRABAR: 1. A daily bar cannot tell whether the stop or the new extreme (which trails the stop) came first.
+#             When the day's range cannot reach the stop (PositionStateMachine.stop_reachable) the order does not
+#             matter and the daily step is exact; otherwise that day's minute bars are loaded and replayed through
+#             the same state machine (PositionStateMachine.step_intrabar), the day's signal is applied at the close.
+#          2. Minute bars are read from output/minute/<symbol>/<date>.csv, downloaded from yfinance when missing
+#             (1-minute history only goes back about 30 days there, older days are not requested); a day without
+#             minute bars falls back to the daily rule. A closed session the provider could not serve leaves an
+#             empty <date>.missing marker and is not requested again; a session still open is never stored.
+#          3. python intrabar.py ^SPX --synthetic compares daily, intrabar and a full minute replay (every day with
+#             an open position) on minute bars generated from the daily bars.
+
+#Libraries
+import argparse
+import os
+import time
+import lazy
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+#Files
+from account_data import *
+import backtesting
+import market_sessions
+
+#Check correct installation (loaded on the first download)
+_HAS_YFINANCE = lazy.available('yfinance')
+if _HAS_YFINANCE:
+    yf = lazy.module('yfinance')
+
+#Config
+PROVIDER_MINUTE_DAYS = 30  #Days of 1-minute history yfinance serves
+
+#Paths
+def minute_path(sym, day):
+    return f"{MINUTE_DIR}/{sym.lower().replace('^', '')}/{day:%Y-%m-%d}.csv"
+
+def missing_path(sym, day):
+    return minute_path(sym, day)[:-len('.csv')] + '.missing'
+
+#Minute bars of one day from the local store, downloaded when missing, None if not available
+def load_minutes(sym, day):
+    path = minute_path(sym, day)
+    if os.path.exists(path):
+        return pd.read_csv(path, index_col='datetime', parse_dates=True)
+    today = pd.Timestamp.now().normalize()
+    if not _HAS_YFINANCE or day < today - pd.Timedelta(days=PROVIDER_MINUTE_DAYS) or os.path.exists(missing_path(sym, day)):
+        return None
+
+    #Only a closed session is final: the bars of a session still open are returned but not stored (nor marked missing)
+    closed = day.date() <= market_sessions.last_session_date(sym)
+    data = yf.download(sym, start=day, end=day + pd.Timedelta(days=1), interval='1m', progress=False)
+    if data is None or data.empty:
+        if closed:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(missing_path(sym, day), 'w').close()
+        return None
+    if isinstance(data.columns, pd.MultiIndex):
+        data.columns = data.columns.get_level_values(0)
+    data.columns = data.columns.str.lower()
+    data = data[['open', 'high', 'low', 'close']].sort_index()
+    if not closed:
+        return data
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    data.to_csv(tmp_path, index_label='datetime')
+    os.replace(tmp_path, path)
+    return data
+
+#Minute bars on demand for one symbol
+#mode 'auto': only the days whose range reaches the stop, 'all': every day with an open position (reference run)
+class MinuteBars:
+    def __init__(self, sym, loader=load_minutes, mode='auto'):
+        self.sym = sym
+        self.loader = loader
+        self.mode = mode
+        self.days_loaded = 0
+        self.days_missing = 0
+
+    def needed(self, machine, high, low):
+        if self.mode == 'all':
+            return machine.position != 0
+        return machine.stop_reachable(high, low)
+
+    #(highs, lows, closes) lists of the day's minutes, None when there are none
+    def day(self, date):
+        minutes = self.loader(self.sym, pd.Timestamp(date).normalize())
+        if minutes is None or minutes.empty:
+            self.days_missing += 1
+            return None
+        self.days_loaded += 1
+        return minutes['high'].tolist(), minutes['low'].tolist(), minutes['close'].tolist()
+
+#Minute bars drawn from each daily bar (random walk from open to close through the day's high and low), for tests
+def synthetic_loader(daily, minutes_per_day=390, seed=0):
+    def loader(sym, day):
+        if day not in daily.index:
+            return None
+        bar = daily.loc[day]
+        rng = np.random.default_rng([seed, day.toordinal()])
+        walk = np.concatenate(([0.0], np.cumsum(rng.standard_normal(minutes_per_day - 1))))
+        walk = walk - np.linspace(0.0, walk[-1], minutes_per_day)  #Bridge: starts and ends at 0
+        span = walk.max() - walk.min()
+        path = (walk - walk.min()) / span if span > 0 else np.full(minutes_per_day, 0.5)
+        path = bar['low'] + path * (bar['high'] - bar['low'])
+        path[0], path[-1] = bar['open'], bar['close']
+        path[int(np.argmax(path[1:-1])) + 1] = bar['high']
+        path[int(np.argmin(path[1:-1])) + 1] = bar['low']
+        index = day + pd.Timedelta(hours=9, minutes=30) + pd.to_timedelta(np.arange(minutes_per_day), unit='min')
+        return pd.DataFrame({'open': path, 'high': path, 'low': path, 'close': path}, index=index)
+    return loader
+
+#Daily, intrabar and full minute replay of one symbol/profile: time, minute days loaded, final equity, trades
+#(stop_loss/trail override the profile's)
+def compare(sym, profile, loader=load_minutes, stop_loss=None, trail=None):
+    df = pd.read_csv(f"{OUTPUT_DIR}/{sym.lower().replace('^', '')}_signals_{profile}.csv", index_col='date',
+                     parse_dates=True).sort_index()
+    rows = []
+    for mode in ('daily', 'auto', 'all'):
+        minute_bars = None if mode == 'daily' else MinuteBars(sym, loader, mode)
+        start = time.perf_counter()
+        result = backtesting.simulate(df, profile, stop_loss, trail, minute_bars)
+        rows.append({'mode': mode, 'seconds': time.perf_counter() - start,
+                     'minute_days': minute_bars.days_loaded if minute_bars else 0,
+                     'final_equity': result['summary']['final_equity'], 'trades': len(result['trades']),
+                     'stops': int(result['trades']['action'].str.contains('SL').sum()) if len(result['trades']) else 0})
+    table = pd.DataFrame(rows).set_index('mode')
+    reference = table.loc['all', 'final_equity']
+    table['equity_error_pct'] = (table['final_equity'] / reference - 1) * 100
+    return table
+
+def main():
+    parser = argparse.ArgumentParser(description="Intrabar stop resolution: daily vs intrabar vs full minute replay")
+    parser.add_argument('symbols', nargs='*', default=SYMBOLS)
+    parser.add_argument('--profile', choices=[p for p in PROFILES if p != 'pac'], default='high')
+    parser.add_argument('--synthetic', action='store_true', help="Minute bars generated from the daily bars")
+    parser.add_argument('--stop-loss', type=float, default=None, help="Override the profile's STOP_LOSS")
+    parser.add_argument('--trail', type=float, default=None, help="Override the profile's TRAIL_PERCENT")
+    args = parser.parse_args()
+
+    for sym in args.symbols:
+        loader = load_minutes
+        if args.synthetic:
+            loader = synthetic_loader(pd.read_csv(f"{OUTPUT_DIR}/{sym.lower().replace('^', '')}_historical.csv",
+                                                  index_col='date', parse_dates=True).sort_index())
+        print(f"\n======= {sym} {args.profile.upper()} INTRABAR STOPS =======")
+        print(compare(sym, args.profile, loader, args.stop_loss, args.trail).to_string())
+
+if __name__ == "__main__":
+    main()
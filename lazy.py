@@ -0,0 +1,30 @@
+#LAZY IMPORTS: HEAVY LIBRARIES (PANDAS, NUMPY, TA-LIB, YFINANCE, METATRADER5) ARE LOADED ON FIRST USE
+
+#LAZY: 1. module('pandas') returns a placeholder module, the real import runs the first time an attribute is read,
+#         so commands that never touch a library (e.g. reading the latest signal) do not pay its import time.
+#      2. After the first use the placeholder holds the library's attributes: no overhead on later accesses.
+#      3. available() checks if a library is installed without importing it (optional dependencies).
+
+#Libraries
+import importlib
+import importlib.util
+import types
+
+class LazyModule(types.ModuleType):
+    #Only called for attributes not loaded yet (the import lock makes concurrent first uses safe)
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self.__name__}'>"
+
+def module(name):
+    return LazyModule(name)
+
+def available(name):
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
@@ -0,0 +1,301 @@
+#LIVE SIGNAL ENGINE: KEEPS THE STRATEGY STATE IN MEMORY AND UPDATES IT BAR BY BAR (OR TICK BY TICK)
+
+#ENGINE: 1. One state per (symbol, trading profile): rolling SMA windows, Wilder RSI, previous SMA values, position/stop.
+#        2. Every new bar costs O(1), nothing is recomputed from history (warm up by replaying the price store).
+#        3. The signals_generation rule (MA crossover + RSI filter) drives positions.PositionStateMachine, every entry
+#           or stop exit is emitted as an order intent.
+#        4. Fed with the historical bars it reproduces signals_generation and backtesting exactly (same arithmetic
+#           as pandas rolling().mean() and TA-Lib RSI). PAC is not traded live and has no state here.
+
+#Libraries
+import argparse
+import math
+import time
+from collections import deque, namedtuple
+import lazy
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+#Files
+from account_data import *
+import columnar
+import positions
+import signals_generation
+
+Bar = namedtuple('Bar', ['symbol', 'time', 'open', 'high', 'low', 'close'])
+OrderIntent = namedtuple('OrderIntent', ['symbol', 'profile', 'time', 'action', 'price', 'sl', 'tp'])
+
+#Rolling mean, same algorithm as pandas rolling().mean(): Kahan-compensated running sum (separate compensation
+#for added and removed values), so the results are bit-identical
+class RollingMean:
+    __slots__ = ('window', 'values', 'total', 'add_comp', 'remove_comp', 'neg_count', 'same_count', 'last')
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.total = self.add_comp = self.remove_comp = 0.0
+        self.neg_count = 0
+        self.same_count = 0
+        self.last = math.nan
+
+    #Add a value, returns the mean of the window (None until the window is full)
+    def update(self, value):
+        values = self.values
+        if len(values) == self.window:
+            old = values.popleft()
+            y = -old - self.remove_comp
+            t = self.total + y
+            self.remove_comp = t - self.total - y
+            self.total = t
+            if old < 0:
+                self.neg_count -= 1
+        values.append(value)
+        y = value - self.add_comp
+        t = self.total + y
+        self.add_comp = t - self.total - y
+        self.total = t
+        if value < 0:
+            self.neg_count += 1
+        self.same_count = self.same_count + 1 if value == self.last else 1
+        self.last = value
+
+        n = len(values)
+        if n < self.window:
+            return None
+        if self.same_count >= n:
+            return value
+        mean = self.total / n
+        if (self.neg_count == 0 and mean < 0) or (self.neg_count == n and mean > 0):
+            return 0.0
+        return mean
+
+#Wilder RSI, same arithmetic as TA-Lib: seed with the average gain/loss of the first `period` changes,
+#then smooth (multiplying by 1/period as TA-Lib does)
+class WilderRSI:
+    __slots__ = ('period', 'factor', 'count', 'prev', 'gain', 'loss')
+
+    def __init__(self, period):
+        self.period = period
+        self.factor = 1.0 / period
+        self.count = 0
+        self.prev = None
+        self.gain = self.loss = 0.0
+
+    #Add a close, returns the RSI (None for the first `period` closes)
+    def update(self, close):
+        change = 0.0 if self.prev is None else close - self.prev
+        self.prev = close
+        count = self.count = self.count + 1
+
+        if count <= self.period + 1:
+            if change < 0:
+                self.loss -= change
+            else:
+                self.gain += change
+            if count <= self.period:
+                return None
+            self.gain *= self.factor
+            self.loss *= self.factor
+        else:
+            keep = self.period - 1
+            self.gain = (self.gain * keep + (change if change > 0 else 0.0)) * self.factor
+            self.loss = (self.loss * keep + (-change if change < 0 else 0.0)) * self.factor
+
+        total = self.gain + self.loss
+        return 100.0 * (self.gain / total) if not -1e-8 < total < 1e-8 else 0.0
+
+#Strategy state of one (symbol, profile)
+class StrategyState:
+    __slots__ = ('symbol', 'profile', 'sma_short', 'sma_long', 'rsi', 'overbought', 'oversold', 'prev_short',
+                 'prev_long', 'take_profit', 'machine', 'last_signal', 'last_values')
+
+    def __init__(self, symbol, profile, cash):
+        idx = PROFILES.index(profile)
+        self.symbol = symbol
+        self.profile = profile
+        self.sma_short = RollingMean(SHORT_MA[idx])
+        self.sma_long = RollingMean(LONG_MA[idx])
+        self.rsi = WilderRSI(RSI_PERIOD[idx])
+        self.overbought = RSI_OVERBOUGHT[idx]
+        self.oversold = RSI_OVERSOLD[idx]
+        self.take_profit = TAKE_PROFIT[idx]
+        self.prev_short = self.prev_long = None
+        self.machine = positions.PositionStateMachine(profile, cash)
+        self.last_signal = 0
+        self.last_values = None
+
+    #Process one closed bar, returns the order intents it generated
+    def update(self, bar):
+        short = self.sma_short.update(bar.close)
+        long = self.sma_long.update(bar.close)
+        rsi = self.rsi.update(bar.close)
+        prev_short, prev_long = self.prev_short, self.prev_long
+        self.prev_short, self.prev_long = short, long
+
+        #Bars with an incomplete indicator are not part of the strategy (dropped by signals_generation)
+        if short is None or long is None or rsi is None:
+            return ()
+
+        signal = 0
+        if prev_short is not None and prev_long is not None:
+            if short > long and prev_short <= prev_long and rsi <= self.oversold:
+                signal = 1
+            elif short < long and prev_short >= prev_long and rsi >= self.overbought:
+                signal = -1
+        self.last_signal = signal
+        self.last_values = (short, long, rsi)
+
+        trades = self.machine.step(bar.time, bar.close, bar.high, bar.low, signal)
+        if not trades:
+            return ()
+        return tuple(self._intent(bar, trade) for trade in trades)
+
+    def _intent(self, bar, trade):
+        action = trade['action']
+        if action == 'buy':
+            return OrderIntent(self.symbol, self.profile, bar.time, action, trade['price'], self.machine.sl_price,
+                               trade['price'] * (1 + self.take_profit))
+        if action == 'sell':
+            return OrderIntent(self.symbol, self.profile, bar.time, action, trade['price'], self.machine.sl_price,
+                               trade['price'] * (1 - self.take_profit))
+        return OrderIntent(self.symbol, self.profile, bar.time, action, trade['price'], None, None)
+
+class LiveEngine:
+    #on_intent: called with every OrderIntent (e.g. to queue it for MT5Session.send_batch)
+    #bar_seconds: bar length when the engine is fed with ticks
+    def __init__(self, symbols=SYMBOLS, profiles=None, on_intent=None, bar_seconds=60):
+        profiles = profiles or [p for p in PROFILES if p != 'pac']
+        cash = INITIAL_DEPOSIT / len(SYMBOLS)
+        self.states = {sym: [StrategyState(sym, profile, cash) for profile in profiles if profile != 'pac']
+                       for sym in symbols}
+        self.on_intent = on_intent
+        self.bar_seconds = bar_seconds
+        self.updates = 0
+        self._forming = {}
+
+    #Process a closed bar of one symbol, returns the order intents
+    def on_bar(self, bar):
+        intents = []
+        for state in self.states.get(bar.symbol, ()):
+            new = state.update(bar)
+            if new:
+                intents.extend(new)
+        self.updates += len(self.states.get(bar.symbol, ()))
+        if intents and self.on_intent is not None:
+            for intent in intents:
+                self.on_intent(intent)
+        return intents
+
+    #Process a tick (epoch seconds): ticks build bars of bar_seconds, a bar is processed when the next one starts
+    def on_tick(self, symbol, timestamp, price):
+        bucket = int(timestamp // self.bar_seconds)
+        forming = self._forming.get(symbol)
+        if forming is not None and forming[0] == bucket:
+            forming[2] = max(forming[2], price)
+            forming[3] = min(forming[3], price)
+            forming[4] = price
+            return []
+        self._forming[symbol] = [bucket, price, price, price, price]
+        if forming is None:
+            return []
+        return self.on_bar(self._closed_bar(symbol, forming))
+
+    #Process the bars still being built (e.g. at the session close)
+    def flush(self):
+        intents = []
+        for symbol, forming in list(self._forming.items()):
+            intents.extend(self.on_bar(self._closed_bar(symbol, forming)))
+        self._forming.clear()
+        return intents
+
+    def _closed_bar(self, symbol, forming):
+        bucket, open_, high, low, close = forming
+        return Bar(symbol, pd.Timestamp(bucket * self.bar_seconds, unit='s'), open_, high, low, close)
+
+    #Consume a whole feed (any iterable of Bar), returns all the intents
+    def run(self, feed):
+        intents = []
+        for bar in feed:
+            intents.extend(self.on_bar(bar))
+        return intents
+
+    #Latest signal and indicators of every (symbol, profile)
+    def snapshot(self):
+        return {(state.symbol, state.profile): {'signal': state.last_signal, 'values': state.last_values,
+                                                'position': state.machine.position, 'sl': state.machine.sl_price}
+                for states in self.states.values() for state in states}
+
+#Feed replaying the local price store, bars of all symbols in time order
+def historical_feed(symbols=SYMBOLS):
+    bars = []
+    for sym in symbols:
+        df = signals_generation.load_prices(sym)
+        bars.extend(Bar(sym, *row) for row in zip(df.index, df['open'].tolist(), df['high'].tolist(),
+                                                  df['low'].tolist(), df['close'].tolist()))
+    bars.sort(key=lambda bar: bar.time)
+    return bars
+
+#Replay the history bar by bar and compare with the batch outputs: signals and indicators of signals_generation
+#(<symbol>_signals_<profile>.csv) and trades of backtesting (backtest_trades_<symbol>_<profile>).
+#Returns the number of mismatching (symbol, profile) pairs
+def verify(feed, symbols=SYMBOLS):
+    engine = LiveEngine(symbols)
+    rows = {(sym, state.profile): [] for sym, states in engine.states.items() for state in states}
+    intents = []
+    for bar in feed:
+        intents.extend(engine.on_bar(bar))
+        for state in engine.states[bar.symbol]:
+            if state.last_values is not None:
+                rows[(bar.symbol, state.profile)].append((bar.time, *state.last_values, state.last_signal))
+
+    mismatches = 0
+    for (sym, profile), values in rows.items():
+        batch = pd.read_csv(signals_generation.signals_path(sym, profile), index_col='date', parse_dates=True)
+        live = pd.DataFrame(values, columns=['date', 'SMA_short', 'SMA_long', 'RSI', 'Signal']).set_index('date')
+        live = live.loc[batch.index.min():]
+
+        try:
+            trades = columnar.read_result(sym, profile, 'trades')
+        except pd.errors.EmptyDataError:  #No trades (empty CSV)
+            trades = pd.DataFrame()
+        want = list(zip(pd.to_datetime(trades['date']), trades['action'], trades['price'])) if len(trades) else []
+        got = [(i.time, i.action, i.price) for i in intents if i.symbol == sym and i.profile == profile]
+
+        same_signals = live.index.equals(batch.index) and (live['Signal'].to_numpy() == batch['Signal'].to_numpy()).all()
+        #The .csv round trip keeps 17 significant digits: compare the indicators to that precision
+        same_values = all(np.allclose(live[col], batch[col], rtol=1e-15, atol=0) for col in ('SMA_short', 'SMA_long', 'RSI')) \
+            if same_signals else False
+        same_trades = len(got) == len(want) and all(g[:2] == w[:2] and math.isclose(g[2], w[2], rel_tol=1e-12)
+                                                    for g, w in zip(got, want))
+        if not (same_signals and same_values and same_trades):
+            print(f"[WARNING] {sym} {profile}: signals {'OK' if same_signals else 'differ'}, "
+                  f"indicators {'OK' if same_values else 'differ'}, trades {len(got)} live / {len(want)} backtest")
+            mismatches += 1
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the price store through the live engine")
+    parser.add_argument('--repeat', type=int, default=5, help="Replays for the throughput figure")
+    args = parser.parse_args()
+
+    feed = historical_feed()
+    mismatches = verify(feed)
+
+    elapsed = 0.0
+    updates = 0
+    for _ in range(args.repeat):
+        engine = LiveEngine()
+        start = time.perf_counter()
+        intents = engine.run(feed)
+        elapsed += time.perf_counter() - start
+        updates += engine.updates
+
+    print(f"\n======= LIVE ENGINE REPLAY =======")
+    print(f"Bars            : {len(feed)} ({len(engine.states)} symbols x {len(next(iter(engine.states.values())))} profiles)")
+    print(f"Order intents   : {len(intents)}")
+    print(f"Throughput      : {updates / elapsed:,.0f} updates/s ({elapsed / updates * 1e6:.2f} us per update)")
+    print(f"Batch match     : {'OK' if mismatches == 0 else f'{mismatches} mismatching pairs'}")
+    return mismatches == 0
+
+if __name__ == "__main__":
+    main()
@@ -1,142 +1,233 @@
 # MAIN SCRIPT
 
 #Libraries
-import time
+import asyncio
 import signal
 import sys
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
 
 #Files
 from account_data import *
 import import_data
 import signals_generation
-#import metatrader_integration
+import metatrader_integration
 import backtesting
-import print_graphs
+import checkpoint
+import columnar
+import metrics
+import scheduler
+import instrumentation
+import market_sessions
+import paper_trading
+import results_store
 
-#Config for checking intervals (in seconds)
-check_interval = 43200 #2 checks a day
-backtest_interval = 86400 #1 backtest a day
+#Persistent MT5 connection, reused by every cycle
+mt5_session = metatrader_integration.MT5Session()
+mt5_lock = threading.Lock() #The terminal API is not thread-safe: one batch at a time
 
-#Flag for manual cycle shutdown
-running = True
+#Send the latest signals of one symbol to MT5 (all profiles in one batch)
+def send_orders(sym):
+    orders = [(metatrader_integration.get_latest_signal(sym, profile), sym, profile) for profile in PROFILES]
+    with mt5_lock:
+        results = mt5_session.send_batch(orders)
+    return all(r['status'] != 'error' for r in results)
 
-def signal_handler(sig, frame):
-    global running
-    print("\n\n[SHUTDOWN] Received stop signal. Finishing current cycle...")
-    running = False
+#Step the paper accounts of one symbol and, once orders went through the live session, compare with the broker deals
+def paper_trade(sym):
+    paper_trading.update_symbol(sym)
+    if mt5_session.connected:
+        with mt5_lock:
+            paper_trading.reconcile_with_session(sym, mt5_session, metatrader_integration.mt5_symbol_map.get(sym))
 
-#Main function: runs a full cycle of data acquisition and signal generation->execution
-def run_cycle():
-    print(f"\n[{datetime.now()}] Starting cycle...")
-    
-    cycle_success = True
-    
-    # 1)Check/update historical data and save CSVs
-    print("\n[STEP 1/4] Importing historical data...")
-    try:
-        for sym in SYMBOLS:
-            try:
-                import_data.fetch_and_save_yfinance_data(sym)
-            except Exception as e:
-                print(f"[ERROR] Failed to import data for {sym}: {e}")
-                cycle_success = False
-    except Exception as e:
-        print(f"[ERROR] Data import failed: {e}")
-        cycle_success = False
-    
-    # 2)Calculate strategy signals and operate on MT5
-    print("\n[STEP 2/4] Generating signals...")
-    try:
-        signals_generation.main()
-    except Exception as e:
-        print(f"[ERROR] Signal generation failed: {e}")
-        cycle_success = False
-    
-    #COMMENT OUT when debugging
-    #for sym in SYMBOLS:
-    #    for profile in PROFILES:
-    #        latest_signal = metatrader_integration.get_latest_signal(sym, profile)
-    #        metatrader_integration.send_order_to_mt5(latest_signal, sym, profile)
-
-    # 3)Run backtesting and save data for graphs
-    print("\n[STEP 3/4] Running backtests...")
-    try:
-        backtest_success = backtesting.main()
-        if not backtest_success:
-            print("[WARNING] Some backtests failed, but continuing...")
-    except Exception as e:
-        print(f"[ERROR] Backtesting failed: {e}")
-        cycle_success = False
-    
-    # 4)Generate and save graphs (continue even if some data is missing)
-    print("\n[STEP 4/4] Generating graphs...")
-    try:
-        print_graphs.main()
-    except Exception as e:
-        print(f"[ERROR] Graph generation failed: {e}")
-        cycle_success = False
+#Charts of every symbol (matplotlib is only loaded when they have to be redrawn)
+def draw_graphs():
+    import print_graphs
+    print_graphs.main()
+
+#Task graph of one cycle: import -> signals -> backtest per (symbol, profile) -> graphs
+def build_cycle_tasks(symbols=SYMBOLS, profiles=PROFILES):
+    tasks = []
+    for sym in symbols:
+        historical = signals_generation.historical_path(sym)
+        #Fetching and order sending are I/O-bound (threads), signals and backtests CPU-bound (processes)
+        tasks.append(scheduler.Task(f"import:{sym}", import_data.fetch_and_save_yfinance_data, args=(sym,),
+                                    outputs=[historical], always=True))
+
+        for profile in profiles:
+            signals = signals_generation.signals_path(sym, profile)
+            outputs = [signals, signals_generation.latest_path(sym, profile)]
+            if profile == 'pac':
+                #No signals file: the backtest finds the purchase days from the prices
+                signals = historical
+                outputs = outputs[1:]
+            tasks.append(scheduler.Task(f"signals:{sym}:{profile}", signals_generation.generate_signals,
+                                        args=(sym, profile), inputs=[historical], outputs=outputs, cpu_bound=True))
+            tasks.append(scheduler.Task(f"backtest:{sym}:{profile}", backtesting.backtest_symbol, args=(sym, profile),
+                                        inputs=[signals],
+                                        outputs=[columnar.result_path(sym, profile, 'equity'),
+                                                 columnar.result_path(sym, profile, 'trades')],
+                                        cpu_bound=True))
+
+        if PAPER_TRADING:
+            tasks.append(scheduler.Task(f"paper:{sym}", paper_trade, args=(sym,),
+                                        inputs=[signals_generation.signals_path(sym, p) for p in profiles if p != 'pac'],
+                                        outputs=[paper_trading.state_path(sym)]))
+
+        #COMMENT OUT when debugging: send this symbol's orders as soon as its signals change
+        #tasks.append(scheduler.Task(f"orders:{sym}", send_orders, args=(sym,),
+        #                            inputs=[signals_generation.latest_path(sym, p) for p in profiles]))
+
+    #Graphs of every symbol (matplotlib is not thread-safe: run on the main thread)
+    backtest_outputs = [columnar.result_path(sym, profile, kind)
+                        for sym in SYMBOLS for profile in profiles for kind in ('equity', 'trades')]
+    tasks.append(scheduler.Task("graphs", draw_graphs, inputs=backtest_outputs,
+                                outputs=[metrics.METRICS_PATH], thread_safe=False))
+    if RESULTS_STORE:
+        tasks.append(scheduler.Task("results", results_store.record_cycle, inputs=backtest_outputs + [metrics.METRICS_PATH]))
+    return tasks
+
+#Main function: runs a full cycle of data acquisition and signal generation->execution,
+#skipping every task whose inputs did not change since the last cycle
+async def run_cycle_async(thread_pool=None, process_pool=None, symbols=SYMBOLS):
+    print(f"\n[{datetime.now()}] Starting cycle for {', '.join(symbols)}...")
+
+    record = instrumentation.start('cycle')
+    status = await scheduler.run_tasks_async(build_cycle_tasks(symbols), thread_pool=thread_pool, process_pool=process_pool)
+    cycle_success = not any(s in ('failed', 'blocked') for s in status.values())
+    instrumentation.stop(record, rows=sum(s == 'done' for s in status.values()), status='ok' if cycle_success else 'failed')
+    instrumentation.emit()
     
     if cycle_success:
         print(f"\n[{datetime.now()}] Cycle completed successfully.")
     else:
         print(f"\n[{datetime.now()}] Cycle completed with some errors (check logs).")
+    peak_rss = instrumentation.peak_rss_mb()
+    if peak_rss is not None:
+        print(f"Peak memory (main process): {peak_rss:.0f} MB")
     
     return cycle_success
 
-#Manual cycle interruption
-def countdown_with_interrupt(seconds):
-    end_time = time.time() + seconds
-    while time.time() < end_time and running:
-        remaining = int(end_time - time.time())
-        if remaining > 0 and remaining % 60 == 0:  #Print every minute
-            print(f"[INFO] Next cycle in {remaining // 60} minute(s)... (Press Ctrl+C to stop)")
-        time.sleep(1)
-    return running
+#Single cycle from synchronous code
+def run_cycle():
+    return asyncio.run(run_cycle_async())
+
+#Sleep until the timeout or until a stop is requested (no polling: the loop is idle meanwhile)
+async def wait_or_stop(stop_event, seconds):
+    try:
+        await asyncio.wait_for(stop_event.wait(), timeout=seconds)
+    except asyncio.TimeoutError:
+        pass
+    return not stop_event.is_set()
+
+#Next run of a symbol after a cycle: its next session close, or a retry while the bar of the last close is missing
+def reschedule(sym, success, retries, now):
+    bar_date = import_data.last_bar_date(sym)
+    expected = market_sessions.last_session_date(sym, now)
+    if success and bar_date is not None and bar_date >= expected:
+        return market_sessions.next_trigger(sym, now), 0
+    if retries >= SESSION_MAX_RETRIES:
+        print(f"[WARNING] {sym}: no complete cycle for the bar of {expected} after {retries} retries, waiting for the next close")
+        return market_sessions.next_trigger(sym, now), 0
+    print(f"[WARNING] {sym}: {'cycle had errors' if not success else f'bar of {expected} not available yet'}, "
+          f"retrying in {SESSION_RETRY_MINUTES} minutes")
+    return now + timedelta(minutes=SESSION_RETRY_MINUTES), retries + 1
+
+#Order intents of the live engine on the new bars (not printed while it replays the whole history)
+def log_intents(intents, show=True):
+    if not show:
+        return
+    for intent in intents:
+        print(f"[LIVE] {intent.symbol} {intent.profile}: {intent.action} at {intent.price:.2f} ({intent.time:%Y-%m-%d})")
+
+#Bot loop: each symbol runs shortly after its own exchange closes (symbols closing together share a cycle),
+#the loop sleeps on a timer in between and Ctrl+C/SIGTERM stop it after the current cycle
+async def run_bot(symbols=SYMBOLS):
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+
+    def request_stop():
+        if not stop_event.is_set():
+            print("\n\n[SHUTDOWN] Received stop signal. Finishing current cycle...")
+        stop_event.set()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, request_stop)
+        except (NotImplementedError, AttributeError):  #Windows: no loop signal handlers
+            signal.signal(sig, lambda s, f: loop.call_soon_threadsafe(request_stop))
+
+    #Pools live as long as the bot so workers are not restarted every cycle
+    thread_pool = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS)
+    process_pool = ProcessPoolExecutor(max_workers=PIPELINE_PROCESSES, initializer=instrumentation.drain) if PIPELINE_PROCESSES > 0 else None
+
+    #Catch up on start (or resume the checkpointed schedule), then follow the session closes
+    now = datetime.now(timezone.utc)
+    state = checkpoint.restore(symbols, now) if CHECKPOINT_ENABLED else checkpoint.cold_state(symbols, now)
+    schedule, retries = state['schedule'], state['retries']
+    log_intents(checkpoint.sync_engine(state, symbols), state['cycle_count'] > 0)
+
+    cycle_count = state['cycle_count']
+    try:
+        while not stop_event.is_set():
+            trigger, group = next(iter(market_sessions.group_triggers(schedule).items()))
+            delay = (trigger - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0:
+                print(f"\n[INFO] Next cycle for {', '.join(group)} at {trigger.astimezone():%a %Y-%m-%d %H:%M:%S}"
+                      f" ({delay / 3600:.1f} hours)\nPress Ctrl+C to stop.")
+                if not await wait_or_stop(stop_event, delay):
+                    break
+
+            cycle_count += 1
+            print(f"\n{'='*60}")
+            print(f"CYCLE #{cycle_count}")
+            print(f"{'='*60}")
+
+            success = await run_cycle_async(thread_pool, process_pool, group)
+
+            now = datetime.now(timezone.utc)
+            for sym in group:
+                schedule[sym], retries[sym] = reschedule(sym, success, retries[sym], now)
+
+            #Live engine follows the new bars, state saved for a warm restart
+            log_intents(checkpoint.sync_engine(state, group))
+            state['cycle_count'] = cycle_count
+            if CHECKPOINT_ENABLED and cycle_count % CHECKPOINT_EVERY == 0:
+                checkpoint.checkpoint(state)
+    finally:
+        if CHECKPOINT_ENABLED and state['cycle_count']:
+            checkpoint.checkpoint(state)
+        thread_pool.shutdown()
+        if process_pool is not None:
+            process_pool.shutdown()
+
+    return cycle_count
 
 #Run on a server (real time)
-if __name__ == "__main__":
-    #Register signal handler for Ctrl+C
-    signal.signal(signal.SIGINT, signal_handler)
-    
+def main():
     print("="*60)
     print("TRADING BOT STARTED")
     print("="*60)
     print(f"Total capital: ${INITIAL_DEPOSIT:,.2f}")
     print(f"Capital per symbol: ${INITIAL_DEPOSIT / len(SYMBOLS):,.2f}")
-    print(f"Check interval: {check_interval} seconds ({check_interval/60:.1f} minutes)")
+    print(f"Cycles: {SESSION_CLOSE_DELAY_MINUTES} minutes after each exchange close")
     print(f"Symbols: {', '.join(SYMBOLS)}")
     print(f"Profiles: {', '.join(PROFILES)}")
     print("\nPress Ctrl+C at any time to stop the bot.")
     print("="*60)
     
-    last_backtest_time = time.time() - backtest_interval  #Run backtest on first cycle
-    cycle_count = 0
-    
-    while running:
-        cycle_count += 1
-        print(f"\n{'='*60}")
-        print(f"CYCLE #{cycle_count}")
-        print(f"{'='*60}")
-        
-        success = run_cycle()
-        
-        if not running:
-            break
-            
-        if success:
-            print(f"\n[INFO] Waiting {check_interval} seconds until next cycle...\nPress Ctrl+C to stop.")
-            if not countdown_with_interrupt(check_interval):
-                break
-        else:
-            print(f"\n[WARNING] Cycle had errors. Waiting 60 seconds before retry...")
-            if not countdown_with_interrupt(60):
-                break
+    cycle_count = asyncio.run(run_bot())
     
+    mt5_session.shutdown()
     print("\n" + "="*60)
     print("TRADING BOT STOPPED")
     print("="*60)
     print(f"Total cycles completed: {cycle_count}")
     print(f"Shutdown time: {datetime.now()}")
     print("="*60)
-    sys.exit(0)
\ No newline at end of file
+    return cycle_count
+
+if __name__ == "__main__":
+    main()
+    sys.exit(0)
@@ -0,0 +1,122 @@
+#EXCHANGE SESSION CALENDARS (OFFLINE TABLES): WHEN EACH SYMBOL'S DAILY BAR CLOSES
+
+#CALENDAR: 1. Every symbol belongs to an exchange with its time zone and regular session hours.
+#          2. Weekends, full-day holidays and early closes come from the tables below (update them once a year;
+#             days past the last listed year are treated as regular weekdays).
+#          3. A symbol's daily cycle is triggered SESSION_CLOSE_DELAY_MINUTES after its own close.
+#          4. A symbol missing from SYMBOL_EXCHANGE gets a plain weekday calendar (closing at 22:00 UTC, after the US
+#             close) with a warning, so a new symbol in SYMBOLS can be fetched and traded before its exchange is added.
+
+#Libraries
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+#Files
+from account_data import *
+
+#Exchange sessions (local time)
+EXCHANGES = {
+    "XNAS": {"tz": "America/New_York", "open": time(9, 30), "close": time(16, 0)},
+    "XNYS": {"tz": "America/New_York", "open": time(9, 30), "close": time(16, 0)},
+    "XETR": {"tz": "Europe/Berlin", "open": time(9, 0), "close": time(17, 30)},
+    "WEEKDAYS": {"tz": "UTC", "open": time(0, 0), "close": time(22, 0)},  #Fallback of unmapped symbols
+}
+SYMBOL_EXCHANGE = {"^NDX": "XNAS", "^SPX": "XNYS", "^GDAXI": "XETR"}
+
+#Full-day closures
+_US_HOLIDAYS = {
+    date(2025, 1, 1), date(2025, 1, 9), date(2025, 1, 20), date(2025, 2, 17), date(2025, 4, 18), date(2025, 5, 26),
+    date(2025, 6, 19), date(2025, 7, 4), date(2025, 9, 1), date(2025, 11, 27), date(2025, 12, 25),
+    date(2026, 1, 1), date(2026, 1, 19), date(2026, 2, 16), date(2026, 4, 3), date(2026, 5, 25),
+    date(2026, 6, 19), date(2026, 7, 3), date(2026, 9, 7), date(2026, 11, 26), date(2026, 12, 25),
+    date(2027, 1, 1), date(2027, 1, 18), date(2027, 2, 15), date(2027, 3, 26), date(2027, 5, 31),
+    date(2027, 6, 18), date(2027, 7, 5), date(2027, 9, 6), date(2027, 11, 25), date(2027, 12, 24),
+}
+HOLIDAYS = {
+    "XNAS": _US_HOLIDAYS,
+    "XNYS": _US_HOLIDAYS,
+    "XETR": {
+        date(2025, 1, 1), date(2025, 4, 18), date(2025, 4, 21), date(2025, 5, 1), date(2025, 12, 24),
+        date(2025, 12, 25), date(2025, 12, 26), date(2025, 12, 31),
+        date(2026, 1, 1), date(2026, 4, 3), date(2026, 4, 6), date(2026, 5, 1), date(2026, 12, 24),
+        date(2026, 12, 25), date(2026, 12, 31),
+        date(2027, 1, 1), date(2027, 3, 26), date(2027, 3, 29), date(2027, 12, 24), date(2027, 12, 31),
+    },
+    "WEEKDAYS": set(),
+}
+
+#Early closes (local close time)
+_US_EARLY_CLOSES = {
+    date(2025, 7, 3): time(13, 0), date(2025, 11, 28): time(13, 0), date(2025, 12, 24): time(13, 0),
+    date(2026, 11, 27): time(13, 0), date(2026, 12, 24): time(13, 0),
+    date(2027, 11, 26): time(13, 0),
+}
+EARLY_CLOSES = {"XNAS": _US_EARLY_CLOSES, "XNYS": _US_EARLY_CLOSES, "XETR": {}, "WEEKDAYS": {}}
+
+_warned = set()
+
+def exchange_of(sym):
+    exchange = SYMBOL_EXCHANGE.get(sym)
+    if exchange is None:
+        if sym not in _warned:
+            print(f"[WARNING] No exchange calendar for {sym} (add it to SYMBOL_EXCHANGE), using weekdays closing at 22:00 UTC")
+            _warned.add(sym)
+        return "WEEKDAYS"
+    return exchange
+
+def is_trading_day(exchange, day):
+    return day.weekday() < 5 and day not in HOLIDAYS[exchange]
+
+#Close of the session on a local day (aware datetime), None if the exchange is closed
+def session_close(exchange, day):
+    if not is_trading_day(exchange, day):
+        return None
+    close = EARLY_CLOSES[exchange].get(day, EXCHANGES[exchange]["close"])
+    return datetime.combine(day, close, tzinfo=ZoneInfo(EXCHANGES[exchange]["tz"]))
+
+#Local date of the last session of a symbol closed at `now`: the date of the newest daily bar available
+def last_session_date(sym, now=None):
+    exchange = exchange_of(sym)
+    now = now or datetime.now(timezone.utc)
+    day = now.astimezone(ZoneInfo(EXCHANGES[exchange]["tz"])).date()
+    while True:
+        close = session_close(exchange, day)
+        if close is not None and close <= now:
+            return day
+        day -= timedelta(days=1)
+
+#First session close of a symbol strictly after `now`
+def next_session_close(sym, now=None):
+    exchange = exchange_of(sym)
+    now = now or datetime.now(timezone.utc)
+    day = now.astimezone(ZoneInfo(EXCHANGES[exchange]["tz"])).date()
+    while True:
+        close = session_close(exchange, day)
+        if close is not None and close > now:
+            return close
+        day += timedelta(days=1)
+
+#When to run the daily cycle of a symbol: shortly after its next close, when the new bar is published
+def next_trigger(sym, now=None):
+    now = now or datetime.now(timezone.utc)
+    delay = timedelta(minutes=SESSION_CLOSE_DELAY_MINUTES)
+    return next_session_close(sym, now - delay) + delay
+
+#Group symbols sharing the same trigger time {trigger: [symbols]}, earliest first
+def group_triggers(schedule):
+    groups = {}
+    for sym, trigger in schedule.items():
+        groups.setdefault(trigger, []).append(sym)
+    return dict(sorted(groups.items()))
+
+def main():
+    now = datetime.now(timezone.utc)
+    print(f"\n======= MARKET SESSIONS ({now.astimezone():%Y-%m-%d %H:%M %Z}) =======")
+    for sym in SYMBOLS:
+        exchange = exchange_of(sym)
+        trigger = next_trigger(sym, now)
+        print(f"{sym:<8} {exchange}  last bar {last_session_date(sym, now)}  "
+              f"next cycle {trigger.astimezone():%a %Y-%m-%d %H:%M} ({trigger:%H:%M %Z})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#LOW-MEMORY MODE: COMPACT DTYPES AND EARLY RELEASE OF PER-SYMBOL DATA (LOW_MEMORY IN ACCOUNT_DATA)
+
+#LOW MEMORY: 1. Prices, indicators and equity are stored as float32 (half the size), signals as int8.
+#            2. Computations that need the precision (TA-Lib, rolling sums) upcast their inputs temporarily.
+#            3. Freed per-symbol data is handed back to the OS after each symbol (gc + malloc_trim on glibc).
+#            Results can differ from the float64 run in the last digits (float32 keeps ~7 significant digits).
+
+#Libraries
+import ctypes
+import gc
+import sys
+import lazy
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+#Files
+from account_data import *
+
+enabled = LOW_MEMORY
+
+#Signals fit in int8 in both modes
+SIGNAL_DTYPE = 'int8'
+
+def enable(flag=True):
+    global enabled
+    enabled = flag
+
+def float_dtype():
+    return np.float32 if enabled else np.float64
+
+#Downcast the float columns of a frame (or a series) to float32 when enabled, no copy otherwise
+def compact(data):
+    if not enabled:
+        return data
+    if isinstance(data, pd.Series):
+        return data.astype(np.float32) if data.dtype == np.float64 else data
+    float_cols = data.select_dtypes(include='float64').columns
+    return data.astype({col: np.float32 for col in float_cols}) if len(float_cols) else data
+
+#Return freed memory to the OS (Python keeps freed arenas and glibc keeps freed heap pages otherwise)
+def release():
+    if not enabled:
+        return
+    gc.collect()
+    if sys.platform.startswith('linux'):
+        try:
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
@@ -1,101 +1,273 @@
 #IMPORTS SIGNALS FROM .CSV AND SENDS ORDERS TO MT5
 
 #Libraries
-import MetaTrader5 as mt5
-import pandas as pd
+import json
+import secrets
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+import lazy
+pd = lazy.module('pandas')
 
 #Files
 from account_data import *
+import market_sessions
+import signals_generation
+
+#Check correct installation (MetaTrader5 runs only on Windows, loaded on the first connection)
+_HAS_MT5 = lazy.available('MetaTrader5')
+if _HAS_MT5:
+    mt5 = lazy.module('MetaTrader5')
+else:
+    mt5 = None
+    print("MetaTrader5 not installed. Install with: pip install MetaTrader5 (Windows only)")
 
 #Config
 mt5_symbol_map = {"^NDX": "US100", "^SPX": "US500", "^GDAXI": "GER40"}
 
-#Fetch latest signal
+#Latest state of a (symbol, profile) written by signal generation, rebuilt from the signals .csv if missing
+#(None if there is no bar)
+def get_latest_state(sym, profile):
+    try:
+        with open(signals_generation.latest_path(sym, profile)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        if profile == 'pac':
+            df = signals_generation.generate_signals(sym, profile)  #No signals file: purchase days from the prices
+        else:
+            df = pd.read_csv(signals_generation.signals_path(sym, profile), index_col='date', parse_dates=True)
+        if df.empty:
+            return None
+        return {'symbol': sym, 'profile': profile, 'bar_date': df.index[-1].strftime('%Y-%m-%d'),
+                'signal': int(df['Signal'].iloc[-1]), 'close': float(df['close'].iloc[-1])}
+
+#Fetch latest signal (0 = Hold if it comes from an older bar than the last closed session)
 def get_latest_signal(sym, profile):
-    csv_path = f"{OUTPUT_DIR}/{sym.lower().replace('^', '')}_signals_{profile}.csv"
-    df = pd.read_csv(csv_path, index_col='date', parse_dates=True)
-    return df['Signal'].iloc[-1]  #Last row
+    state = get_latest_state(sym, profile)
+    if state is None:
+        print(f"[WARNING] {sym} {profile.upper()}: no signal bars, holding")
+        return 0
+    expected = market_sessions.last_session_date(sym)
+    if date.fromisoformat(state['bar_date']) < expected:
+        print(f"[WARNING] {sym} {profile.upper()}: signal of {state['bar_date']} is stale (last session {expected}), holding")
+        return 0
+    return state['signal']
+
+#Long-lived MT5 connection: logs in once, re-authenticates only on failure, caches symbol info and ticks,
+#sends all the orders of a cycle in one batch.
+#api: the MetaTrader5 module or any object exposing the same functions and constants
+#     (initialize, login, shutdown, symbol_info, symbol_select, symbol_info_tick, order_send), e.g. a local stand-in
+class MT5Session:
+    def __init__(self, api=None, account=MT5_ACCOUNT, password=MT5_PASSWORD, server=MT5_SERVER,
+                 tick_ttl=MT5_TICK_CACHE_SECONDS, verbose=True):
+        self.api = api if api is not None else mt5
+        self.verbose = verbose
+        self.account = account
+        self.password = password
+        self.server = server
+        self.tick_ttl = tick_ttl
+        self.connected = False
+        self.logins = 0
+        self._symbol_info = {}
+        self._ticks = {}
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    #Initialize terminal and log into account (no-op if already connected)
+    def connect(self):
+        if self.connected:
+            return True
+        if self.api is None:
+            print("MT5 not available on this machine")
+            return False
+
+        if not self.api.initialize():
+            print("MT5 initialization failed")
+            return False
+
+        if not self.api.login(self.account, password=self.password, server=self.server):
+            print("MT5 login failed. Check credentials/server.")
+            self.api.shutdown()
+            return False
+
+        self.connected = True
+        self.logins += 1
+        return True
+
+    #Drop the connection and log in again (ticks are stale after a disconnect)
+    def reconnect(self):
+        print("[WARNING] MT5 connection lost, re-authenticating...")
+        self.shutdown()
+        return self.connect()
+
+    def shutdown(self):
+        if self.connected:
+            self.api.shutdown()
+        self.connected = False
+        self._ticks.clear()
+
+    #Symbol properties never change during a session: fetch once
+    def symbol_info(self, mt5_symbol):
+        info = self._symbol_info.get(mt5_symbol)
+        if info is None:
+            info = self.api.symbol_info(mt5_symbol)
+            if info is None:
+                return None
+            if not info.visible:
+                self.api.symbol_select(mt5_symbol, True)
+            self._symbol_info[mt5_symbol] = info
+        return info
+
+    #Last tick, reused for tick_ttl seconds so all profiles of a symbol share it
+    def tick(self, mt5_symbol):
+        cached = self._ticks.get(mt5_symbol)
+        if cached is not None and time.monotonic() - cached[0] < self.tick_ttl:
+            return cached[1]
+
+        tick = self.api.symbol_info_tick(mt5_symbol)
+        if tick is None and self.reconnect():
+            tick = self.api.symbol_info_tick(mt5_symbol)
+        if tick is not None:
+            self._ticks[mt5_symbol] = (time.monotonic(), tick)
+        return tick
+
+    #Build the MT5 request for one signal, returns (request, None) or (None, reason to skip)
+    def build_request(self, signal, sym, profile):
+        # Get profile-specific risk parameters (skip PAC as it's not for MT5)
+        if profile == 'pac':
+            return None, "PAC profile doesn't use MT5 trading"
+        if signal not in (1, -1):
+            return None, "No signal (Hold)"
+
+        mt5_symbol = mt5_symbol_map.get(sym, None)
+        if mt5_symbol is None:
+            return None, f"No MT5 symbol mapping for {sym}"
+
+        #Get current info from MT5 symbol
+        if self.symbol_info(mt5_symbol) is None:
+            return None, f"Invalid symbol: {mt5_symbol}"
+        tick = self.tick(mt5_symbol)
+        if tick is None:
+            return None, f"No tick for {mt5_symbol}"
+
+        #Make calculations for SL/TP
+        profile_idx = PROFILES.index(profile)
+        sl_percent = STOP_LOSS[profile_idx]
+        tp_percent = TAKE_PROFIT[profile_idx]
+
+        if signal == 1:  # Buy
+            order_type = self.api.ORDER_TYPE_BUY
+            price = tick.ask  # Buy at ask price
+            sl = price * (1 - sl_percent)  # SL below entry
+            tp = price * (1 + tp_percent)  # TP above entry
+            comment = f"Python Buy {profile.upper()} {secrets.token_hex(4)}"  #Unique: finds the deal after a disconnect
+        else:  # Sell
+            order_type = self.api.ORDER_TYPE_SELL
+            price = tick.bid  # Sell at bid price
+            sl = price * (1 + sl_percent)  # SL above entry
+            tp = price * (1 - tp_percent)  # TP below entry
+            comment = f"Python Sell {profile.upper()} {secrets.token_hex(4)}"
+
+        request = {
+            "action": self.api.TRADE_ACTION_DEAL,
+            "symbol": mt5_symbol,
+            "volume": LOT_SIZE,
+            "type": order_type,
+            "price": price,
+            "sl": sl,
+            "tp": tp,
+            "deviation": SLIPPAGE,
+            "magic": int(MAGIC_NUMBER),  #MT5 magic numbers are integers
+            "comment": comment,
+            "type_time": self.api.ORDER_TIME_GTC,  # Good till cancel
+            "type_filling": self.api.ORDER_FILLING_IOC,  # Immediate or cancel
+        }
+        return request, None
+
+    #Deal of a request the broker already executed (same magic number and unique comment), None if there is none,
+    #False if the deal history cannot be read. The window is wide: deal times are in the broker's server time
+    def executed_deal(self, request):
+        deals = self.api.history_deals_get(datetime.now() - timedelta(days=1), datetime.now() + timedelta(days=1))
+        if deals is None:
+            return False
+        for deal in deals:
+            if deal.magic == int(request['magic']) and deal.comment == request['comment']:
+                return deal
+        return None
+
+    #Send one request. A missing result or a lost connection does not prove the order was not executed: after
+    #re-authenticating, the deal history is checked first and the order is only sent again if it is not there
+    def order_send(self, request):
+        result = self.api.order_send(request)
+        connection_lost = getattr(self.api, 'TRADE_RETCODE_CONNECTION', 10031)
+        if (result is None or result.retcode == connection_lost) and self.reconnect():
+            deal = self.executed_deal(request)
+            if deal is False:
+                print(f"[ERROR] Cannot tell whether '{request['comment']}' was executed, not sending it again")
+                return result
+            if deal is not None:
+                return SimpleNamespace(retcode=self.api.TRADE_RETCODE_DONE, order=deal.order, price=deal.price,
+                                       comment='executed before the disconnect')
+            result = self.api.order_send(request)
+        return result
+
+    #Send a whole cycle of orders [(signal, sym, profile), ...] on one connection, one result per order
+    def send_batch(self, orders):
+        results = []
+        if not self.connect():
+            return [{'symbol': sym, 'profile': profile, 'signal': signal, 'status': 'error',
+                     'comment': 'MT5 not connected'} for signal, sym, profile in orders]
+
+        for signal, sym, profile in orders:
+            entry = {'symbol': sym, 'profile': profile, 'signal': signal}
+            request, reason = self.build_request(signal, sym, profile)
+            if request is None:
+                entry.update({'status': 'skipped', 'comment': reason})
+                results.append(entry)
+                continue
+
+            start = time.perf_counter()
+            result = self.order_send(request)
+            entry['latency_ms'] = (time.perf_counter() - start) * 1000
+
+            if result is None:
+                entry.update({'status': 'error', 'comment': 'order_send returned None'})
+                if self.verbose:
+                    print(f"Order failed for {sym} {profile.upper()}: no result")
+            elif result.retcode != self.api.TRADE_RETCODE_DONE:
+                entry.update({'status': 'rejected', 'retcode': result.retcode, 'comment': result.comment})
+                if self.verbose:
+                    print(f"Order failed for {sym} {profile.upper()}: {result.comment}")
+            else:
+                entry.update({'status': 'done', 'retcode': result.retcode, 'order': result.order,
+                              'price': result.price, 'sl': request['sl'], 'tp': request['tp']})
+                if self.verbose:
+                    print(f"Order executed: {result.order} at price {result.price}")
+                    print(f"  Profile: {profile.upper()}")
+                    print(f"  SL: {request['sl']:.2f} | TP: {request['tp']:.2f}")
+            results.append(entry)
+
+        return results
+
+    #Deals executed by the broker between two datetimes on this bot's positions: the deals of its orders (magic
+    #number) and every deal of the positions they opened (exits by server-side SL/TP carry broker comments)
+    def history_deals(self, date_from, date_to):
+        if not self.connect():
+            return []
+        deals = self.api.history_deals_get(date_from, date_to)
+        if deals is None and self.reconnect():
+            deals = self.api.history_deals_get(date_from, date_to)
+        deals = list(deals or ())
+        magic = int(MAGIC_NUMBER)
+        ours = {deal.position_id for deal in deals if deal.magic == magic}
+        return [deal for deal in deals if deal.magic == magic or deal.position_id in ours]
 
-#Send order
+#Send a single order on a one-off session (prefer MT5Session.send_batch for a whole cycle)
 def send_order_to_mt5(signal, sym, profile):
-    if not mt5.initialize():
-        print("MT5 initialization failed")
-        return
-    
-    #Log into account
-    if not mt5.login(MT5_ACCOUNT, password=MT5_PASSWORD, server=MT5_SERVER):
-        print("MT5 login failed. Check credentials/server.")
-        mt5.shutdown()
-        return
-    
-    mt5_symbol = mt5_symbol_map.get(sym, None)
-    if mt5_symbol is None:
-        print(f"No MT5 symbol mapping for {sym}")
-        mt5.shutdown()
-        return
-    
-    #Get current info from MT5 symbol
-    tick = mt5.symbol_info_tick(mt5_symbol)
-    if tick is None:
-        print(f"Invalid symbol: {mt5_symbol}")
-        mt5.shutdown()
-        return
-    
-    # Get profile-specific risk parameters (skip PAC as it's not for MT5)
-    if profile == 'pac':
-        print("PAC profile doesn't use MT5 trading. Skipping.")
-        mt5.shutdown()
-        return
-    
-    #Make calculations for SL/TP/Trail
-    profile_idx = PROFILES.index(profile)
-    sl_percent = STOP_LOSS[profile_idx]
-    tp_percent = TAKE_PROFIT[profile_idx]
-    trail_percent = TRAIL_PERCENT[profile_idx]
-   
-    sl = 0.0
-    tp = 0.0
-    if signal == 1:  # Buy
-        order_type = mt5.ORDER_TYPE_BUY
-        price = tick.ask  # Buy at ask price
-        sl = price * (1 - sl_percent)  # SL below entry
-        tp = price * (1 + tp_percent)  # TP above entry
-        comment = f"Python Buy {profile.upper()}"
-    elif signal == -1:  # Sell
-        order_type = mt5.ORDER_TYPE_SELL
-        price = tick.bid  # Sell at bid price
-        sl = price * (1 + sl_percent)  # SL above entry
-        tp = price * (1 - tp_percent)  # TP below entry
-        comment = f"Python Sell {profile.upper()}"
-    else:  # Hold
-        print("No signal (Hold). No order sent.")
-        mt5.shutdown()
-        return
-    
-    request = {
-        "action": mt5.TRADE_ACTION_DEAL,
-        "symbol": mt5_symbol,
-        "volume": LOT_SIZE,
-        "type": order_type,
-        "price": price,
-        "sl": sl,
-        "tp": tp,
-        "deviation": SLIPPAGE,
-        "magic": MAGIC_NUMBER,
-        "comment": comment,
-        "type_time": mt5.ORDER_TIME_GTC,  # Good till cancel
-        "type_filling": mt5.ORDER_FILLING_IOC,  # Immediate or cancel
-    }
-    
-    # Send order
-    result = mt5.order_send(request)
-    if result.retcode != mt5.TRADE_RETCODE_DONE:
-        print(f"Order failed: {result.comment}")
-    else:
-        print(f"Order executed: {result.order} at price {result.price}")
-        print(f"  Profile: {profile.upper()}")
-        print(f"  SL: {sl:.2f} ({sl_percent*100:.1f}%)")
-        print(f"  TP: {tp:.2f} ({tp_percent*100:.1f}%)")
-        print(f"  Trailing: {trail_percent*100:.1f}%")
-    
-    mt5.shutdown()
\ No newline at end of file
+    with MT5Session() as session:
+        return session.send_batch([(signal, sym, profile)])[0]
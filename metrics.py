@@ -0,0 +1,119 @@
+#COMPUTES PERFORMANCE METRICS FOR EVERY SYMBOL AND PROFILE IN ONE VECTORIZED PASS (NO MATPLOTLIB NEEDED)
+
+#Libraries
+import lazy
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+#Files
+from account_data import *
+import columnar
+import rolling
+import memory
+
+#Config
+METRICS_PATH = f"{OUTPUT_DIR}/performance_metrics.csv"
+
+#Load every equity curve into one aligned matrix, columns are (symbol, profile)
+def load_equity_matrix(symbols=SYMBOLS, profiles=PROFILES):
+    equity_cols = {}
+    close_cols = {}
+    trades = {}
+
+    for sym in symbols:
+        for profile in profiles:
+            try:
+                df = memory.compact(columnar.read_result(sym, profile, 'equity'))
+                trades_df = columnar.read_result(sym, profile, 'trades')
+            except FileNotFoundError:
+                print(f"[WARNING] Skipping {sym} {profile} — files not found")
+                continue
+            except Exception as e:
+                print(f"[WARNING] Error loading {sym} {profile}: {e}")
+                continue
+
+            equity_cols[(sym, profile)] = df['equity']
+            close_cols[(sym, profile)] = df['close']
+            trades[(sym, profile)] = trades_df
+
+    if not equity_cols:
+        return pd.DataFrame(), pd.DataFrame(), trades
+
+    #Union of all dates, NaN where a symbol did not trade
+    equity = pd.concat(equity_cols, axis=1).sort_index()
+    close = pd.concat(close_cols, axis=1).sort_index()
+    equity.columns.names = ['symbol', 'profile']
+    close.columns.names = ['symbol', 'profile']
+    return equity, close, trades
+
+#Closed trades and win rate for every column from the trade logs
+def trade_stats(trades, columns):
+    num_trades = pd.Series(0.0, index=columns)
+    win_rate = pd.Series(0.0, index=columns)
+
+    #PAC never closes trades: count the monthly buys, win rate N/A
+    for key, trades_df in trades.items():
+        if key[1] == 'pac':
+            num_trades[key] = len(trades_df)
+
+    pnl = {key: df['pnl'] for key, df in trades.items() if key[1] != 'pac' and 'pnl' in df.columns}
+    if pnl:
+        pnl = pd.concat(pnl)
+        closed = (pnl != 0).groupby(level=[0, 1]).sum()
+        winning = (pnl > 0).groupby(level=[0, 1]).sum()
+        num_trades[closed.index] = closed
+        win_rate[closed.index] = (winning / closed.where(closed > 0) * 100).fillna(0)
+
+    return num_trades, win_rate
+
+#Every metric for every (symbol, profile) column at once
+def compute_metrics(equity, close, trades):
+    if equity.empty:
+        return pd.DataFrame()
+
+    capital_per_symbol = INITIAL_DEPOSIT / len(SYMBOLS)
+
+    returns = rolling.daily_returns(equity)
+    bench_returns = rolling.daily_returns(close)
+    mean = returns.mean()
+    std = returns.std()
+
+    peak = equity.cummax()
+    drawdown = (equity - peak) / peak * 100
+
+    num_trades, win_rate = trade_stats(trades, equity.columns)
+
+    table = pd.DataFrame({
+        'Total Return (%)': (equity.ffill().iloc[-1] / capital_per_symbol - 1) * 100,
+        'Sharpe Ratio': (mean / std * np.sqrt(TRADING_DAYS)).where(std != 0, 0),
+        'Max Drawdown (%)': drawdown.min(),
+        'Win Rate (%)': win_rate,
+        'Num Trades': num_trades,
+        'Volatility (%)': std * np.sqrt(TRADING_DAYS) * 100,
+        'Benchmark Volatility (%)': bench_returns.std() * np.sqrt(TRADING_DAYS) * 100,
+    })
+    table.index.names = ['symbol', 'profile']
+
+    #Beta/correlation vs benchmark and latest rolling values
+    return table.join(rolling.rolling_summary(equity, close))
+
+#Save one consolidated table for all symbols and profiles
+def save_metrics(table, path=METRICS_PATH):
+    table.to_csv(path)
+    print(f"Metrics saved for {len(table)} symbol/profile pairs → {path}")
+
+#Load the consolidated table (indexed by symbol, profile)
+def load_metrics(path=METRICS_PATH):
+    return pd.read_csv(path, index_col=['symbol', 'profile'])
+
+def main():
+    equity, close, trades = load_equity_matrix()
+    table = compute_metrics(equity, close, trades)
+    if table.empty:
+        print("[WARNING] No equity curves found, metrics not computed")
+        return table
+    save_metrics(table)
+    return table
+
+if __name__ == "__main__":
+    main()
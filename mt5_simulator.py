@@ -0,0 +1,271 @@
+#LOCAL STAND-IN FOR THE METATRADER5 API TO TEST AND BENCHMARK THE ORDER PATH OFFLINE (LINUX/MACOS)
+
+#SIMULATOR: 1. Implements the subset of the MetaTrader5 API used by metatrader_integration (same names, constants, retcodes).
+#           2. Replays prices from the local price store (<symbol>_historical.csv), one bar per tick request.
+#           3. Configurable latency, rejection rate and slippage models (seeded, reproducible).
+#           4. Netting account: one position per symbol, every deal carries the position it opens, adds to or closes
+#              (position_id = ticket of the opening order). The stop loss/take profit of a position are checked on each
+#              tick and close it with a server-side deal ("[sl <price>]"/"[tp <price>]" comment, like the broker).
+#              Deal times are the broker's server wall clock (MT5_SERVER_TIMEZONE) written as if it were UTC.
+
+#Libraries
+import argparse
+import random
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+
+#Files
+from account_data import *
+import metatrader_integration
+
+#Same fields as the MetaTrader5 result structures (subset)
+Tick = namedtuple('Tick', ['time', 'bid', 'ask', 'last', 'volume'])
+SymbolInfo = namedtuple('SymbolInfo', ['name', 'visible', 'point', 'digits', 'volume_min', 'volume_max'])
+OrderSendResult = namedtuple('OrderSendResult', ['retcode', 'deal', 'order', 'volume', 'price', 'bid', 'ask',
+                                                 'comment', 'request_id', 'request'])
+TradeDeal = namedtuple('TradeDeal', ['ticket', 'order', 'time', 'type', 'magic', 'position_id', 'volume', 'price', 'symbol',
+                                     'comment'])
+
+#Current broker server time as MT5 stamps deals
+def server_time():
+    wall_clock = datetime.now(ZoneInfo(MT5_SERVER_TIMEZONE)).replace(tzinfo=timezone.utc)
+    return int(wall_clock.timestamp())
+
+class MT5Simulator:
+    #MetaTrader5 constants (same values as the real package)
+    ORDER_TYPE_BUY = 0
+    ORDER_TYPE_SELL = 1
+    TRADE_ACTION_DEAL = 1
+    ORDER_TIME_GTC = 0
+    ORDER_FILLING_FOK = 0
+    ORDER_FILLING_IOC = 1
+    TRADE_RETCODE_REQUOTE = 10004
+    TRADE_RETCODE_REJECT = 10006
+    TRADE_RETCODE_DONE = 10009
+    TRADE_RETCODE_INVALID = 10013
+    TRADE_RETCODE_CONNECTION = 10031
+
+    #latency_ms/jitter_ms: base delay and exponential tail of every call to the "terminal"
+    #reject_rate: probability that the broker rejects an order
+    #slippage_points: max adverse slippage per fill (uniform), above the request deviation the order is requoted
+    #tick_step: bars the replay advances on each tick request (0 = frozen prices)
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, reject_rate=0.0, slippage_points=0, spread_points=10,
+                 point=0.1, tick_step=1, seed=0, symbols=SYMBOLS):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.reject_rate = reject_rate
+        self.slippage_points = slippage_points
+        self.spread_points = spread_points
+        self.point = point
+        self.tick_step = tick_step
+        self.rng = random.Random(seed)
+        self.symbols = symbols
+        self.initialized = False
+        self.logged_in = False
+        self.prices = {}
+        self.cursor = {}
+        self.deals = []
+        self.positions = {}  #mt5 symbol -> open position {ticket, type, volume, sl, tp, magic}
+        self._last_error = (1, 'Success')
+        self._ticket = 100000
+
+    #Simulated network/terminal round trip
+    def _delay(self):
+        delay = self.latency_ms
+        if self.jitter_ms > 0:
+            delay += self.rng.expovariate(1 / self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    #Close prices of every mapped symbol from the local price store
+    def _load_prices(self):
+        for sym in self.symbols:
+            mt5_symbol = metatrader_integration.mt5_symbol_map.get(sym)
+            if mt5_symbol is None:
+                continue
+            path = f"{OUTPUT_DIR}/{sym.lower().replace('^', '')}_historical.csv"
+            try:
+                df = pd.read_csv(path, index_col=0, parse_dates=True)
+            except FileNotFoundError:
+                print(f"[WARNING] No price history for {sym}, simulator will not quote {mt5_symbol}")
+                continue
+            self.prices[mt5_symbol] = (df.index.astype('int64') // 10**9, df['close'].to_numpy(dtype=float))
+            self.cursor[mt5_symbol] = 0
+
+    #API: terminal and account
+    def initialize(self, *args, **kwargs):
+        self._delay()
+        if not self.prices:
+            self._load_prices()
+        self.initialized = True
+        return True
+
+    def login(self, login, password=None, server=None, **kwargs):
+        self._delay()
+        self.logged_in = self.initialized
+        return self.logged_in
+
+    def shutdown(self):
+        self.initialized = False
+        self.logged_in = False
+        return True
+
+    def last_error(self):
+        return self._last_error
+
+    #Drop the connection, as a terminal that lost the server (used to test re-authentication)
+    def disconnect(self):
+        self.logged_in = False
+
+    #API: symbols and prices
+    def symbol_info(self, symbol):
+        self._delay()
+        if symbol not in self.prices:
+            self._last_error = (-1, f'Unknown symbol {symbol}')
+            return None
+        return SymbolInfo(symbol, True, self.point, 2, 0.01, 100.0)
+
+    def symbol_select(self, symbol, enable=True):
+        return symbol in self.prices
+
+    def symbol_info_tick(self, symbol):
+        self._delay()
+        if not self.logged_in or symbol not in self.prices:
+            return None
+
+        times, closes = self.prices[symbol]
+        i = self.cursor[symbol]
+        self.cursor[symbol] = (i + self.tick_step) % len(closes)
+        half_spread = self.spread_points * self.point / 2
+        tick = Tick(int(times[i]), closes[i] - half_spread, closes[i] + half_spread, closes[i], 1)
+        self._check_stops(symbol, tick)
+        return tick
+
+    #Server-side stop loss/take profit: a long closes at the bid, a short at the ask
+    def _check_stops(self, symbol, tick):
+        position = self.positions.get(symbol)
+        if position is None:
+            return
+        long = position['type'] == self.ORDER_TYPE_BUY
+        price = tick.bid if long else tick.ask
+        for kind, level in (('sl', position['sl']), ('tp', position['tp'])):
+            if not level:
+                continue
+            hit = (price <= level if long else price >= level) if kind == 'sl' else (price >= level if long else price <= level)
+            if hit:
+                self._ticket += 1
+                exit_type = self.ORDER_TYPE_SELL if long else self.ORDER_TYPE_BUY
+                self.deals.append(TradeDeal(self._ticket, self._ticket, server_time(), exit_type, position['magic'],
+                                            position['ticket'], position['volume'], level, symbol, f"[{kind} {level:.2f}]"))
+                del self.positions[symbol]
+                return
+
+    #Position a deal belongs to (netting): opens, adds to or closes the symbol's position, returns its ticket
+    def _net(self, request):
+        symbol, volume = request['symbol'], request['volume']
+        position = self.positions.get(symbol)
+        if position is None:
+            self.positions[symbol] = {'ticket': self._ticket, 'type': request['type'], 'volume': volume,
+                                      'sl': request.get('sl'), 'tp': request.get('tp'), 'magic': request.get('magic')}
+            return self._ticket
+        if position['type'] == request['type']:
+            position['volume'] += volume
+            position['sl'], position['tp'] = request.get('sl'), request.get('tp')
+            return position['ticket']
+        #Opposite order: closes the position (a larger volume reverses it into a new one)
+        remaining = volume - position['volume']
+        del self.positions[symbol]
+        if remaining > 1e-9:
+            self.positions[symbol] = {'ticket': self._ticket, 'type': request['type'], 'volume': remaining,
+                                      'sl': request.get('sl'), 'tp': request.get('tp'), 'magic': request.get('magic')}
+        elif remaining < -1e-9:
+            self.positions[symbol] = dict(position, volume=-remaining)
+        return position['ticket']
+
+    #API: orders
+    def order_send(self, request):
+        self._delay()
+        self._ticket += 1
+        result = lambda retcode, comment, price=0.0: OrderSendResult(
+            retcode, self._ticket if retcode == self.TRADE_RETCODE_DONE else 0, self._ticket if retcode == self.TRADE_RETCODE_DONE else 0,
+            request.get('volume', 0.0), price, 0.0, 0.0, comment, self._ticket, request)
+
+        if not self.logged_in:
+            return result(self.TRADE_RETCODE_CONNECTION, 'No connection')
+        if request.get('symbol') not in self.prices or request.get('type') not in (self.ORDER_TYPE_BUY, self.ORDER_TYPE_SELL):
+            return result(self.TRADE_RETCODE_INVALID, 'Invalid request')
+        if self.rng.random() < self.reject_rate:
+            return result(self.TRADE_RETCODE_REJECT, 'Request rejected')
+
+        #Adverse slippage in points, requote if larger than the allowed deviation
+        slippage = self.rng.uniform(0, self.slippage_points)
+        if slippage > request.get('deviation', SLIPPAGE):
+            return result(self.TRADE_RETCODE_REQUOTE, 'Requote')
+        direction = 1 if request['type'] == self.ORDER_TYPE_BUY else -1
+        price = request['price'] + direction * slippage * self.point
+
+        self.deals.append(TradeDeal(self._ticket, self._ticket, server_time(), request['type'], request.get('magic'),
+                                    self._net(request), request['volume'], price, request['symbol'], request.get('comment', '')))
+        return result(self.TRADE_RETCODE_DONE, 'Request executed', price)
+
+    def history_deals_get(self, date_from=None, date_to=None, group=None):
+        self._delay()
+        return tuple(self.deals)
+
+#Throughput and submit latency of the order path (MT5Session.send_batch) against the simulator
+def benchmark(orders=1000, batch_size=None, **simulator_args):
+    simulator = MT5Simulator(**simulator_args)
+    session = metatrader_integration.MT5Session(api=simulator, verbose=False)
+    trading_profiles = [p for p in PROFILES if p != 'pac']
+    pairs = [(sym, profile) for sym in SYMBOLS for profile in trading_profiles]
+    batch_size = batch_size or len(pairs)
+
+    requests = [((1 if i % 2 == 0 else -1),) + pairs[i % len(pairs)] for i in range(orders)]
+    results = []
+    start = time.perf_counter()
+    for i in range(0, orders, batch_size):
+        results.extend(session.send_batch(requests[i:i + batch_size]))
+    elapsed = time.perf_counter() - start
+    session.shutdown()
+
+    latencies = np.array([r['latency_ms'] for r in results if 'latency_ms' in r])
+    statuses = pd.Series([r['status'] for r in results]).value_counts().to_dict()
+    report = {
+        'orders': orders,
+        'seconds': elapsed,
+        'orders_per_second': orders / elapsed if elapsed > 0 else float('inf'),
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else float('nan'),
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else float('nan'),
+        'logins': session.logins,
+        'statuses': statuses,
+    }
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MT5 order path against the local simulator")
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--reject-rate', type=float, default=0.0)
+    parser.add_argument('--slippage-points', type=float, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    report = benchmark(args.orders, args.batch_size, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                       reject_rate=args.reject_rate, slippage_points=args.slippage_points, seed=args.seed)
+
+    print(f"\n======= MT5 ORDER PATH BENCHMARK =======")
+    print(f"Orders          : {report['orders']} in {report['seconds']:.3f}s")
+    print(f"Throughput      : {report['orders_per_second']:,.0f} orders/s")
+    print(f"Submit latency  : p50 {report['p50_ms']:.3f} ms | p99 {report['p99_ms']:.3f} ms")
+    print(f"Logins          : {report['logins']}")
+    print(f"Results         : {report['statuses']}")
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#SUCCESSIVE-HALVING OPTIMIZER: MANY PARAMETER SETS ON A SHORT PREFIX OF THE HISTORY, ONLY THE BEST ONES ON THE REST
+
+#HALVING: 1. Every parameter set of the grid is backtested on a short prefix (HALVING_MIN_BARS after the longest
+#            indicator warm-up), the sets are ranked by the chosen metric and only the best 1/HALVING_ETA go on.
+#         2. Survivors are extended to a HALVING_ETA times longer span, ranked again, and so on up to the whole
+#            history. Extending resumes each backtest (position state machine, equity so far) from the end of the
+#            previous span instead of restarting it, so every bar of every set is simulated at most once.
+#         3. Indicators (SMAs, RSI) are computed once per window/period and shared by all the sets using them.
+#         4. Full-history metrics are the same as sweep.py's; the budget spent (bars simulated) is reported against
+#            the full grid (python optimizer.py --verify also runs the full grid and compares the top-k).
+
+#Libraries
+import argparse
+import math
+import time
+import lazy
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+ta = lazy.module('talib')
+
+#Files
+from account_data import *
+import backtesting
+import memory
+import positions
+import signals_generation
+import sweep
+
+#Config
+RESULTS_PATH = f"{OUTPUT_DIR}/halving_results.csv"
+
+#Backtest of one parameter set that can be extended bar by bar ('high' profile rules, the set's stops)
+class PrefixBacktest:
+    __slots__ = ('params', 'rows', 'machine', 'equity', 'trades', 'done')
+
+    def __init__(self, params, rows):
+        self.params = params
+        self.rows = rows  #Positions in the price frame where the set has all its indicators
+        self.machine = positions.PositionStateMachine('high', INITIAL_DEPOSIT / len(SYMBOLS), params['stop_loss'],
+                                                      params['trail'])
+        self.equity = []  #Before tax
+        self.trades = 0
+        self.done = 0  #Rows simulated so far
+
+    #Simulate the set's rows up to price frame position end (excluded), returns the bars simulated
+    def advance(self, end, dates, close, high, low, signal):
+        stop = int(np.searchsorted(self.rows, end))
+        machine, equity = self.machine, self.equity
+        for i in self.rows[self.done:stop].tolist():
+            price = close[i]
+            fills = machine.step(dates[i], price, high[i], low[i], signal[i])
+            if fills:
+                self.trades += sum(1 for fill in fills if fill['pnl'] != 0)
+            equity.append(machine.equity(price))
+        simulated = stop - self.done
+        self.done = stop
+        return simulated
+
+    #Metrics of the span simulated so far (taxes as if the history ended there, like a backtest of the prefix)
+    def stats(self, years):
+        equity = backtesting.italy_tax(self.equity, years[self.rows[:self.done]]).astype(memory.float_dtype())
+        stats = sweep.equity_stats(equity, INITIAL_DEPOSIT / len(SYMBOLS))
+        stats['trades'] = self.trades
+        return stats
+
+#Prefix ends (price frame positions): geometric spans from min_bars after the warm-up up to the whole history
+def rung_ends(start, length, eta, min_bars, candidates, top):
+    span = length - start
+    rungs = 1
+    while span / eta ** rungs >= min_bars and candidates / eta ** rungs >= top:
+        rungs += 1
+    return [start + int(round(span / eta ** (rungs - 1 - r))) for r in range(rungs)]
+
+#Successive halving of the parameter sets of a grid on one symbol's prices, returns the survivors ranked on the
+#whole history and the budget spent
+def successive_halving(df_base, grid=sweep.DEFAULT_GRID, metric='sharpe', top=10, eta=HALVING_ETA,
+                       min_bars=HALVING_MIN_BARS, max_params=None):
+    params = sweep.expand_grid(grid)[:max_params]
+    close = df_base['close']
+
+    #Indicators shared by the sets, computed like signals_generation.compute_signals
+    sma = {w: close.rolling(w).mean().to_numpy() for w in {p['short_ma'] for p in params} | {p['long_ma'] for p in params}}
+    rsi = {n: ta.RSI(close.to_numpy(dtype=np.float64), timeperiod=n) for n in {p['rsi_period'] for p in params}}
+    complete = df_base.notna().all(axis=1).to_numpy()
+
+    signals, candidates = [], []
+    for p in params:
+        ready = complete & ~np.isnan(sma[p['short_ma']]) & ~np.isnan(sma[p['long_ma']]) & ~np.isnan(rsi[p['rsi_period']])
+        rows = np.flatnonzero(ready)
+        if len(rows) == 0:
+            continue
+        signals.append(signals_generation.crossover_signals(sma[p['short_ma']], sma[p['long_ma']], rsi[p['rsi_period']],
+                                                            p['overbought'], p['oversold']).tolist())
+        candidates.append(PrefixBacktest(p, rows))
+    if not candidates:
+        return pd.DataFrame(), {'candidates': 0, 'rungs': [], 'bars': 0, 'full_bars': 0}
+
+    dates = df_base.index
+    years = dates.year.to_numpy()
+    prices = (dates.tolist(), close.tolist(), df_base['high'].tolist(), df_base['low'].tolist())
+    full_bars = sum(len(c.rows) for c in candidates)
+    start = max(int(c.rows[0]) for c in candidates)
+    ends = rung_ends(start, len(df_base), eta, min_bars, len(candidates), top)
+
+    alive = list(range(len(candidates)))
+    bars, rungs = 0, []
+    for r, end in enumerate(ends):
+        for i in alive:
+            bars += candidates[i].advance(end, *prices, signals[i])
+        stats = [candidates[i].stats(years) for i in alive]
+        rungs.append({'end': dates[end - 1], 'candidates': len(alive)})
+        if r == len(ends) - 1:
+            break
+        #Keep the best 1/eta (at least top), ties in grid order
+        order = np.argsort([-s[metric] for s in stats], kind='stable')
+        alive = sorted(alive[j] for j in order[:max(top, math.ceil(len(alive) / eta))])
+
+    table = pd.DataFrame([{**candidates[i].params, **s} for i, s in zip(alive, stats)])
+    budget = {'candidates': len(candidates), 'rungs': rungs, 'bars': bars, 'full_bars': full_bars}
+    return sweep.rank(table, metric), budget
+
+def report(symbol, table, budget, elapsed, metric, top):
+    print(f"\n======= {symbol} SUCCESSIVE HALVING ({budget['candidates']} parameter sets) =======")
+    for rung in budget['rungs']:
+        print(f"  up to {rung['end']:%Y-%m-%d}: {rung['candidates']} sets")
+    print(f"Budget          : {budget['bars']:,} bars simulated of {budget['full_bars']:,} for the full grid "
+          f"({budget['bars'] / max(budget['full_bars'], 1):.1%}) in {elapsed:.1f}s")
+    if not table.empty:
+        print(f"\nTop {top} by {metric}")
+        print(table.head(top).to_string(index=False))
+
+#Full grid on the same prices: top-k overlap and time
+def verify(symbol, df_base, table, metric, top, max_params, elapsed):
+    start = time.perf_counter()
+    rows = []
+    for params in sweep.expand_grid(sweep.DEFAULT_GRID)[:max_params]:
+        stats = sweep.evaluate(df_base, params)
+        if stats is not None:
+            rows.append({**params, **stats})
+    full = sweep.rank(pd.DataFrame(rows), metric)
+    full_elapsed = time.perf_counter() - start
+
+    names = list(sweep.DEFAULT_GRID)
+    keys = lambda t: set(map(tuple, t[names].to_numpy().tolist()))
+    #Sets tied with the k-th best are all equally "top-k"
+    tied = full[full[metric] >= full[metric].iloc[min(top, len(full)) - 1]]
+    same = np.array_equal(table[metric].head(top).to_numpy(), full[metric].head(top).to_numpy())
+    print(f"\nFull grid       : {len(full)} sets in {full_elapsed:.1f}s ({full_elapsed / elapsed:.1f}x the halving time)")
+    print(f"Top {top} found    : {len(keys(table.head(top)) & keys(tied))}/{min(top, len(full))}, "
+          f"same {metric} values: {same}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Successive-halving parameter optimizer")
+    parser.add_argument('--symbols', default=','.join(SYMBOLS))
+    parser.add_argument('--metric', choices=sweep.METRICS, default='sharpe')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--eta', type=int, default=HALVING_ETA, help="Keep 1/eta of the sets at every step")
+    parser.add_argument('--min-bars', type=int, default=HALVING_MIN_BARS, help="Bars of the first (shortest) span")
+    parser.add_argument('--max-params', type=int, default=None, help="Only the first N parameter sets (quick runs)")
+    parser.add_argument('--verify', action='store_true', help="Also run the full grid and compare the top-k")
+    args = parser.parse_args()
+
+    results = []
+    for sym in [s.strip() for s in args.symbols.split(',') if s.strip()]:
+        df_base = signals_generation.load_prices(sym)
+        start = time.perf_counter()
+        table, budget = successive_halving(df_base, sweep.DEFAULT_GRID, args.metric, args.top, args.eta, args.min_bars,
+                                           args.max_params)
+        elapsed = time.perf_counter() - start
+        report(sym, table, budget, elapsed, args.metric, args.top)
+        if args.verify and not table.empty:
+            verify(sym, df_base, table, args.metric, args.top, args.max_params, elapsed)
+        results.append(table.assign(symbol=sym))
+    pd.concat(results).to_csv(RESULTS_PATH, index=False)
+
+if __name__ == "__main__":
+    main()
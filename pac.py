@@ -0,0 +1,125 @@
+#PAC (PIANO ACCUMULO CAPITALE) ENGINE: PURCHASES, HOLDINGS AND EQUITY IN CLOSED FORM, MANY PLAN VARIANTS AT ONCE
+
+#PAC: 1. Purchase days are the first trading day of every month (or week) from the plan's start date.
+#     2. Each plan is a row of a (plans x days) array: shares bought on the purchase days, cumulative holdings and
+#        cash with cumulative sums, daily equity = cash + holdings * close. No loop over the days.
+#     3. Fixed plans invest the same amount at every purchase while the capital lasts (the backtest's PAC profile).
+#        Value-averaging plans buy what brings the holdings' value to amount x purchases made (nothing if already
+#        above target), the last purchase is cut to the cash left.
+#     4. Taxes are applied per plan like every other backtest (backtesting.italy_tax).
+#     Example: python pac.py ^SPX
+
+#Libraries
+import argparse
+import lazy
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+#Files
+from account_data import *
+import backtesting
+import signals_generation
+
+#Purchase days: first trading day of every month/week of sorted dates, on or after start
+def schedule(dates, cadence='monthly', start=None):
+    periods = dates.to_period('M' if cadence == 'monthly' else 'W').asi8
+    first = np.ones(len(dates), dtype=bool)
+    first[1:] = periods[1:] != periods[:-1]
+    if start is not None:
+        first &= dates >= pd.Timestamp(start)
+    return first
+
+#Fixed amount at every purchase while the cash lasts (cash checked before each purchase, like a bar-by-bar loop)
+def _fixed(close, buys, amounts, capital):
+    count = np.cumsum(buys, axis=1)
+    most = int(count[:, -1].max()) if count.size else 0
+
+    #Cash after j purchases, subtracted one purchase at a time
+    steps = np.empty((len(amounts), most + 1))
+    steps[:, 0] = capital
+    steps[:, 1:] = amounts[:, None]
+    cash_after = np.subtract.accumulate(steps, axis=1)
+    affordable = (cash_after[:, :-1] >= amounts[:, None]).sum(axis=1)
+
+    bought = buys & (count <= affordable[:, None])
+    cash = np.take_along_axis(cash_after, np.minimum(count, affordable[:, None]), axis=1)
+    shares = np.where(bought, amounts[:, None] / (close * (1 + COMMISSION)), 0.0)
+    return bought, np.where(bought, amounts[:, None], 0.0), shares, cash
+
+#Value averaging: holdings worth amount x purchases after each purchase, never selling
+def _value_averaging(close, buys, amounts, capital):
+    count = np.cumsum(buys, axis=1)
+    target = np.where(buys, amounts[:, None] * count / close, 0.0)
+    wanted = np.maximum.accumulate(target, axis=1)  #Shares held after each day (no sales)
+    cost = np.diff(wanted, axis=1, prepend=0.0) * close * (1 + COMMISSION)
+
+    #Cut the purchases to the cash available
+    spent = np.cumsum(cost, axis=1)
+    invested = np.minimum(spent, capital) - np.minimum(spent - cost, capital)
+    shares = invested / (close * (1 + COMMISSION))
+    return buys & (invested > 0), invested, shares, capital - np.cumsum(invested, axis=1)
+
+#Daily equity (before tax) of a batch of plans on one price series
+#buys: (plans x days) purchase days, amounts: per plan, value_averaging: per plan (default all fixed)
+#returns purchase flags, amounts invested, shares bought, equity (all plans x days)
+def simulate(close, buys, amounts, capital, value_averaging=None):
+    close = np.asarray(close, dtype=np.float64)
+    buys = np.atleast_2d(buys)
+    amounts = np.broadcast_to(np.asarray(amounts, dtype=np.float64), (len(buys),))
+    value_averaging = np.zeros(len(buys), dtype=bool) if value_averaging is None else np.asarray(value_averaging)
+
+    bought = np.zeros(buys.shape, dtype=bool)
+    invested, shares, cash = np.zeros(buys.shape), np.zeros(buys.shape), np.zeros(buys.shape)
+    for engine, rows in ((_fixed, ~value_averaging), (_value_averaging, value_averaging)):
+        if rows.any():
+            bought[rows], invested[rows], shares[rows], cash[rows] = engine(close, buys[rows], amounts[rows], capital)
+
+    equity = cash + np.cumsum(shares, axis=1) * close
+    return {'bought': bought, 'invested': invested, 'shares': shares, 'equity': equity}
+
+#Equity (before tax) and trades of the backtest's PAC profile: fixed monthly amount on the given purchase days
+def backtest(df, buys, amount, capital):
+    close = df['close'].to_numpy(dtype=np.float64)
+    result = simulate(close, buys, amount, capital)
+    bought, shares = result['bought'][0], result['shares'][0]
+    if not bought.any():
+        return result['equity'][0], pd.DataFrame()
+    trades = pd.DataFrame({'date': df.index[bought], 'action': 'buy', 'price': close[bought],
+                           'amount': result['invested'][0][bought], 'shares': shares[bought],
+                           'commission': shares[bought] * close[bought] * COMMISSION})
+    return result['equity'][0], trades
+
+#Every combination of amounts, cadences, fixed/value averaging and start dates
+def variants(amounts, cadences=('monthly',), modes=('fixed',), starts=(None,)):
+    return [{'amount': a, 'cadence': c, 'mode': m, 'start': s}
+            for a in amounts for c in cadences for m in modes for s in starts]
+
+#Equity after tax of a batch of plan variants on one price frame, and a summary row per plan
+def evaluate(df, plans, capital=INITIAL_DEPOSIT / len(SYMBOLS)):
+    buys = np.array([schedule(df.index, p['cadence'], p['start']) for p in plans])
+    result = simulate(df['close'], buys, [p['amount'] for p in plans], capital, [p['mode'] == 'value' for p in plans])
+    years = df.index.year.to_numpy()
+    equity = np.array([backtesting.italy_tax(row, years) for row in result['equity']])
+
+    peak = np.maximum.accumulate(equity, axis=1)
+    table = pd.DataFrame(plans).assign(purchases=result['bought'].sum(axis=1), invested=result['invested'].sum(axis=1),
+                                       final_equity=equity[:, -1], total_return=(equity[:, -1] / capital - 1) * 100,
+                                       max_drawdown=((equity - peak) / peak).min(axis=1) * 100)
+    return equity, table
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PAC plan variants")
+    parser.add_argument('symbol', nargs='?', default=SYMBOLS[0])
+    parser.add_argument('--amounts', default=','.join(str(PAC_MONTHLY_INVESTMENT / len(SYMBOLS) * k) for k in (0.5, 1, 2)))
+    parser.add_argument('--starts', default='', help="Comma-separated start dates (default: first bar)")
+    args = parser.parse_args()
+
+    df = signals_generation.load_prices(args.symbol)
+    starts = [s.strip() for s in args.starts.split(',') if s.strip()] or [None]
+    plans = variants([float(a) for a in args.amounts.split(',')], ('monthly', 'weekly'), ('fixed', 'value'), starts)
+    _, table = evaluate(df, plans)
+    print(f"\n======= {args.symbol} PAC VARIANTS ({len(plans)} plans, {len(df)} days) =======")
+    print(table.sort_values('final_equity', ascending=False).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
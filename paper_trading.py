@@ -0,0 +1,192 @@
+#PAPER TRADING: STEPS THE BACKTEST POSITION/STOP STATE MACHINE ON EVERY NEW BAR AND RECONCILES IT WITH THE BROKER
+
+#PAPER TRADING: 1. One positions.PositionStateMachine per (symbol, trading profile), persisted in paper_state_<symbol>.json.
+#               2. First run: the whole signal history is replayed without recording fills, so the paper account
+#                  starts in the same position as the backtest.
+#               3. Every later run steps the machine on the new bars only and appends the simulated fills
+#                  to paper_fills_<symbol>.csv.
+#               4. Reconciliation matches the simulated fills with the broker deals of the same day (symbol, side,
+#                  profile) and writes the price differences to paper_reconciliation_<symbol>.csv. Deals belong to a
+#                  profile through their position (the entry order's comment names it, SL/TP exits do not), and are
+#                  dated in the exchange's time zone from the broker's server time (MT5_SERVER_TIMEZONE).
+
+#Libraries
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+import lazy
+pd = lazy.module('pandas')
+
+#Files
+from account_data import *
+import market_sessions
+import positions
+import signals_generation
+
+FILL_COLUMNS = ['date', 'symbol', 'profile', 'action', 'price', 'pnl', 'commission', 'equity', 'recorded_at']
+
+#Paths
+def state_path(sym):
+    return f"{OUTPUT_DIR}/paper_state_{sym.lower().replace('^', '')}.json"
+
+def fills_path(sym):
+    return f"{OUTPUT_DIR}/paper_fills_{sym.lower().replace('^', '')}.csv"
+
+def reconciliation_path(sym):
+    return f"{OUTPUT_DIR}/paper_reconciliation_{sym.lower().replace('^', '')}.csv"
+
+def trading_profiles():
+    return [p for p in PROFILES if p != 'pac']
+
+def load_state(sym):
+    try:
+        with open(state_path(sym)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+#Atomic write so a crash never leaves half-written positions
+def save_state(sym, state):
+    path = state_path(sym)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_path, path)
+
+#Step every profile of a symbol on the bars it has not seen yet, returns the new simulated fills
+def update_symbol(sym):
+    state = load_state(sym)
+    fills = []
+
+    for profile in trading_profiles():
+        df = pd.read_csv(signals_generation.signals_path(sym, profile), index_col='date', parse_dates=True).sort_index()
+        entry = state.get(profile)
+        if entry is None:
+            #Start from the backtest position: replay the history without recording fills
+            machine = positions.PositionStateMachine(profile, INITIAL_DEPOSIT / len(SYMBOLS))
+            new_bars, record = df, False
+        else:
+            machine = positions.PositionStateMachine.from_dict(entry['machine'])
+            new_bars, record = df[df.index > pd.Timestamp(entry['last_bar'])], True
+
+        bars = zip(new_bars.index, new_bars['close'].tolist(), new_bars['high'].tolist(), new_bars['low'].tolist(),
+                   new_bars['Signal'].tolist())
+        for date, price, high, low, signal in bars:
+            trades = machine.step(date, price, high, low, signal)
+            if trades and record:
+                for trade in trades:
+                    fills.append({'date': date.strftime('%Y-%m-%d'), 'symbol': sym, 'profile': profile,
+                                  'action': trade['action'], 'price': trade['price'], 'pnl': trade['pnl'],
+                                  'commission': trade['commission'], 'equity': machine.equity(price),
+                                  'recorded_at': time.time()})
+
+        last_bar = df.index[-1].strftime('%Y-%m-%d') if len(df) else (entry or {}).get('last_bar')
+        state[profile] = {'last_bar': last_bar, 'machine': machine.to_dict(),
+                          'equity': machine.equity(df['close'].iloc[-1]) if len(df) else machine.cash}
+
+    if fills:
+        path = fills_path(sym)
+        pd.DataFrame(fills, columns=FILL_COLUMNS).to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+        for fill in fills:
+            print(f"[PAPER] {fill['date']} {sym} {fill['profile'].upper()}: {fill['action']} at {fill['price']:.2f}")
+    save_state(sym, state)
+    return fills
+
+#Simulated fills of a symbol ([] if none yet)
+def load_fills(sym):
+    try:
+        return pd.read_csv(fills_path(sym))
+    except (FileNotFoundError, pd.errors.EmptyDataError):
+        return pd.DataFrame(columns=FILL_COLUMNS)
+
+#Exchange date of a deal: MT5 timestamps are the broker's server wall clock written as if it were UTC
+def deal_date(deal_time, sym):
+    server_time = datetime.fromtimestamp(deal_time, timezone.utc).replace(tzinfo=ZoneInfo(MT5_SERVER_TIMEZONE))
+    exchange_tz = ZoneInfo(market_sessions.EXCHANGES[market_sessions.exchange_of(sym)]['tz'])
+    return server_time.astimezone(exchange_tz).strftime('%Y-%m-%d')
+
+#Match simulated fills with broker deals (MT5 TradeDeal-like objects) of the same day, symbol, side and profile.
+#Returns one row per fill or unmatched deal: status 'matched', 'missing at broker' or 'broker only'
+def reconcile(sym, deals, mt5_symbol, fills=None):
+    fills = load_fills(sym) if fills is None else fills
+    buy_actions = ('buy', 'buy (SL)')
+
+    #Our orders carry "Python Buy HIGH <id>"/"Python Sell LOW <id>" comments: the profile of each position
+    profiles = {}
+    for deal in deals:
+        words = str(deal.comment).split()
+        if deal.magic == int(MAGIC_NUMBER) and len(words) >= 3 and words[0] == 'Python':
+            profiles.setdefault(deal.position_id, words[2].lower())
+
+    unmatched = []
+    for deal in deals:
+        if deal.symbol != mt5_symbol:
+            continue
+        unmatched.append({'date': deal_date(deal.time, sym), 'profile': profiles.get(deal.position_id),
+                          'side': 'buy' if deal.type == 0 else 'sell', 'price': deal.price, 'ticket': deal.ticket})
+
+    rows = []
+    for fill in fills.itertuples(index=False):
+        side = 'buy' if fill.action in buy_actions else 'sell'
+        match = next((d for d in unmatched if d['date'] == fill.date and d['profile'] == fill.profile
+                      and d['side'] == side), None)
+        row = {'date': fill.date, 'symbol': sym, 'profile': fill.profile, 'action': fill.action, 'paper_price': fill.price}
+        if match is None:
+            row.update({'status': 'missing at broker'})
+        else:
+            unmatched.remove(match)
+            row.update({'broker_price': match['price'], 'ticket': match['ticket'],
+                        'slippage_pct': (match['price'] / fill.price - 1) * 100, 'status': 'matched'})
+        rows.append(row)
+
+    for deal in unmatched:
+        rows.append({'date': deal['date'], 'symbol': sym, 'profile': deal['profile'], 'action': deal['side'],
+                     'broker_price': deal['price'], 'ticket': deal['ticket'], 'status': 'broker only'})
+
+    report = pd.DataFrame(rows, columns=['date', 'symbol', 'profile', 'action', 'paper_price', 'broker_price',
+                                         'ticket', 'slippage_pct', 'status'])
+    report.to_csv(reconciliation_path(sym), index=False)
+    return report
+
+#Reconcile a symbol with the deals of an MT5Session (from the first simulated fill until now)
+def reconcile_with_session(sym, session, mt5_symbol):
+    fills = load_fills(sym)
+    if fills.empty:
+        return None
+    date_from = datetime.strptime(fills['date'].min(), '%Y-%m-%d')
+    deals = session.history_deals(date_from, datetime.now() + timedelta(days=1))
+    report = reconcile(sym, deals, mt5_symbol, fills)
+    counts = report['status'].value_counts().to_dict()
+    print(f"[PAPER] {sym} reconciliation: {counts}")
+    return report
+
+#Current paper positions of all symbols
+def positions_table(symbols=SYMBOLS):
+    rows = []
+    for sym in symbols:
+        for profile, entry in load_state(sym).items():
+            machine = entry['machine']
+            side = 'long' if machine['position'] > 0 else 'short' if machine['position'] < 0 else 'flat'
+            rows.append({'symbol': sym, 'profile': profile, 'last_bar': entry['last_bar'], 'side': side,
+                         'entry_price': machine['entry_price'] if side != 'flat' else None,
+                         'stop': machine['sl_price'] if side != 'flat' else None, 'equity': entry['equity']})
+    return pd.DataFrame(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Step the paper accounts on the new bars")
+    parser.add_argument('--reset', action='store_true', help="Start again from the backtest positions")
+    args = parser.parse_args()
+
+    for sym in SYMBOLS:
+        if args.reset and os.path.exists(state_path(sym)):
+            os.remove(state_path(sym))
+        update_symbol(sym)
+
+    print(f"\n======= PAPER POSITIONS =======")
+    print(positions_table().to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#AGGREGATES THE EQUITY CURVES OF ALL SYMBOLS INTO ONE PORTFOLIO PER PROFILE (NO MATPLOTLIB NEEDED)
+
+#Libraries
+import lazy
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+#Files
+from account_data import *
+import metrics
+
+#Config
+#Total returns from Moneyfarm website from 2018-01-01
+robo_total_returns = {
+    "low": ROBO_LOW_RISK,       # Portfolio 1: 1,8% net total from 2018
+    "medium": ROBO_MEDIUM_RISK, # Portfolio 4: 34,9% net total from 2018
+    "high": ROBO_HIGH_RISK      # Portfolio 7: 88,8% net total from 2018
+}
+
+#Moneyfarm volatility estimates from website
+robo_volatilities = {
+    "low": 4.5,      # Portfolio 1: Very low risk, mostly fixed income
+    "medium": 8.5,   # Portfolio 4: Balanced risk, mixed allocation
+    "high": 14.0     # Portfolio 7: High risk, predominantly equity
+}
+
+#Net daily return of the Moneyfarm portfolio from START_DATE to end_date (after annual commission)
+def robo_net_daily_return(profile, end_date):
+    total_days = (end_date - pd.Timestamp(START_DATE)).days
+    if total_days <= 0:
+        return 0
+
+    #Gross daily return from total return over full period
+    daily_return_rate = (1 + robo_total_returns[profile]) ** (1 / total_days) - 1
+
+    #Apply annual commission (1.28% per year) as daily deduction
+    daily_commission_factor = (1 - ROBO_COMMISSION) ** (1 / 365)
+    return (1 + daily_return_rate) * daily_commission_factor - 1
+
+#Build the dates x symbols equity matrix of one profile
+def profile_matrix(equity, profile, alignment=PORTFOLIO_ALIGNMENT):
+    if profile not in equity.columns.get_level_values('profile'):
+        return pd.DataFrame()
+
+    matrix = equity.xs(profile, axis=1, level='profile')
+
+    if alignment == 'intersection':
+        #Only dates where every symbol has data
+        return matrix.dropna()
+    elif alignment == 'union':
+        #Dates of this profile only (the frame holds every profile's), carrying each symbol's last equity over its
+        #holidays (cash before its first date)
+        capital_per_symbol = INITIAL_DEPOSIT / len(SYMBOLS)
+        return matrix.dropna(how='all').ffill().fillna(capital_per_symbol)
+    else:
+        raise ValueError(f"Unknown portfolio alignment: {alignment}")
+
+#Derive every portfolio series used by the charts from the equity matrix, once per profile
+def build_portfolios(equity, alignment=PORTFOLIO_ALIGNMENT):
+    portfolios = {}
+    if equity.empty:
+        return portfolios
+
+    for profile in PROFILES:
+        matrix = profile_matrix(equity, profile, alignment)
+        if matrix.empty:
+            if profile in equity.columns.get_level_values('profile'):
+                print(f"[WARNING] No common dates for profile {profile}")
+            continue
+
+        total_equity = matrix.sum(axis=1)
+        daily_ret = total_equity.pct_change().dropna()
+        std = daily_ret.std()
+        peak = total_equity.cummax()
+        drawdown = (total_equity - peak) / peak * 100
+
+        data = {
+            'matrix': matrix,
+            'equity': total_equity,
+            'returns': (total_equity / INITIAL_DEPOSIT - 1) * 100,
+            'equity_ratio': total_equity / INITIAL_DEPOSIT,
+            'daily_ret': daily_ret,
+            'drawdown': drawdown,
+            'volatility': std * np.sqrt(TRADING_DAYS) * 100,
+            'sharpe': daily_ret.mean() / std * np.sqrt(TRADING_DAYS) if std != 0 else 0,
+            'max_dd': drawdown.min(),
+        }
+
+        #Moneyfarm comparison over the same dates
+        if profile in robo_total_returns:
+            net_daily_return = robo_net_daily_return(profile, total_equity.index[-1])
+            robo_equity = INITIAL_DEPOSIT * (1 + net_daily_return) ** np.arange(len(total_equity))
+            data['robo_equity'] = pd.Series(robo_equity, index=total_equity.index)
+            data['robo_returns'] = (robo_equity / INITIAL_DEPOSIT - 1) * 100
+            data['robo_ratio'] = data['robo_equity'] / INITIAL_DEPOSIT
+
+        portfolios[profile] = data
+
+    return portfolios
+
+#Summary table of the aggregated portfolios (one row per profile)
+def summary_table(portfolios):
+    summary_data = []
+    for profile in PROFILES:
+        if profile not in portfolios:
+            continue
+
+        data = portfolios[profile]
+        summary_data.append({
+            'Profile': PROFILE_LABELS[profile],
+            'Final Value ($)': f"${data['equity'].iloc[-1]:,.2f}",
+            'Total Return (%)': f"{data['returns'].iloc[-1]:+.2f}%",
+            'Volatility (%)': f"{data['volatility']:.2f}%",
+            'Sharpe Ratio': f"{data['sharpe']:.2f}",
+            'Max Drawdown (%)': f"{data['max_dd']:.2f}%"
+        })
+
+    return pd.DataFrame(summary_data)
+
+def main():
+    equity, close, trades = metrics.load_equity_matrix()
+    summary_df = summary_table(build_portfolios(equity))
+    summary_df.to_csv(f"{OUTPUT_DIR}/portfolio_performance_summary.csv", index=False)
+    print(summary_df.to_string(index=False))
+    return summary_df
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#POSITION AND STOP STATE MACHINE OF THE TRADING PROFILES, SHARED BY THE BACKTEST AND THE LIVE ENGINE
+
+#STATE MACHINE: 1. Flat: a buy (1) or sell (-1) signal opens a long/short position with all the cash, initial stop at STOP_LOSS.
+#               2. Open: the stop trails the best high (long) or low (short) by TRAIL_PERCENT.
+#               3. The position is closed at the stop price when the bar's low (long) or high (short) touches it,
+#                  a new position can be opened on the same bar.
+
+#Files
+from account_data import *
+
+class PositionStateMachine:
+    __slots__ = ('profile', 'stop_loss_pct', 'trail_pct', 'cash', 'position', 'entry_price', 'sl_price',
+                 'max_price', 'min_price')
+
+    #stop_loss/trail override the profile's STOP_LOSS/TRAIL_PERCENT (e.g. parameter sweeps)
+    def __init__(self, profile, cash, stop_loss=None, trail=None):
+        profile_idx = PROFILES.index(profile)
+        self.profile = profile
+        self.stop_loss_pct = STOP_LOSS[profile_idx] if stop_loss is None else stop_loss
+        self.trail_pct = TRAIL_PERCENT[profile_idx] if trail is None else trail
+        self.cash = cash
+        self.position = 0
+        self.entry_price = self.sl_price = self.max_price = self.min_price = 0.0
+
+    #Process one bar, returns the trades it generated (usually none)
+    def step(self, date, price, high, low, signal):
+        trades = ()
+        position = self.position
+
+        #Trailing stop update
+        if position > 0:
+            self.max_price = max(self.max_price, high)
+            self.sl_price = max(self.sl_price, self.max_price * (1 - self.trail_pct))
+        elif position < 0:
+            self.min_price = min(self.min_price, low)
+            self.sl_price = min(self.sl_price, self.min_price * (1 + self.trail_pct))
+
+        #Stop-loss check
+        if position > 0 and low <= self.sl_price:
+            sl_price = self.sl_price
+            pnl = position * (sl_price - self.entry_price)
+            commission_cost = position * sl_price * COMMISSION
+            self.cash = position * sl_price - commission_cost
+            trades = ({'date': date, 'action': 'sell (SL)', 'price': sl_price, 'pnl': pnl, 'commission': commission_cost},)
+            position = self.position = 0
+        elif position < 0 and high >= self.sl_price:
+            sl_price = self.sl_price
+            pnl = abs(position) * (self.entry_price - sl_price)
+            commission_cost = abs(position) * sl_price * COMMISSION
+            self.cash += abs(position) * sl_price - commission_cost
+            trades = ({'date': date, 'action': 'buy (SL)', 'price': sl_price, 'pnl': pnl, 'commission': commission_cost},)
+            position = self.position = 0
+
+        #New entries (only when flat)
+        if position == 0:
+            if signal == 1:
+                shares = self.cash / (price * (1 + COMMISSION))  #Account for commission on entry
+                self.position = shares
+                self.entry_price = price
+                commission_cost = shares * price * COMMISSION
+                self.sl_price = price * (1 - self.stop_loss_pct)
+                self.max_price = price
+                trades += ({'date': date, 'action': 'buy', 'price': price, 'pnl': 0, 'commission': commission_cost},)
+                self.cash = 0
+            elif signal == -1:
+                shares = self.cash / (price * (1 + COMMISSION))  #Account for commission on entry
+                self.position = -shares
+                self.entry_price = price
+                commission_cost = shares * price * COMMISSION
+                self.sl_price = price * (1 + self.stop_loss_pct)
+                self.min_price = price
+                trades += ({'date': date, 'action': 'sell', 'price': price, 'pnl': 0, 'commission': commission_cost},)
+                self.cash += shares * price - commission_cost
+
+        return trades
+
+    #Process one bar from its intrabar bars (lists of highs, lows, closes): stops are checked bar by bar in time order,
+    #then the signal is applied at the close (price); returns the trades
+    def step_intrabar(self, date, intrabar, price, signal):
+        trades = ()
+        for high, low, close in zip(*intrabar):
+            trades += self.step(date, close, high, low, 0)
+        #The intrabar bars already moved the stops: the close only opens positions
+        return trades + self.step(date, price, price, price, signal)
+
+    #Can the bar's range reach the stop? Same level as step() (stop trailed by the bar's extreme first):
+    #when it cannot, the order of the high and the low within the bar does not matter
+    def stop_reachable(self, high, low):
+        if self.position > 0:
+            return low <= max(self.sl_price, max(self.max_price, high) * (1 - self.trail_pct))
+        if self.position < 0:
+            return high >= min(self.sl_price, min(self.min_price, low) * (1 + self.trail_pct))
+        return False
+
+    def equity(self, price):
+        return self.cash + self.position * price
+
+    #Plain dict of the state (JSON-serializable), e.g. to persist paper positions
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name not in ('stop_loss_pct', 'trail_pct')}
+
+    @classmethod
+    def from_dict(cls, state):
+        machine = cls(state['profile'], state['cash'])
+        for name, value in state.items():
+            setattr(machine, name, value)
+        return machine
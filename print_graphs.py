@@ -7,86 +7,54 @@ import numpy as np
 
 #Files
 from account_data import *
-
-#Config
-#Total returns from Moneyfarm website from 2018-01-01
-robo_total_returns = {
-    "low": ROBO_LOW_RISK,       # Portfolio 1: 1,8% net total from 2018
-    "medium": ROBO_MEDIUM_RISK, # Portfolio 4: 34,9% net total from 2018  
-    "high": ROBO_HIGH_RISK      # Portfolio 7: 88,8% net total from 2018
-}
-
-#Moneyfarm volatility estimates from website
-robo_volatilities = {
-    "low": 4.5,      # Portfolio 1: Very low risk, mostly fixed income
-    "medium": 8.5,   # Portfolio 4: Balanced risk, mixed allocation
-    "high": 14.0     # Portfolio 7: High risk, predominantly equity
-}
-
-#Helper to annualized volatility
-def annualized_vol(returns, trading_days=252):
-    return returns.std() * (trading_days ** 0.5) * 100 
+import metrics
+import portfolio
+import rolling
+import instrumentation
+import memory
+import results_store
+from portfolio import robo_total_returns, robo_volatilities
 
 #Loop over each symbol and generate/save all graphs
-def main():
-    #Dictionary to store portfolio-level data across all symbols
-    portfolio_data = {profile: [] for profile in PROFILES}
-    
+#run_id: draw a run of the results store instead of the latest backtest files
+def main(run_id=None):
+    #Load all equity curves once and compute every metric in a single pass
+    record = instrumentation.start('metrics')
+    if run_id is None:
+        equity, close, trades = metrics.load_equity_matrix()
+    else:
+        equity, close, trades = results_store.load_equity_matrix(run_id)
+    metrics_table = metrics.compute_metrics(equity, close, trades)
+    if not metrics_table.empty and run_id is None:
+        metrics.save_metrics(metrics_table)
+    instrumentation.stop(record, rows=equity.size)
+
     for sym in SYMBOLS:
         base = sym.lower().replace('^', '')
+        record = instrumentation.start('graphs', sym)
         
         #Collect data for all profiles for combined graphs
         all_profiles_data = {}
         
         for profile in PROFILES:
-            equity_path = f"{OUTPUT_DIR}/equity_curve_{base}_{profile}.csv"
-            trades_path = f"{OUTPUT_DIR}/backtest_trades_{base}_{profile}.csv"
-
-            try:
-                df = pd.read_csv(equity_path, index_col=0, parse_dates=True)
-                trades_df = pd.read_csv(trades_path)
-            except FileNotFoundError:
-                print(f"[WARNING] Skipping {sym} {profile} — files not found")
-                continue
-            except Exception as e:
-                print(f"[WARNING] Error loading {sym} {profile}: {e}")
+            if (sym, profile) not in trades:
                 continue
 
-            #Store for portfolio aggregation
-            portfolio_data[profile].append({
-                'symbol': sym,
-                'df': df.copy(),
-                'trades_df': trades_df.copy()
-            })
+            df = pd.DataFrame({'close': close[(sym, profile)], 'equity': equity[(sym, profile)]}).dropna()
+            trades_df = trades[(sym, profile)]
+            row = metrics_table.loc[(sym, profile)]
 
             #Adjust robo comparison to account for split capital
             capital_per_symbol = INITIAL_DEPOSIT / len(SYMBOLS)
             
             if profile in robo_total_returns:
-                robo_total_return_from_2018 = robo_total_returns[profile]
-                
-                #Calculate daily return rate from START_DATE (2018-01-01) to end of data
                 start_date = pd.Timestamp(START_DATE)
-                end_date = df.index[-1]
-                total_days_from_2018 = (end_date - start_date).days
-                
-                if total_days_from_2018 > 0:
-                    #Calculate gross daily return from total return over full period
-                    daily_return_rate = (1 + robo_total_return_from_2018) ** (1 / total_days_from_2018) - 1
-                    
-                    #Apply annual commission (1.28% per year) as daily deduction
-                    annual_commission_factor = (1 - ROBO_COMMISSION)
-                    daily_commission_factor = annual_commission_factor ** (1 / 365)
-                    
-                    # Net daily return after commission
-                    net_daily_return = (1 + daily_return_rate) * daily_commission_factor - 1
-                else:
-                    net_daily_return = 0
+                net_daily_return = portfolio.robo_net_daily_return(profile, df.index[-1])
                 
                 #Build robo equity curve: calculate days from 2018-01-01 for each date in backtest
                 days_from_2018 = (df.index - start_date).days.values
                 df['robo_equity'] = capital_per_symbol * (1 + net_daily_return) ** days_from_2018
-                robo_total_return = robo_total_return_from_2018 * 100  # Use actual total return from config
+                robo_total_return = robo_total_returns[profile] * 100  # Use actual total return from config
                 df['robo_returns'] = (df['robo_equity'] / df['robo_equity'].iloc[0] - 1) * 100
             else:
                 df['robo_equity'] = np.nan
@@ -98,53 +66,27 @@ def main():
             df['benchmark_returns'] = (df['close'] / df['close'].iloc[0] - 1) * 100
             df['peak'] = df['equity'].cummax()
             df['drawdown'] = (df['equity'] - df['peak']) / df['peak'] * 100
-            df['daily_ret'] = df['equity'].pct_change().dropna()
-            
-            #Calculate performance metrics
-            max_dd = df['drawdown'].min()
-            sharpe = df['daily_ret'].mean() / df['daily_ret'].std() * (252 ** 0.5) if df['daily_ret'].std() != 0 else 0
-            total_return = (df['equity'].iloc[-1] / capital_per_symbol - 1) * 100
-            
-            if profile == 'pac':
-                total_closed = len(trades_df)
-                win_rate = 0  # N/A for PAC
-            else:
-                total_closed = len(trades_df[trades_df['pnl'] != 0]) if 'pnl' in trades_df.columns else 0
-                win_rate = (len(trades_df[trades_df['pnl'] > 0]) / total_closed * 100) if total_closed > 0 else 0
-            
-            #Store volatility data
-            algo_vol = annualized_vol(df['daily_ret'])
-            bench_daily_ret = df['close'].pct_change().dropna()
-            bench_vol = annualized_vol(bench_daily_ret)
             
             #Store all data for combined graphs
             all_profiles_data[profile] = {
                 'df': df,
                 'trades_df': trades_df,
-                'algo_vol': algo_vol,
-                'bench_vol': bench_vol,
+                'algo_vol': row['Volatility (%)'],
+                'bench_vol': row['Benchmark Volatility (%)'],
                 'robo_vol': robo_volatilities.get(profile, 0),
                 'robo_total_return': robo_total_return,
                 'metrics': {
-                    'Total Return (%)': total_return,
-                    'Sharpe Ratio': sharpe,
-                    'Max Drawdown (%)': max_dd,
-                    'Win Rate (%)': win_rate,
-                    'Num Trades': total_closed
+                    'Total Return (%)': row['Total Return (%)'],
+                    'Sharpe Ratio': row['Sharpe Ratio'],
+                    'Max Drawdown (%)': row['Max Drawdown (%)'],
+                    'Win Rate (%)': row['Win Rate (%)'],
+                    'Num Trades': row['Num Trades']
                 }
             }
-            
-            #Save individual metrics CSV
-            try:
-                pd.Series(all_profiles_data[profile]['metrics']).to_csv(
-                    f"{OUTPUT_DIR}/performance_metrics_{base}_{profile}.csv"
-                )
-                print(f"Metrics saved for {sym} {profile}")
-            except Exception as e:
-                print(f"[WARNING] Could not save metrics for {sym} {profile}: {e}")
 
         if not all_profiles_data:
             print(f"[WARNING] No data available for {sym}, skipping graphs")
+            instrumentation.stop(record, rows=0)
             continue
 
         #1) Equity Curves (per symbol)
@@ -511,62 +453,60 @@ def main():
             except Exception as e:
                 print(f"[WARNING] Could not create PAC timeline for {sym}: {e}")
 
+        #8) Rolling Analytics (per symbol, computed here so only one symbol's windows are in memory)
+        try:
+            columns = [(sym, profile) for profile in PROFILES if profile in all_profiles_data]
+            rolling_data = rolling.rolling_analytics(equity[columns], close[columns])
+            fig, axes = plt.subplots(2, 2, figsize=(18, 13), sharex=True)
+            fig.suptitle(f'Rolling {ROLLING_WINDOW}-Day Analytics - {sym}', 
+                        fontsize=FONT_CONFIG['suptitle'], fontweight='bold', y=0.995)
+            
+            panels = [(axes[0, 0], 'sharpe', 'Sharpe Ratio'),
+                      (axes[0, 1], 'volatility', 'Annualized Volatility (%)'),
+                      (axes[1, 0], 'max_drawdown', 'Max Drawdown in Window (%)'),
+                      (axes[1, 1], 'beta', f'Beta vs {sym}')]
+            
+            for ax, key, title in panels:
+                for profile in PROFILES:
+                    if profile not in all_profiles_data:
+                        continue
+                    series = rolling_data[key][(sym, profile)].dropna()
+                    ax.plot(series.index, series, label=PROFILE_LABELS[profile], 
+                           linewidth=2, color=COLOR_CONFIG[profile], alpha=0.9)
+                ax.set_title(title, fontsize=FONT_CONFIG['axis_label'], fontweight='bold')
+                ax.tick_params(axis='both', labelsize=FONT_CONFIG['tick_label'])
+                ax.grid(True, alpha=0.3)
+                ax.axhline(y=0, color=COLOR_CONFIG['neutral'], linestyle='-', linewidth=0.8, alpha=0.5)
+            
+            axes[0, 0].legend(fontsize=FONT_CONFIG['legend'], loc='best')
+            plt.tight_layout()
+            plt.savefig(f"{OUTPUT_DIR}/rolling_analytics_all_profiles_{base}.png", dpi=300, bbox_inches='tight')
+            plt.close()
+            print(f"Rolling analytics saved for {sym}")
+        except Exception as e:
+            print(f"[WARNING] Could not create rolling analytics for {sym}: {e}")
+        
+        instrumentation.stop(record, rows=sum(len(data['df']) for data in all_profiles_data.values()))
+
+        #This symbol's charts are done: drop its frames before the next one
+        for profile in PROFILES:
+            trades.pop((sym, profile), None)
+        del all_profiles_data
+        memory.release()
+
+    #Only the equity matrix is needed from here on
+    del close, trades, metrics_table
+    memory.release()
+
     #Aggregated Graphs (total portfolio)
     print("\n" + "="*60)
     print("Generating aggregated graphs...")
     print("="*60)
     
-    #Sum equity curves across all symbols for each profile
+    #Build every portfolio series once, shared by all the charts below
+    record = instrumentation.start('graphs_portfolio')
     try:
-        aggregated_portfolios = {}
-        
-        for profile in PROFILES:
-            if not portfolio_data[profile]:
-                continue
-                
-            #Find common date index across all symbols
-            date_indices = [data['df'].index for data in portfolio_data[profile]]
-            common_index = date_indices[0]
-            for idx in date_indices[1:]:
-                common_index = common_index.intersection(idx)
-            
-            if len(common_index) == 0:
-                print(f"[WARNING] No common dates for profile {profile}")
-                continue
-            
-            #Sum equity across all symbols
-            total_equity = pd.Series(0, index=common_index)
-            for data in portfolio_data[profile]:
-                df = data['df']
-                total_equity += df.loc[common_index, 'equity']
-            
-            aggregated_portfolios[profile] = {
-                'equity': total_equity,
-                'returns': (total_equity / INITIAL_DEPOSIT - 1) * 100
-            }
-        
-        #Generate Moneyfarm comparison
-        for profile in ['low', 'medium', 'high']:
-            if profile not in aggregated_portfolios:
-                continue
-                
-            robo_total_return_from_2018 = robo_total_returns[profile]
-            common_index = aggregated_portfolios[profile]['equity'].index
-            start_date = pd.Timestamp(START_DATE)
-            days_since_start = (common_index[-1] - start_date).days
-            
-            if days_since_start > 0:
-                daily_return_rate = (1 + robo_total_return_from_2018) ** (1 / days_since_start) - 1
-                annual_commission_factor = (1 - ROBO_COMMISSION)
-                daily_commission_factor = annual_commission_factor ** (1 / 365)
-                net_daily_return = (1 + daily_return_rate) * daily_commission_factor - 1
-            else:
-                net_daily_return = 0
-            
-            days_in_backtest = len(common_index)
-            robo_equity = INITIAL_DEPOSIT * (1 + net_daily_return) ** np.arange(days_in_backtest)
-            aggregated_portfolios[profile]['robo_equity'] = pd.Series(robo_equity, index=common_index)
-            aggregated_portfolios[profile]['robo_returns'] = (robo_equity / INITIAL_DEPOSIT - 1) * 100
+        aggregated_portfolios = portfolio.build_portfolios(equity)
         
         #1) Portfolio-Level Cumulative Returns (Linear Scale)
         fig, ax = plt.subplots(figsize=(20, 10))
@@ -615,9 +555,8 @@ def main():
             if profile not in aggregated_portfolios:
                 continue
             data = aggregated_portfolios[profile]
-            #Convert to equity ratio for log scale (avoid log of negative numbers)
-            equity_ratio = data['equity'] / INITIAL_DEPOSIT
-            ax.plot(data['equity'].index, equity_ratio, 
+            #Equity ratio for log scale (avoid log of negative numbers)
+            ax.plot(data['equity'].index, data['equity_ratio'], 
                    label=f'Algorithm - {PROFILE_LABELS[profile]}', 
                    linewidth=3, color=COLOR_CONFIG[profile], alpha=0.9)
         
@@ -625,8 +564,7 @@ def main():
         for profile in ['low', 'medium', 'high']:
             if profile in aggregated_portfolios and 'robo_equity' in aggregated_portfolios[profile]:
                 data = aggregated_portfolios[profile]
-                robo_ratio = data['robo_equity'] / INITIAL_DEPOSIT
-                ax.plot(data['equity'].index, robo_ratio, 
+                ax.plot(data['equity'].index, data['robo_ratio'], 
                        label=f'Moneyfarm - {PROFILE_LABELS[profile]}', 
                        linewidth=2.5, color=COLOR_CONFIG[profile], linestyle='--', alpha=0.6)
         
@@ -701,10 +639,8 @@ def main():
                 continue
             
             data = aggregated_portfolios[profile]
-            returns_series = data['equity'].pct_change().dropna()
-            
             total_return = data['returns'].iloc[-1]
-            volatility = annualized_vol(returns_series)
+            volatility = data['volatility']
             
             ax.scatter(volatility, total_return, s=500, color=COLOR_CONFIG[profile], 
                       alpha=0.7, edgecolors='black', linewidths=2, 
@@ -726,8 +662,7 @@ def main():
         ax.axhline(y=0, color=COLOR_CONFIG['neutral'], linestyle='-', linewidth=1, alpha=0.5)
         
         #Add diagonal lines for Sharpe ratio reference
-        max_vol = max([annualized_vol(aggregated_portfolios[p]['equity'].pct_change().dropna()) 
-                      for p in aggregated_portfolios.keys()])
+        max_vol = max([aggregated_portfolios[p]['volatility'] for p in aggregated_portfolios.keys()])
         for sharpe in [0.5, 1.0, 1.5, 2.0]:
             x_line = np.linspace(0, max_vol * 1.2, 100)
             y_line = sharpe * x_line
@@ -741,34 +676,7 @@ def main():
         print("Portfolio risk-return scatter saved")
         
         #5) Final Performance Summary Table
-        summary_data = []
-        for profile in PROFILES:
-            if profile not in aggregated_portfolios:
-                continue
-            
-            data = aggregated_portfolios[profile]
-            returns_series = data['equity'].pct_change().dropna()
-            
-            final_equity = data['equity'].iloc[-1]
-            total_return = data['returns'].iloc[-1]
-            volatility = annualized_vol(returns_series)
-            sharpe = returns_series.mean() / returns_series.std() * (252 ** 0.5) if returns_series.std() != 0 else 0
-            
-            #Calculate drawdown
-            peak = data['equity'].cummax()
-            drawdown = (data['equity'] - peak) / peak * 100
-            max_dd = drawdown.min()
-            
-            summary_data.append({
-                'Profile': PROFILE_LABELS[profile],
-                'Final Value ($)': f"${final_equity:,.2f}",
-                'Total Return (%)': f"{total_return:+.2f}%",
-                'Volatility (%)': f"{volatility:.2f}%",
-                'Sharpe Ratio': f"{sharpe:.2f}",
-                'Max Drawdown (%)': f"{max_dd:.2f}%"
-            })
-        
-        summary_df = pd.DataFrame(summary_data)
+        summary_df = portfolio.summary_table(aggregated_portfolios)
         summary_df.to_csv(f"{OUTPUT_DIR}/portfolio_performance_summary.csv", index=False)
         print("Portfolio performance summary saved")
         
@@ -808,6 +716,7 @@ def main():
         
     except Exception as e:
         print(f"[ERROR] Failed to create portfolio-level graphs: {e}")
+    instrumentation.stop(record, rows=equity.size)
 
     print("\n" + "="*60)
     print("All portfolio graphs completed")
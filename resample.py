@@ -0,0 +1,97 @@
+#WEEKLY/MONTHLY/QUARTERLY BARS FROM THE DAILY PRICE STORE, CACHED ON DISK AND EXTENDED AS NEW DAILY BARS ARRIVE
+
+#RESAMPLE: 1. Daily bars outside the symbol's exchange sessions (weekends, listed holidays) are left out, the others
+#             are grouped by calendar week/month/quarter: open = first, high = max, low = min, close = last,
+#             volume = sum. Each bar is dated on its last session, so the newest bar can be a period in progress.
+#          2. Every timeframe is cached next to the daily store (<symbol>_historical_<tf>.csv). An update only
+#             re-aggregates the daily bars from the start of the last cached period (the one that may have been in
+#             progress), and nothing is read from the daily store when the cache is newer than it. The cache is
+#             rebuilt when its last complete bar no longer matches the daily store (history revised).
+#          3. signals_generation and backtesting take a timeframe ('D' = the daily store itself) and name their
+#             files with its suffix (e.g. spx_signals_high_w.csv).
+#          Example: python resample.py W M
+
+#Libraries
+import argparse
+import os
+import lazy
+pd = lazy.module('pandas')
+
+#Files
+from account_data import *
+import market_sessions
+import memory
+
+#Config
+TIMEFRAMES = {'W': 'W', 'M': 'M', 'Q': 'Q'}  #Timeframe -> pandas period
+
+#File name suffix of a timeframe ('' for daily)
+def suffix(timeframe):
+    return '' if timeframe == 'D' else f"_{timeframe.lower()}"
+
+def timeframe_path(sym, timeframe):
+    return f"{OUTPUT_DIR}/{sym.lower().replace('^', '')}_historical{suffix(timeframe)}.csv"
+
+#Daily bars of the symbol's exchange sessions (all of them if the symbol has no calendar)
+def sessions_only(sym, daily):
+    exchange = market_sessions.SYMBOL_EXCHANGE.get(sym)
+    if exchange is None:
+        return daily
+    trading = [market_sessions.is_trading_day(exchange, day) for day in daily.index.date]
+    return daily[trading]
+
+#OHLCV bars of a timeframe from daily bars (sorted), dated on the last session of each period
+def aggregate(daily, timeframe):
+    periods = daily.index.to_period(TIMEFRAMES[timeframe])
+    bars = daily.assign(date=daily.index).groupby(periods, sort=True).agg(
+        date=('date', 'last'), open=('open', 'first'), high=('high', 'max'), low=('low', 'min'),
+        close=('close', 'last'), volume=('volume', 'sum'))
+    return bars.set_index('date')
+
+#Bring the cached timeframe up to date with the daily store, returns the bars
+def update(sym, timeframe):
+    daily_path, path = timeframe_path(sym, 'D'), timeframe_path(sym, timeframe)
+    cached = pd.read_csv(path, index_col='date', parse_dates=True) if os.path.exists(path) else None
+    if cached is not None and os.path.getmtime(path) >= os.path.getmtime(daily_path):
+        return cached
+
+    daily = sessions_only(sym, pd.read_csv(daily_path, index_col='date', parse_dates=True).sort_index())
+    if cached is not None and len(cached) >= 2:
+        #The last complete bar must still close where the daily store does, otherwise the history changed
+        last_complete = cached.index[-2]
+        if last_complete in daily.index and daily.at[last_complete, 'close'] == cached['close'].iloc[-2]:
+            start = cached.index[-1].to_period(TIMEFRAMES[timeframe]).start_time
+            bars = pd.concat([cached.iloc[:-1], aggregate(daily[daily.index >= start], timeframe)])
+        else:
+            print(f"[WARNING] {sym} daily history changed, rebuilding the {timeframe} bars")
+            cached = None
+    if cached is None or len(cached) < 2:
+        bars = aggregate(daily, timeframe)
+
+    #Rewritten even when unchanged: the new modification time marks it up to date
+    tmp_path = f"{path}.tmp"
+    bars.to_csv(tmp_path, index_label='date')
+    os.replace(tmp_path, path)
+    return bars
+
+#Bars of a timeframe ready for signals/backtests ('D': the daily store)
+def load(sym, timeframe='D'):
+    if timeframe == 'D':
+        df = pd.read_csv(timeframe_path(sym, 'D'), index_col='date', parse_dates=True).sort_index()
+    else:
+        df = update(sym, timeframe)
+    return memory.compact(df)
+
+def main():
+    parser = argparse.ArgumentParser(description="Update the cached timeframes of the price store")
+    parser.add_argument('timeframes', nargs='*', choices=list(TIMEFRAMES), help="Default: all of them")
+    parser.add_argument('--symbols', default=','.join(SYMBOLS))
+    args = parser.parse_args()
+
+    for sym in [s.strip() for s in args.symbols.split(',') if s.strip()]:
+        for timeframe in args.timeframes or list(TIMEFRAMES):
+            bars = update(sym, timeframe)
+            print(f"{sym} {timeframe}: {len(bars)} bars up to {bars.index[-1]:%Y-%m-%d} → {timeframe_path(sym, timeframe)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+#EMBEDDED RESULTS STORE (SQLITE): PARAMETERS, DATA FINGERPRINT, EQUITY CURVES, TRADES AND METRICS OF EVERY RUN
+
+#STORE: 1. One row per run (config parameters as JSON, fingerprint of the price store, git commit), every result
+#          row carries its run_id, so runs are never overwritten and can be compared.
+#       2. equity, trades and metrics are indexed on (run_id, symbol, profile, date): loading one run or one
+#          symbol reads only its rows, cross-run queries by profile/metric use their own indexes.
+#       3. Bulk inserts: one transaction per run, executemany in batches of INSERT_BATCH rows.
+#       4. Metrics of every calendar year are stored with the run (period_metrics): best() over a year is an
+#          indexed lookup, other periods are computed by sqlite from the period's equity rows.
+#       5. load_equity_matrix() returns the same (equity, close, trades) as metrics.load_equity_matrix(),
+#          so print_graphs and metrics can read a stored run.
+
+#Libraries
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+from datetime import datetime
+import lazy
+pd = lazy.module('pandas')
+
+#Files
+import account_data
+from account_data import *
+
+#Config
+STORE_PATH = f"{OUTPUT_DIR}/results.sqlite"
+INSERT_BATCH = 10000
+LOWER_IS_BETTER = {'Volatility (%)', 'Benchmark Volatility (%)', 'Rolling Volatility (last, %)', 'Beta'}  #Risk measures
+PARAM_NAMES = ['PROFILES', 'SHORT_MA', 'LONG_MA', 'RSI_PERIOD', 'RSI_OVERBOUGHT', 'RSI_OVERSOLD', 'STOP_LOSS',
+               'TRAIL_PERCENT', 'TAKE_PROFIT', 'SYMBOLS', 'INITIAL_DEPOSIT', 'COMMISSION', 'PAC_MONTHLY_INVESTMENT',
+               'ITALY_CAPITAL_GAINS_TAX', 'START_DATE', 'PORTFOLIO_ALIGNMENT', 'TRADING_DAYS', 'ROLLING_WINDOW']
+TRADE_COLUMNS = ['date', 'action', 'price', 'pnl', 'amount', 'shares', 'commission']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    git_commit TEXT,
+    data_fingerprint TEXT,
+    params TEXT,
+    note TEXT
+);
+CREATE TABLE IF NOT EXISTS equity (
+    run_id INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    date TEXT NOT NULL,
+    close REAL,
+    equity REAL,
+    PRIMARY KEY (run_id, symbol, profile, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS equity_profile_date ON equity (profile, date);
+CREATE TABLE IF NOT EXISTS trades (
+    run_id INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    date TEXT NOT NULL,
+    action TEXT,
+    price REAL,
+    pnl REAL,
+    amount REAL,
+    shares REAL,
+    commission REAL
+);
+CREATE INDEX IF NOT EXISTS trades_run_symbol_profile_date ON trades (run_id, symbol, profile, date);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, symbol, profile, metric)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS metrics_metric_profile ON metrics (metric, profile, value);
+CREATE TABLE IF NOT EXISTS period_metrics (
+    run_id INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    period TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, symbol, profile, period, metric)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS period_metrics_metric_period ON period_metrics (metric, period, profile, value);
+"""
+
+def connect(path=STORE_PATH):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")  #Readers (charts, queries) are not blocked while a run is written
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+#Config values that define a run
+def run_params():
+    return {name: getattr(account_data, name) for name in PARAM_NAMES}
+
+#Content hash of the price store of the given symbols
+def data_fingerprint(symbols=SYMBOLS):
+    import scheduler
+    digest = hashlib.sha1()
+    for sym in symbols:
+        path = f"{OUTPUT_DIR}/{sym.lower().replace('^', '')}_historical.csv"
+        digest.update(f"{sym}:{scheduler.file_hash(path, {})}".encode())
+    return digest.hexdigest()
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _insert(conn, table, columns, rows):
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    for start in range(0, len(rows), INSERT_BATCH):
+        conn.executemany(sql, rows[start:start + INSERT_BATCH])
+
+#Plain Python values for sqlite (NaN -> NULL)
+def _rows(frame):
+    return frame.astype(object).where(frame.notna(), None).values.tolist()
+
+#Store one run (matrices as returned by metrics.load_equity_matrix, table by metrics.compute_metrics), returns its run_id
+def record_run(equity, close, trades, metrics_table, symbols=SYMBOLS, note=None, path=STORE_PATH):
+    long = pd.DataFrame({'close': close.stack(level=[0, 1], future_stack=True),
+                         'equity': equity.stack(level=[0, 1], future_stack=True)}).dropna(subset=['equity'])
+    long = long.reset_index()
+    long.columns = ['date', 'symbol', 'profile', 'close', 'equity']
+    long['date'] = long['date'].dt.strftime('%Y-%m-%d')
+
+    trade_rows = []
+    for (sym, profile), trades_df in trades.items():
+        frame = trades_df.reindex(columns=TRADE_COLUMNS)
+        frame.insert(0, 'profile', profile)
+        frame.insert(0, 'symbol', sym)
+        trade_rows += _rows(frame)
+
+    metric_rows = []
+    if not metrics_table.empty:
+        values = metrics_table.stack(future_stack=True).reset_index()
+        metric_rows = _rows(values)
+
+    conn = connect(path)
+    try:
+        with conn:
+            run_id = conn.execute("INSERT INTO runs (created_at, git_commit, data_fingerprint, params, note) VALUES (?, ?, ?, ?, ?)",
+                                  (datetime.now().isoformat(timespec='seconds'), git_commit(), data_fingerprint(symbols),
+                                   json.dumps(run_params()), note)).lastrowid
+            _insert(conn, 'equity', ['run_id', 'symbol', 'profile', 'date', 'close', 'equity'],
+                    [[run_id] + row for row in _rows(long[['symbol', 'profile', 'date', 'close', 'equity']])])
+            _insert(conn, 'trades', ['run_id', 'symbol', 'profile'] + TRADE_COLUMNS, [[run_id] + row for row in trade_rows])
+            _insert(conn, 'metrics', ['run_id', 'symbol', 'profile', 'metric', 'value'], [[run_id] + row for row in metric_rows])
+            years = period_metrics(conn, run_id, period=YEAR).stack(future_stack=True).reset_index()
+            _insert(conn, 'period_metrics', ['run_id', 'symbol', 'profile', 'period', 'metric', 'value'], _rows(years))
+    finally:
+        conn.close()
+    return run_id
+
+#Cycle task: store the backtests and the metrics written by the graphs stage as a new run
+def record_cycle():
+    import metrics
+    equity, close, trades = metrics.load_equity_matrix()
+    if equity.empty:
+        print("[WARNING] No equity curves found, run not stored")
+        return False
+    run_id = record_run(equity, close, trades, metrics.load_metrics())
+    print(f"Run {run_id} stored → {STORE_PATH}")
+    return True
+
+#All runs, newest first
+def list_runs(path=STORE_PATH):
+    conn = connect(path)
+    try:
+        return pd.read_sql_query("SELECT run_id, created_at, git_commit, data_fingerprint, note FROM runs ORDER BY run_id DESC", conn)
+    finally:
+        conn.close()
+
+def latest_run_id(conn):
+    row = conn.execute("SELECT MAX(run_id) FROM runs").fetchone()
+    return row[0]
+
+def stored_params(conn, run_id):
+    return json.loads(conn.execute("SELECT params FROM runs WHERE run_id = ?", (run_id,)).fetchone()[0])
+
+#(symbol, profile) keys sorted as in a run's SYMBOLS/PROFILES (rows come back from sqlite in key order)
+def config_order(keys, params):
+    symbols, profiles = params['SYMBOLS'], params['PROFILES']
+    rank = lambda key: (symbols.index(key[0]) if key[0] in symbols else len(symbols),
+                        profiles.index(key[1]) if key[1] in profiles else len(profiles))
+    return sorted(keys, key=rank)
+
+def _filters(run_id, symbols, profiles, start=None, end=None):
+    clauses, params = ([], []) if run_id is None else (["run_id = ?"], [run_id])
+    if symbols is not None:
+        clauses.append(f"symbol IN ({', '.join('?' * len(symbols))})")
+        params += list(symbols)
+    if profiles is not None:
+        clauses.append(f"profile IN ({', '.join('?' * len(profiles))})")
+        params += list(profiles)
+    if start is not None:
+        clauses.append("date >= ?")
+        params.append(str(start))
+    if end is not None:
+        clauses.append("date <= ?")
+        params.append(str(end))
+    return " AND ".join(clauses) or "1", params
+
+#Equity/close matrices and trade logs of a stored run (latest if run_id is None), same layout as metrics.load_equity_matrix
+def load_equity_matrix(run_id=None, symbols=None, profiles=None, start=None, end=None, path=STORE_PATH):
+    conn = connect(path)
+    try:
+        run_id = latest_run_id(conn) if run_id is None else run_id
+        where, params = _filters(run_id, symbols, profiles, start, end)
+        long = pd.read_sql_query(f"SELECT symbol, profile, date, close, equity FROM equity WHERE {where}", conn,
+                                 params=params, parse_dates=['date'])
+        trade_rows = pd.read_sql_query(f"SELECT symbol, profile, {', '.join(TRADE_COLUMNS)} FROM trades WHERE {where} "
+                                       "ORDER BY rowid", conn, params=params)
+        params = stored_params(conn, run_id)
+    finally:
+        conn.close()
+
+    trades = {}
+    for key, frame in trade_rows.groupby(['symbol', 'profile'], sort=False):
+        trades[key] = frame.drop(columns=['symbol', 'profile']).dropna(axis=1, how='all').reset_index(drop=True)
+    if long.empty:
+        return pd.DataFrame(), pd.DataFrame(), trades
+
+    #Columns in the run's SYMBOLS/PROFILES order, like the files it was stored from
+    wide = long.pivot(index='date', columns=['symbol', 'profile'])
+    order = config_order(wide['equity'].columns, params)
+    equity, close = wide['equity'][order], wide['close'][order]
+    trades = {key: trades.get(key, pd.DataFrame(columns=TRADE_COLUMNS)) for key in order}
+    return equity, close, trades
+
+#Stored metrics of a run as a (symbol, profile) table like performance_metrics.csv
+def load_metrics(run_id=None, path=STORE_PATH):
+    conn = connect(path)
+    try:
+        run_id = latest_run_id(conn) if run_id is None else run_id
+        long = pd.read_sql_query("SELECT symbol, profile, metric, value FROM metrics WHERE run_id = ?", conn, params=[run_id])
+        params = stored_params(conn, run_id)
+    finally:
+        conn.close()
+    table = long.pivot(index=['symbol', 'profile'], columns='metric', values='value')
+    table.columns.name = None
+    return table.loc[config_order(table.index, params)]
+
+#Per-curve sums of the rows of each period, all runs in one pass: first/last equity, deepest drawdown, and count,
+#sum and sum of squares of the daily returns (own, benchmark, and both on the dates where both exist)
+PERIOD_SUMS = """
+WITH curve AS (
+    SELECT run_id, symbol, profile, {period} AS period, equity,
+           equity / LAG(equity) OVER w - 1 AS r,
+           close / LAG(close) OVER w - 1 AS b,
+           MAX(equity) OVER (w ROWS UNBOUNDED PRECEDING) AS peak,
+           FIRST_VALUE(equity) OVER w AS first,
+           LAST_VALUE(equity) OVER (w ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) AS last
+    FROM equity WHERE {where}
+    WINDOW w AS (PARTITION BY run_id, symbol, profile, {period} ORDER BY date)
+)
+SELECT run_id, symbol, profile, period, MAX(first) AS first, MAX(last) AS last,
+       MIN((equity - peak) / peak) * 100 AS drawdown,
+       COUNT(r) AS n_r, SUM(r) AS s_r, SUM(r * r) AS ss_r,
+       COUNT(b) AS n_b, SUM(b) AS s_b, SUM(b * b) AS ss_b,
+       COUNT(r * b) AS n_p, SUM(r * b) AS s_rb,
+       SUM(CASE WHEN b IS NOT NULL THEN r END) AS s_pr, SUM(CASE WHEN b IS NOT NULL THEN r * r END) AS ss_pr,
+       SUM(CASE WHEN r IS NOT NULL THEN b END) AS s_pb, SUM(CASE WHEN r IS NOT NULL THEN b * b END) AS ss_pb
+FROM curve GROUP BY run_id, symbol, profile, period
+"""
+PERIOD_TRADES = """
+SELECT run_id, symbol, profile, {period} AS period, COUNT(*) AS rows, SUM(pnl != 0) AS closed, SUM(pnl > 0) AS winning
+FROM trades WHERE {where} GROUP BY run_id, symbol, profile, period
+"""
+YEAR = "substr(date, 1, 4)"
+PERIOD_METRICS = ['Total Return (%)', 'Sharpe Ratio', 'Max Drawdown (%)', 'Win Rate (%)', 'Num Trades', 'Volatility (%)',
+                  'Benchmark Volatility (%)', 'Beta', 'Correlation']
+
+#Sample variance from count, sum and sum of squares (NaN under 2 values)
+def _variance(n, total, squares):
+    n = n.where(n > 1)
+    return ((squares - total * total / n) / (n - 1)).clip(lower=0)
+
+#PERIOD_METRICS of every stored curve matching the filters, one row per (run_id, symbol, profile, period), computed
+#by sqlite from the period's rows with the definitions of metrics.compute_metrics (Total Return is the period's own)
+def period_metrics(conn, run_id=None, profile=None, start=None, end=None, period="''"):
+    where, params = _filters(run_id, None, None if profile is None else [profile], start, end)
+    keys = ['run_id', 'symbol', 'profile', 'period']
+    sums = pd.read_sql_query(PERIOD_SUMS.format(where=where, period=period), conn, params=params).set_index(keys)
+    trades = pd.read_sql_query(PERIOD_TRADES.format(where=where, period=period), conn, params=params).set_index(keys)
+    trades = trades.reindex(sums.index).fillna(0)
+
+    annual = TRADING_DAYS ** 0.5
+    std = _variance(sums['n_r'], sums['s_r'], sums['ss_r']) ** 0.5
+    cov = (sums['s_rb'] - sums['s_pr'] * sums['s_pb'] / sums['n_p'].where(sums['n_p'] > 0)) / (sums['n_p'].where(sums['n_p'] > 1) - 1)
+    bench_var = _variance(sums['n_p'], sums['s_pb'], sums['ss_pb'])
+    pac = sums.index.get_level_values('profile') == 'pac'
+    closed = trades['closed'].where(~pac, trades['rows'])  #PAC: monthly buys, win rate N/A
+    return pd.DataFrame({
+        'Total Return (%)': (sums['last'] / sums['first'] - 1) * 100,
+        'Sharpe Ratio': (sums['s_r'] / sums['n_r'].where(sums['n_r'] > 0) / std * annual).where(std != 0, 0),
+        'Max Drawdown (%)': sums['drawdown'],
+        'Win Rate (%)': (trades['winning'] / closed.where(closed > 0) * 100).where(~pac).fillna(0),
+        'Num Trades': closed,
+        'Volatility (%)': std * annual * 100,
+        'Benchmark Volatility (%)': _variance(sums['n_b'], sums['s_b'], sums['ss_b']) ** 0.5 * annual * 100,
+        'Beta': cov / bench_var,
+        'Correlation': cov / (_variance(sums['n_p'], sums['s_pr'], sums['ss_pr']) * bench_var) ** 0.5,
+    }, columns=PERIOD_METRICS)
+
+#The year a start/end pair spans exactly (e.g. 2022-01-01 to 2022-12-31), None for any other period
+def calendar_year(start, end):
+    if start is None or end is None:
+        return None
+    start, end = str(start), str(end)
+    return start[:4] if start[4:] == '-01-01' and end == f"{start[:4]}-12-31" else None
+
+#Best (symbol, profile, run) by a metric across all runs, curves without a value are left out. With start/end the
+#metrics are those of the period (e.g. best Sharpe for the high profile in 2022: stored with the run). Risk measures
+#rank lowest first (LOWER_IS_BETTER), ascending overrides the direction
+def best(metric, profile=None, start=None, end=None, top=10, path=STORE_PATH, ascending=None):
+    ascending = metric in LOWER_IS_BETTER if ascending is None else ascending
+    columns = ['run_id', 'symbol', 'profile', metric]
+    year = calendar_year(start, end)
+    conn = connect(path)
+    try:
+        #Stored values: ranked by sqlite on the (metric, ..., value) indexes
+        if (start is None and end is None) or (metric in PERIOD_METRICS and year is not None):
+            table, params = ('metrics', [metric]) if year is None else ('period_metrics', [metric, year])
+            sql = f"SELECT run_id, symbol, profile, value FROM {table} WHERE metric = ? AND value IS NOT NULL"
+            if year is not None:
+                sql += " AND period = ?"
+            if profile is not None:
+                sql += " AND profile = ?"
+                params.append(profile)
+            sql += f" ORDER BY value {'ASC' if ascending else 'DESC'} LIMIT ?"
+            return pd.read_sql_query(sql, conn, params=params + [top]).rename(columns={'value': metric})
+        if metric in PERIOD_METRICS:
+            table, run_ids = period_metrics(conn, profile=profile, start=start, end=end).droplevel('period'), None
+        else:
+            run_ids = [row[0] for row in conn.execute("SELECT run_id FROM runs")]
+    finally:
+        conn.close()
+
+    #Rolling values need the whole curves: recomputed run by run
+    if run_ids is not None:
+        import metrics
+        tables = []
+        for run_id in run_ids:
+            equity, close, trades = load_equity_matrix(run_id, profiles=None if profile is None else [profile],
+                                                       start=start, end=end, path=path)
+            if not equity.empty:
+                tables.append(metrics.compute_metrics(equity, close, trades).assign(run_id=run_id))
+        table = pd.concat(tables).reset_index().set_index(['run_id', 'symbol', 'profile']) if tables else pd.DataFrame(columns=[metric])
+    if metric not in table.columns:
+        raise KeyError(f"Unknown metric {metric!r}")
+    table = table[metric].dropna().sort_values(ascending=ascending, kind='stable').head(top)
+    return table.reset_index()[columns] if len(table) else pd.DataFrame(columns=columns)
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the results store")
+    parser.add_argument('--runs', action='store_true', help="List the stored runs")
+    parser.add_argument('--best', default=None, help="Metric to rank by, e.g. 'Sharpe Ratio'")
+    parser.add_argument('--profile', choices=PROFILES, default=None)
+    parser.add_argument('--start', default=None, help="Period start (YYYY-MM-DD)")
+    parser.add_argument('--end', default=None, help="Period end (YYYY-MM-DD)")
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--ascending', action=argparse.BooleanOptionalAction, default=None,
+                        help="Lowest first (default: only for the risk measures in LOWER_IS_BETTER)")
+    parser.add_argument('--record', action='store_true', help="Store the current backtests as a new run")
+    args = parser.parse_args()
+
+    if args.record:
+        record_cycle()
+    if args.best:
+        print(best(args.best, args.profile, args.start, args.end, args.top, ascending=args.ascending).to_string(index=False))
+    if args.runs or not (args.best or args.record):
+        print(list_runs().to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#ROLLING-WINDOW ANALYTICS (SHARPE, VOLATILITY, DRAWDOWN, BETA) FOR ALL EQUITY CURVES AT ONCE
+
+#METHOD: 1. Mean, variance and covariance of every window come from running (cumulative) sums: O(N) per column.
+#        2. Max drawdown inside every window uses block prefix/suffix extremes (van Herk/Gil-Werman): O(N) per column.
+#        3. (symbol, profile) columns are processed together as 2D numpy arrays, in chunks of ROLLING_CHUNK columns
+#           for the summary so memory stays bounded with thousands of columns.
+
+#Libraries
+import lazy
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+#Files
+from account_data import *
+
+#Config
+ROLLING_CHUNK = 256
+
+#Daily returns of every column, skipping dates where that column has no data
+def daily_returns(matrix):
+    previous = matrix.ffill().shift(1)
+    return matrix / previous - 1
+
+#Sums of every window from running sums (row i holds the window ending at i), NaN values are skipped
+def _window_sum(values, window):
+    running = np.cumsum(values, axis=0)
+    sums = running.copy()
+    sums[window:] = running[window:] - running[:-window]
+    return sums
+
+#Count, mean and variance of every window, and covariance with a second series if given
+def rolling_moments(x, window, y=None):
+    valid = ~np.isnan(x)
+    if y is not None:
+        valid &= ~np.isnan(y)
+        y = np.where(valid, y, 0.0)
+    x = np.where(valid, x, 0.0)
+
+    count = _window_sum(valid.astype(float), window)
+    n = np.where(count > 0, count, np.nan)
+    n1 = np.where(count > 1, count - 1, np.nan)
+
+    sum_x = _window_sum(x, window)
+    mean_x = sum_x / n
+    var_x = np.maximum(_window_sum(x * x, window) - sum_x * mean_x, 0) / n1
+    if y is None:
+        return count, mean_x, var_x
+
+    sum_y = _window_sum(y, window)
+    var_y = np.maximum(_window_sum(y * y, window) - sum_y * sum_y / n, 0) / n1
+    cov = (_window_sum(x * y, window) - sum_x * sum_y / n) / n1
+    return count, mean_x, var_x, cov, var_y
+
+#Max drawdown (as a positive fraction) inside every window ending at each row
+def rolling_max_drawdown(equity, window):
+    #Holidays and dates before a curve starts are flat, so they never change a drawdown
+    values = pd.DataFrame(equity).ffill().bfill().to_numpy(dtype=float)
+    rows, cols = values.shape
+    blocks = -(-rows // window)
+    padded = np.full((blocks * window, cols), np.nan)
+    padded[:rows] = values
+    padded[rows:] = values[-1]
+    x = padded.reshape(blocks, window, cols)
+    flip = x[:, ::-1]
+
+    #Prefix of each block: running peak, trough and best drawdown from the block start
+    prefix_max = np.maximum.accumulate(x, axis=1)
+    prefix_min = np.minimum.accumulate(x, axis=1)
+    prefix_dd = np.maximum.accumulate(1 - x / prefix_max, axis=1)
+
+    #Suffix of each block: peak, trough and best drawdown up to the block end
+    suffix_max = np.maximum.accumulate(flip, axis=1)[:, ::-1]
+    suffix_min = np.minimum.accumulate(flip, axis=1)[:, ::-1]
+    suffix_dd = np.maximum.accumulate((1 - suffix_min / x)[:, ::-1], axis=1)[:, ::-1]
+
+    prefix_max, prefix_min, prefix_dd, suffix_max, suffix_min, suffix_dd = (
+        a.reshape(blocks * window, cols) for a in (prefix_max, prefix_min, prefix_dd, suffix_max, suffix_min, suffix_dd))
+
+    #A window [start, end] is a block suffix plus the next block's prefix
+    result = np.full((rows, cols), np.nan)
+    end = np.arange(window - 1, rows)
+    start = end - window + 1
+    aligned = (start % window == 0)[:, None]
+    cross = 1 - prefix_min[end] / suffix_max[start]
+    combined = np.maximum(np.maximum(suffix_dd[start], prefix_dd[end]), cross)
+    result[end] = np.where(aligned, prefix_dd[end], combined)
+    return result
+
+#Rolling Sharpe, volatility, max drawdown, beta and correlation vs each symbol's close for every column
+def rolling_analytics(equity, close, window=ROLLING_WINDOW, min_periods=None):
+    if equity.empty:
+        return {}
+
+    window = min(window, len(equity))
+    min_periods = window // 2 if min_periods is None else min_periods
+
+    #float32 storage (low-memory mode): compute in float64
+    equity = equity.astype(float)
+    close = close.reindex(columns=equity.columns).astype(float)
+
+    returns = daily_returns(equity).to_numpy(dtype=float)
+    bench_returns = daily_returns(close).to_numpy(dtype=float)
+
+    own_count, own_mean, own_var = rolling_moments(returns, window)
+    count, _, var, cov, bench_var = rolling_moments(returns, window, bench_returns)
+    std = np.sqrt(own_var)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std != 0, own_mean / std * np.sqrt(TRADING_DAYS), 0)
+        beta = cov / bench_var
+        correlation = cov / np.sqrt(var * bench_var)
+
+    enough = own_count >= min_periods
+    paired = count >= min_periods
+    drawdown = rolling_max_drawdown(equity, window)
+
+    frame = lambda values, mask: pd.DataFrame(np.where(mask, values, np.nan), index=equity.index, columns=equity.columns)
+    return {
+        'sharpe': frame(sharpe, enough),
+        'volatility': frame(std * np.sqrt(TRADING_DAYS) * 100, enough),
+        'max_drawdown': frame(-drawdown * 100, enough),
+        'beta': frame(beta, paired),
+        'correlation': frame(correlation, paired),
+    }
+
+#Full-period beta/correlation and latest rolling values, one row per (symbol, profile)
+def rolling_summary(equity, close, window=ROLLING_WINDOW):
+    if equity.empty:
+        return pd.DataFrame()
+
+    chunks = []
+    for start in range(0, equity.shape[1], ROLLING_CHUNK):
+        columns = equity.columns[start:start + ROLLING_CHUNK]
+        full = rolling_analytics(equity[columns], close, window=len(equity), min_periods=2)
+        last = rolling_analytics(equity[columns], close, window=window)
+        chunks.append(pd.DataFrame({
+            'Beta': full['beta'].iloc[-1],
+            'Correlation': full['correlation'].iloc[-1],
+            'Rolling Sharpe (last)': last['sharpe'].ffill().iloc[-1],
+            'Rolling Volatility (last, %)': last['volatility'].ffill().iloc[-1],
+        }))
+    summary = pd.concat(chunks)
+    summary.index.names = ['symbol', 'profile']
+    return summary
+
+def main():
+    import metrics
+    equity, close, trades = metrics.load_equity_matrix()
+    summary = rolling_summary(equity, close)
+    print(summary.to_string())
+    return summary
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#DEPENDENCY-AWARE TASK SCHEDULER: RERUNS ONLY THE TASKS WHOSE INPUT FILES CHANGED
+
+#SCHEDULER: 1. Every task declares the files it reads (inputs) and writes (outputs).
+#           2. A task depends on the tasks that write its inputs (derived automatically).
+#           3. Inputs are fingerprinted (content hash, reused while size/mtime do not change) and stored after
+#              each successful run: a task is skipped when its fingerprint is unchanged and its outputs exist.
+#           4. Independent tasks run concurrently on an event loop: I/O-bound tasks in a thread pool, CPU-bound tasks
+#              in a process pool, non thread-safe tasks in the event loop thread.
+
+#Libraries
+import asyncio
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+#Files
+from account_data import *
+import instrumentation
+
+#Config
+STATE_PATH = f"{OUTPUT_DIR}/.pipeline_state.json"
+
+class Task:
+    #func(*args) is the work, returning False marks the task as failed
+    #always: run every cycle regardless of fingerprints (e.g. fetching new data)
+    #thread_safe: False forces the task onto the calling thread (e.g. matplotlib)
+    #cpu_bound: run in a worker process (func and args must be picklable, e.g. module-level functions)
+    def __init__(self, name, func, args=(), inputs=(), outputs=(), always=False, thread_safe=True, cpu_bound=False):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.always = always
+        self.thread_safe = thread_safe
+        self.cpu_bound = cpu_bound
+        self.deps = set()
+
+    def __repr__(self):
+        return f"Task({self.name})"
+
+#Load stored fingerprints (task -> inputs hash) and file hashes (path -> [size, mtime, hash])
+def load_state(path=STATE_PATH):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        state = {}
+    state.setdefault('tasks', {})
+    state.setdefault('files', {})
+    return state
+
+#Atomic write so a crash never leaves a half-written state file
+def save_state(state, path=STATE_PATH):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+#Content hash of one file, rehashed only if its size or mtime changed
+def file_hash(path, file_cache):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return 'missing'
+
+    cached = file_cache.get(path)
+    if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    file_cache[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+    return file_cache[path][2]
+
+#Fingerprint of all the inputs of a task
+def fingerprint(task, file_cache):
+    digest = hashlib.sha1(task.name.encode())
+    for path in sorted(task.inputs):
+        digest.update(path.encode())
+        digest.update(file_hash(path, file_cache).encode())
+    return digest.hexdigest()
+
+#Link every task to the tasks producing its inputs
+def resolve_dependencies(tasks):
+    producers = {}
+    for task in tasks:
+        for path in task.outputs:
+            producers[path] = task.name
+    for task in tasks:
+        task.deps = {producers[path] for path in task.inputs if path in producers and producers[path] != task.name}
+    return {task.name: task for task in tasks}
+
+#Tasks whose dependencies can never be satisfied (cycles and everything downstream of them)
+def find_unreachable(graph):
+    remaining = {name: set(task.deps) for name, task in graph.items()}
+    ready = [name for name, deps in remaining.items() if not deps]
+    while ready:
+        done = ready.pop()
+        del remaining[done]
+        for name, deps in remaining.items():
+            if done in deps:
+                deps.discard(done)
+                if not deps:
+                    ready.append(name)
+    return set(remaining)
+
+def _execute(func, args, name):
+    try:
+        result = func(*args)
+    except Exception as e:
+        print(f"[ERROR] Task {name} failed: {e}")
+        return False
+    return result is not False
+
+#Runs in a worker process: also returns the instrumentation records taken there
+def _execute_in_process(func, args, name):
+    ok = _execute(func, args, name)
+    return ok, instrumentation.drain()
+
+#Run the task graph on the running event loop, returns {task name: 'done' | 'skipped' | 'failed' | 'blocked'}
+#thread_pool runs I/O-bound tasks, process_pool the cpu_bound ones (created for this run if not given,
+#processes=0 keeps them in threads), non thread-safe tasks run on the event loop thread
+async def run_tasks_async(tasks, max_workers=PIPELINE_WORKERS, processes=PIPELINE_PROCESSES, state_path=STATE_PATH,
+                          thread_pool=None, process_pool=None):
+    graph = resolve_dependencies(tasks)
+    state = load_state(state_path)
+    status = {}
+    finished = {name: asyncio.Event() for name in graph}
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+
+    own_threads = thread_pool is None
+    if own_threads:
+        thread_pool = ThreadPoolExecutor(max_workers=max_workers)
+    own_processes = process_pool is None and processes > 0 and any(task.cpu_bound for task in tasks)
+    if own_processes:
+        #Forked workers must not send back records collected by the parent before the fork
+        process_pool = ProcessPoolExecutor(max_workers=processes, initializer=instrumentation.drain)
+
+    #Decide whether a ready task has to run (fingerprints are taken after all its dependencies finished)
+    def needs_run(task):
+        if task.always or any(not os.path.exists(path) for path in task.outputs):
+            return True
+        return state['tasks'].get(task.name) != fingerprint(task, state['files'])
+
+    async def execute(task):
+        if not task.thread_safe:
+            return _execute(task.func, task.args, task.name)
+        if task.cpu_bound and process_pool is not None:
+            try:
+                ok, records = await loop.run_in_executor(process_pool, _execute_in_process, task.func, task.args, task.name)
+            except Exception as e:  #e.g. the worker died or the arguments cannot be pickled
+                print(f"[ERROR] Task {task.name} failed: {e}")
+                return False
+            instrumentation.extend(records)
+            return ok
+        return await loop.run_in_executor(thread_pool, _execute, task.func, task.args, task.name)
+
+    async def run(task):
+        for dep in task.deps:
+            await finished[dep].wait()
+
+        if any(status[dep] in ('failed', 'blocked') for dep in task.deps):
+            print(f"[WARNING] Task {task.name} not run: an upstream task failed")
+            status[task.name] = 'blocked'
+        elif not needs_run(task):
+            status[task.name] = 'skipped'
+        elif await execute(task):
+            status[task.name] = 'done'
+            state['tasks'][task.name] = fingerprint(task, state['files'])
+        else:
+            status[task.name] = 'failed'
+            state['tasks'].pop(task.name, None)
+        finished[task.name].set()
+
+    #Circular dependencies: nothing in them can ever start
+    unreachable = find_unreachable(graph)
+    for name in unreachable:
+        print(f"[ERROR] Task {name} has circular dependencies")
+        status[name] = 'blocked'
+
+    try:
+        await asyncio.gather(*(run(task) for name, task in graph.items() if name not in unreachable))
+    finally:
+        if own_threads:
+            thread_pool.shutdown()
+        if own_processes:
+            process_pool.shutdown()
+
+    save_state(state, state_path)
+
+    counts = {s: list(status.values()).count(s) for s in ('done', 'skipped', 'failed', 'blocked')}
+    print(f"[INFO] Tasks: {counts['done']} run, {counts['skipped']} unchanged, "
+          f"{counts['failed']} failed, {counts['blocked']} blocked ({time.perf_counter() - start:.2f}s)")
+    return status
+
+#Same, from synchronous code (all tasks in threads, non thread-safe ones in the calling thread)
+def run_tasks(tasks, max_workers=PIPELINE_WORKERS, processes=0, state_path=STATE_PATH):
+    return asyncio.run(run_tasks_async(tasks, max_workers, processes, state_path))
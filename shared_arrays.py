@@ -0,0 +1,133 @@
+#ZERO-COPY PRICE ARRAYS IN OS SHARED MEMORY FOR PARALLEL WORKERS
+
+#SHARED ARRAYS: 1. SharedFrame copies the index and columns of a frame once into a shared memory block; workers get
+#                  a small handle (block name, column offsets) instead of the data, so dispatching a task costs the
+#                  same whatever the history length.
+#               2. attach(handle) maps the block and rebuilds the frame on top of it without copying (read-only).
+#               3. Cleanup: the owner unlinks the block on close()/exit; if the owner is killed, Python's resource
+#                  tracker unlinks it, and blocks left by dead owners are removed by cleanup_stale() (called
+#                  whenever a new block is created). Attaching never takes ownership.
+
+#Libraries
+import atexit
+import itertools
+import os
+import secrets
+from multiprocessing import resource_tracker, shared_memory
+import lazy
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+#Config
+PREFIX = "trading_"
+SHM_DIR = "/dev/shm"  #Linux: where the blocks live (other platforms free them with the last handle)
+ALIGN = 64
+
+_counter = itertools.count()
+_owned = {}
+_attached = {}
+
+#Block name: prefix, owner pid (for stale cleanup), random suffix
+def _block_name():
+    return f"{PREFIX}{os.getpid()}_{next(_counter)}_{secrets.token_hex(4)}"
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+#Unlink the blocks whose owner process is gone, returns their names
+def cleanup_stale():
+    if not os.path.isdir(SHM_DIR):
+        return []
+    removed = []
+    for name in os.listdir(SHM_DIR):
+        if not name.startswith(PREFIX):
+            continue
+        try:
+            pid = int(name[len(PREFIX):].split('_')[0])
+        except ValueError:
+            continue
+        if pid != os.getpid() and not _pid_alive(pid):
+            try:
+                os.unlink(os.path.join(SHM_DIR, name))
+                removed.append(name)
+            except OSError:
+                pass
+    return removed
+
+class SharedFrame:
+    #Index (datetime) and numeric columns of df in one block
+    def __init__(self, df):
+        cleanup_stale()
+        arrays = {'__index__': df.index.to_numpy()}
+        arrays.update({col: df[col].to_numpy() for col in df.columns})
+
+        layout, offset = {}, 0
+        for name, array in arrays.items():
+            offset = -(-offset // ALIGN) * ALIGN
+            layout[name] = (offset, array.dtype.str, array.shape)
+            offset += array.nbytes
+
+        self.shm = shared_memory.SharedMemory(name=_block_name(), create=True, size=max(offset, 1))
+        for name, array in arrays.items():
+            start, dtype, shape = layout[name]
+            np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=start)[...] = array
+        self.handle = {'name': self.shm.name, 'layout': layout, 'index_name': df.index.name}
+        _owned[self.shm.name] = self
+
+    def close(self):
+        if _owned.pop(self.shm.name, None) is None:
+            return
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+#Read-only frame on top of a shared block (the block stays mapped while this process lives)
+def attach(handle):
+    name = handle['name']
+    shm = _attached.get(name)
+    if shm is None:
+        shm = shared_memory.SharedMemory(name=name)
+        #Before Python 3.13 attaching registers the block with the resource tracker, which would unlink it
+        #when this worker exits: only the owner may unlink
+        if name not in _owned:
+            try:
+                resource_tracker.unregister(shm._name, 'shared_memory')
+            except Exception:
+                pass
+        _attached[name] = shm
+
+    columns = {}
+    for col, (start, dtype, shape) in handle['layout'].items():
+        array = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start)
+        array.flags.writeable = False
+        columns[col] = array
+    index = pd.DatetimeIndex(columns.pop('__index__'), name=handle['index_name'], copy=False)
+    return pd.DataFrame(columns, index=index, copy=False)
+
+#Unmap every attached block (frames built on them must not be used afterwards)
+def detach_all():
+    for shm in _attached.values():
+        try:
+            shm.close()
+        except BufferError:
+            pass  #Still referenced by a live frame, unmapped at exit
+    _attached.clear()
+
+@atexit.register
+def _close_owned():
+    for frame in list(_owned.values()):
+        frame.close()
@@ -7,75 +7,129 @@
 #          5. PAC profile: Monthly buy-and-hold strategy
 
 #Libraries
-import pandas as pd
-import talib as ta
+import json
+import os
+import time
+import lazy
+np = lazy.module('numpy')
+ta = lazy.module('talib')
 
 #Files
 from account_data import *
+import instrumentation
+import memory
+import pac
+import resample
+
+#Paths
+def historical_path(sym):
+    return resample.timeframe_path(sym, 'D')
+
+def signals_path(sym, profile, timeframe='D'):
+    return f"{OUTPUT_DIR}/{sym.lower().replace('^', '')}_signals_{profile}{resample.suffix(timeframe)}.csv"
+
+#Compact record of the last bar (read by order dispatch instead of the whole signals file)
+def latest_path(sym, profile, timeframe='D'):
+    return f"{OUTPUT_DIR}/{sym.lower().replace('^', '')}_latest_{profile}{resample.suffix(timeframe)}.json"
+
+#Load data (daily store or a cached timeframe of it, resample.py)
+def load_prices(sym, timeframe='D'):
+    return resample.load(sym, timeframe)
+
+#Save the state of the last bar: date, signal, SL/TP reference prices from the close and indicator values
+#(atomic replace, so a reader never sees a half-written file). None when there is no bar
+def save_latest_state(sym, profile, df, timeframe='D'):
+    if df.empty:
+        print(f"[WARNING] {sym} {profile}: no bars, latest state not saved")
+        return None
+    last = df.iloc[-1]
+    signal = int(last['Signal'])
+    sl = tp = None
+    if profile != 'pac' and signal != 0:
+        idx = PROFILES.index(profile)
+        sl = float(last['close'] * (1 - signal * STOP_LOSS[idx]))
+        tp = float(last['close'] * (1 + signal * TAKE_PROFIT[idx]))
+
+    state = {
+        'symbol': sym,
+        'profile': profile,
+        'bar_date': df.index[-1].strftime('%Y-%m-%d'),
+        'signal': signal,
+        'close': float(last['close']),
+        'sl': sl,
+        'tp': tp,
+        'indicators': {col: float(last[col]) for col in ('SMA_short', 'SMA_long', 'RSI') if col in df.columns},
+        'updated_at': time.time(),
+    }
+    path = latest_path(sym, profile, timeframe)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+    return state
+
+#Generate and save the signals of one symbol for one profile
+@instrumentation.timed('signals')
+def generate_signals(sym, profile, df_base=None, timeframe='D'):
+    if df_base is None:
+        df_base = load_prices(sym, timeframe)
+    idx = PROFILES.index(profile)
+    df = df_base.copy(deep=False)  #New columns only: share the price data instead of copying it
+
+    if profile == 'pac':
+        #PAC strategy: Buy signal on first trading day of each month
+        df['Signal'] = pac.schedule(df.index).astype(memory.SIGNAL_DTYPE)
+
+        # Save the last bar only: the backtest finds the purchase days from the prices (pac.py)
+        if save_latest_state(sym, profile, df, timeframe) is not None:
+            print(f"{sym} — {profile} latest signal → {latest_path(sym, profile, timeframe)}")
+        return df
+
+    # Parameters of this risk profile
+    df = compute_signals(df, SHORT_MA[idx], LONG_MA[idx], RSI_PERIOD[idx], RSI_OVERBOUGHT[idx], RSI_OVERSOLD[idx])
+
+    # Save
+    out_path = signals_path(sym, profile, timeframe)
+    df.to_csv(out_path)
+    save_latest_state(sym, profile, df, timeframe)
+    print(f"{sym} — {profile} signals → {out_path}")
+    return df
+
+#SMA crossover confirmed by RSI on a copy of the price frame (any parameter set, e.g. for sweeps)
+def compute_signals(df, short_ma, long_ma, rsi_period, overbought, oversold):
+    df = df.copy(deep=False)  #New columns only: share the price data instead of copying it
+
+    # Indicators
+    df['SMA_short'] = df['close'].rolling(short_ma).mean()
+    df['SMA_long']  = df['close'].rolling(long_ma).mean()
+    df['RSI'] = ta.RSI(df['close'].to_numpy(dtype=np.float64), timeperiod=rsi_period)  #TA-Lib needs float64
+
+    df['Signal'] = crossover_signals(df['SMA_short'].to_numpy(), df['SMA_long'].to_numpy(), df['RSI'].to_numpy(),
+                                     overbought, oversold)
+
+    #Clean
+    return memory.compact(df.dropna())
+
+#Signal array from the indicator arrays (NaN compares False: no signal during the warm-up)
+def crossover_signals(sma_short, sma_long, rsi, overbought, oversold):
+    # Crossover detection
+    prev_short = np.concatenate(([np.nan], sma_short[:-1]))
+    prev_long = np.concatenate(([np.nan], sma_long[:-1]))
+
+    signal = np.zeros(len(sma_short), dtype=memory.SIGNAL_DTYPE)
+
+    #Buy signal
+    signal[(sma_short > sma_long) & (prev_short <= prev_long) & (rsi <= oversold)] = 1
+
+    #Sell signal
+    signal[(sma_short < sma_long) & (prev_short >= prev_long) & (rsi >= overbought)] = -1
+    return signal
 
-#Load data
 def main():
     for sym in SYMBOLS:
-        base_path = f"{OUTPUT_DIR}/{sym.lower().replace('^', '')}_historical.csv"
-        df_base = pd.read_csv(base_path, index_col='date', parse_dates=True).sort_index()
-
-        for idx, profile in enumerate(PROFILES):
-            df = df_base.copy()
-
-            if profile == 'pac':
-                #PAC strategy: Buy signal on first trading day of each month
-                df['Signal'] = 0
-                df['year_month'] = df.index.to_period('M')
-                
-                # Mark first trading day of each month with buy signal
-                first_days = df.groupby('year_month').head(1).index
-                df.loc[first_days, 'Signal'] = 1
-                
-                df = df.drop(columns=['year_month'])
-                
-                # Save and continue to next profile (skip moving average calculations)
-                out_path = f"{OUTPUT_DIR}/{sym.lower().replace('^', '')}_signals_{profile}.csv"
-                df.to_csv(out_path)
-                print(f"{sym} — {profile} signals → {out_path}")
-                continue
-                
-            else:
-                # Load parameters for this risk profile
-                short_ma = SHORT_MA[idx]
-                long_ma  = LONG_MA[idx]
-                rsi_period = RSI_PERIOD[idx]
-                overbought = RSI_OVERBOUGHT[idx]
-                oversold   = RSI_OVERSOLD[idx]
-
-                # Indicators
-                df['SMA_short'] = df['close'].rolling(short_ma).mean()
-                df['SMA_long']  = df['close'].rolling(long_ma).mean()
-                df['RSI'] = ta.RSI(df['close'], timeperiod=rsi_period)
-
-                # Crossover detection
-                df['Prev_short'] = df['SMA_short'].shift(1)
-                df['Prev_long']  = df['SMA_long'].shift(1)
-
-                df['Signal'] = 0
-
-                #Buy signal
-                df.loc[(df['SMA_short'] > df['SMA_long']) &
-                       (df['Prev_short'] <= df['Prev_long']) &
-                       (df['RSI'] <= oversold), 'Signal'] = 1
-
-                #Sell signal
-                df.loc[(df['SMA_short'] < df['SMA_long']) &
-                       (df['Prev_short'] >= df['Prev_long']) &
-                       (df['RSI'] >= overbought), 'Signal'] = -1
-
-                #Clean
-                df = df.drop(columns=['Prev_short', 'Prev_long'])
-
-            # Save (for non-PAC profiles, PAC already saved)
-            df = df.dropna()
-            out_path = f"{OUTPUT_DIR}/{sym.lower().replace('^', '')}_signals_{profile}.csv"
-            df.to_csv(out_path)
-            print(f"{sym} — {profile} signals → {out_path}")
+        df_base = load_prices(sym)
+        for profile in PROFILES:
+            generate_signals(sym, profile, df_base)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
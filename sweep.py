@@ -0,0 +1,376 @@
+#DISTRIBUTED PARAMETER SWEEP: A COORDINATOR HANDS OUT WORK UNITS TO WORKERS OVER TCP AND RANKS THE RESULTS
+
+#SWEEP: 1. The grid (SMA windows, RSI period/thresholds, stop loss, trailing stop) is split into work units of
+#          (symbol, block of SWEEP_BLOCK_SIZE parameter sets).
+#       2. Workers connect to the coordinator (multiprocessing.connection: TCP + authkey), ask for a unit, evaluate it
+#          and send back one row per parameter set. Prices travel with the first unit of each symbol, so workers on
+#          other machines need nothing but this repository; workers on the coordinator's machine get a shared memory
+#          handle instead (SWEEP_SHARED_MEMORY, shared_arrays.py): the prices are copied once, not once per worker.
+#       3. A unit is retried (up to SWEEP_MAX_RETRIES) when its worker reports an error, disconnects or holds it
+#          longer than SWEEP_LEASE_SECONDS.
+#       4. Rows are appended to output/sweep_results.partial.csv as they arrive and ranked into
+#          output/sweep_results.csv at the end.
+#       5. The channel exchanges pickles: whoever knows the key can run code on the coordinator and the workers.
+#          Local runs use a random key per run. The key of a cluster comes from the SWEEP_AUTHKEY environment
+#          variable (or account_data); a coordinator without one generates and prints it, and no coordinator or worker
+#          binds/connects to a non-loopback address with an empty or the public placeholder key.
+#       Local test: python sweep.py --workers 4
+#       Cluster:    python sweep.py --role coordinator --host 0.0.0.0   (on one machine, prints the key if unset)
+#                   SWEEP_AUTHKEY=<key> python sweep.py --role worker --host <coordinator>  (every machine, once per core)
+
+#Libraries
+import argparse
+import itertools
+import math
+import multiprocessing
+import ipaddress
+import os
+import secrets
+import socket
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Client, Listener
+import lazy
+np = lazy.module('numpy')
+pd = lazy.module('pandas')
+
+#Files
+from account_data import *
+import backtesting
+import shared_arrays
+import signals_generation
+
+#Config
+RESULTS_PATH = f"{OUTPUT_DIR}/sweep_results.csv"
+PARTIAL_PATH = f"{OUTPUT_DIR}/sweep_results.partial.csv"
+DEFAULT_GRID = {
+    'short_ma': [5, 10, 20, 30, 50],
+    'long_ma': [50, 100, 150, 200],
+    'rsi_period': [9, 14, 21],
+    'overbought': [40, 50, 60, 70],
+    'oversold': [30, 40, 50, 60],
+    'stop_loss': [0.02, 0.03, 0.05],
+    'trail': [0.015, 0.02, 0.03],
+}
+METRICS = ['sharpe', 'total_return', 'max_drawdown']
+WEAK_AUTHKEYS = {'', 'change-me'}  #Unset or the placeholder once shipped in account_data
+
+#Only this machine can reach the address
+def is_loopback(host):
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+#Key of a coordinator/worker on host: SWEEP_AUTHKEY from the environment or account_data. Refused on a non-loopback
+#address when unset or the placeholder; a coordinator without a key generates one (printed for the workers)
+def cluster_authkey(host, role):
+    key = os.environ.get('SWEEP_AUTHKEY', SWEEP_AUTHKEY)
+    if key not in WEAK_AUTHKEYS:
+        return key.encode()
+    if role == 'coordinator' and key == '':
+        key = secrets.token_hex(16)
+        print(f"[SWEEP] Generated key for this run, start the workers with SWEEP_AUTHKEY={key}")
+        return key.encode()
+    if not is_loopback(host):
+        raise SystemExit(f"[ERROR] Refusing to {'bind' if role == 'coordinator' else 'connect'} to {host} without a "
+                         f"secret key: the sweep channel runs pickles. Set SWEEP_AUTHKEY in the environment")
+    return key.encode()
+
+#Every parameter set of a grid (short window always shorter than the long one)
+def expand_grid(grid):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())
+            if values[names.index('short_ma')] < values[names.index('long_ma')]]
+
+#max_params: only the first N parameter sets of the grid (quick runs)
+def make_units(symbols, grid, block_size=SWEEP_BLOCK_SIZE, max_params=None):
+    params = expand_grid(grid)[:max_params]
+    units = []
+    for sym in symbols:
+        for start in range(0, len(params), block_size):
+            units.append({'id': len(units), 'symbol': sym, 'params': params[start:start + block_size]})
+    return units
+
+#Sharpe ratio, total return (%) and max drawdown (%, negative) of an equity curve
+def equity_stats(equity, capital):
+    equity = np.asarray(equity, dtype=float)
+    returns = np.diff(equity) / equity[:-1]
+    std = returns.std(ddof=1) if len(returns) > 1 else 0.0
+    peak = np.maximum.accumulate(equity)
+    return {'sharpe': float(returns.mean() / std * math.sqrt(TRADING_DAYS)) if std > 0 else 0.0,
+            'total_return': float((equity[-1] / capital - 1) * 100),
+            'max_drawdown': float(((equity - peak) / peak).min() * 100)}
+
+#Backtest one parameter set on a price frame (trading profile rules, 'high' is only the base for the stops),
+#served from the backtest cache when the set was already run on the same prices (repeated sweeps, optimizer --verify)
+def evaluate(df_base, params):
+    df = signals_generation.compute_signals(df_base, params['short_ma'], params['long_ma'], params['rsi_period'],
+                                            params['overbought'], params['oversold'])
+    if df.empty:
+        return None
+    result = backtesting.run_backtest(df, 'high', params['stop_loss'], params['trail'])
+    stats = equity_stats(result['equity']['equity'].to_numpy(), INITIAL_DEPOSIT / len(SYMBOLS))
+    stats['trades'] = result['summary']['total_closed']
+    return stats
+
+def evaluate_unit(unit, df_base):
+    rows = []
+    for params in unit['params']:
+        stats = evaluate(df_base, params)
+        if stats is not None:
+            rows.append({'symbol': unit['symbol'], **params, **stats})
+    return rows
+
+class Coordinator:
+    def __init__(self, units, address, authkey, prices, max_retries=SWEEP_MAX_RETRIES, lease_seconds=SWEEP_LEASE_SECONDS,
+                 partial_path=PARTIAL_PATH):
+        self.units = {unit['id']: unit for unit in units}
+        self.pending = deque(self.units)
+        self.in_flight = {}  #unit id -> (worker, deadline)
+        self.attempts = {uid: 0 for uid in self.units}
+        self.done = set()
+        self.failed = {}
+        self.rows = []
+        self.workers = {}  #worker -> units completed
+        self.address = address
+        self.authkey = authkey
+        self.prices = prices
+        self.shared = {}  #symbol -> SharedFrame, published on the first request of a local worker
+        self.host = socket.gethostname()
+        self.max_retries = max_retries
+        self.lease_seconds = lease_seconds
+        self.partial_path = partial_path
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+    def _finish_if_done(self):
+        if len(self.done) + len(self.failed) == len(self.units):
+            self.finished.set()
+
+    #Put a unit back in the queue, or give up on it after max_retries (lock held)
+    def _retry(self, uid, reason):
+        self.in_flight.pop(uid, None)
+        self.attempts[uid] += 1
+        if self.attempts[uid] > self.max_retries:
+            self.failed[uid] = reason
+            print(f"[ERROR] Unit {uid} ({self.units[uid]['symbol']}) failed {self.attempts[uid]} times: {reason}")
+            self._finish_if_done()
+        else:
+            print(f"[WARNING] Unit {uid} ({self.units[uid]['symbol']}) retried: {reason}")
+            self.pending.appendleft(uid)
+
+    def _next_unit(self, worker):
+        with self.lock:
+            if not self.pending:
+                return None
+            uid = self.pending.popleft()
+            self.in_flight[uid] = (worker, time.monotonic() + self.lease_seconds)
+            return self.units[uid]
+
+    def _complete(self, worker, uid, rows):
+        with self.lock:
+            if uid in self.done or uid in self.failed:
+                return  #Late duplicate of a retried unit
+            self.in_flight.pop(uid, None)
+            self.done.add(uid)
+            self.rows += rows
+            self.workers[worker] = self.workers.get(worker, 0) + 1
+            if rows:
+                pd.DataFrame(rows).to_csv(self.partial_path, mode='a', header=not os.path.exists(self.partial_path), index=False)
+            self._finish_if_done()
+
+    #Prices of a symbol for a worker: shared memory handle on this machine, the frame itself elsewhere
+    def _prices_message(self, symbol, host):
+        if not SWEEP_SHARED_MEMORY or host != self.host:
+            return {'prices': self.prices[symbol], 'shared': None}
+        with self.lock:
+            if symbol not in self.shared:
+                self.shared[symbol] = shared_arrays.SharedFrame(self.prices[symbol])
+            return {'prices': None, 'shared': self.shared[symbol].handle}
+
+    #One thread per worker connection
+    def _serve(self, conn):
+        worker, host, sent_prices = None, None, set()
+        try:
+            while not self.finished.is_set():
+                message = conn.recv()
+                worker = message.get('worker', worker)
+                host = message.get('host', host)
+                if message['type'] == 'result':
+                    self._complete(worker, message['id'], message['rows'])
+                elif message['type'] == 'error':
+                    with self.lock:
+                        if message['id'] in self.in_flight:
+                            self._retry(message['id'], f"{worker}: {message['error']}")
+
+                unit = self._next_unit(worker)
+                if unit is None:
+                    #Nothing queued: wait for units in flight elsewhere (they may come back for a retry)
+                    conn.send({'type': 'stop'} if self.finished.is_set() else {'type': 'wait', 'seconds': 0.5})
+                    continue
+                if unit['symbol'] in sent_prices:
+                    prices = {'prices': None, 'shared': None}
+                else:
+                    prices = self._prices_message(unit['symbol'], host)
+                    sent_prices.add(unit['symbol'])
+                conn.send({'type': 'unit', **unit, **prices})
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self.lock:
+                for uid, (holder, _) in list(self.in_flight.items()):
+                    if holder == worker:
+                        self._retry(uid, f"{worker} disconnected")
+            conn.close()
+
+    #Listen and accept workers in the background, returns the address (port 0: chosen by the OS)
+    def start(self):
+        self.listener = Listener(self.address, authkey=self.authkey)
+        self.address = self.listener.address
+        print(f"[SWEEP] Coordinator on {self.address}: {len(self.units)} units")
+
+        def accept():
+            while not self.finished.is_set():
+                try:
+                    conn = self.listener.accept()
+                except OSError:
+                    return
+                threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+        threading.Thread(target=accept, daemon=True).start()
+        return self.address
+
+    #Wait until every unit is done or failed (re-queueing expired leases), returns the collected rows
+    def wait(self):
+        while not self.finished.wait(1):
+            with self.lock:
+                now = time.monotonic()
+                for uid, (holder, deadline) in list(self.in_flight.items()):
+                    if deadline < now:
+                        self._retry(uid, f"lease expired on {holder}")
+        self.listener.close()
+        for frame in self.shared.values():
+            frame.close()
+        return pd.DataFrame(self.rows)
+
+    def run(self):
+        self.start()
+        return self.wait()
+
+#Worker loop: evaluate units until the coordinator says stop
+def run_worker(address, authkey, name=None, connect_timeout=30):
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            conn = Client(address, authkey=authkey)
+            break
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+    prices, evaluated = {}, 0
+    ready = {'type': 'ready', 'worker': name, 'host': socket.gethostname()}
+    conn.send(ready)
+    try:
+        while True:
+            message = conn.recv()
+            if message['type'] == 'stop':
+                break
+            if message['type'] == 'wait':
+                time.sleep(message['seconds'])
+                conn.send(ready)
+                continue
+            if message['shared'] is not None:
+                prices[message['symbol']] = shared_arrays.attach(message['shared'])
+            elif message['prices'] is not None:
+                prices[message['symbol']] = message['prices']
+            try:
+                rows = evaluate_unit(message, prices[message['symbol']])
+                conn.send({'type': 'result', 'worker': name, 'id': message['id'], 'rows': rows})
+                evaluated += len(message['params'])
+            except Exception as e:
+                conn.send({'type': 'error', 'worker': name, 'id': message['id'], 'error': repr(e)})
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+    return evaluated
+
+#Rank by a metric (all of them are better when higher, drawdowns are negative)
+def rank(results, metric='sharpe'):
+    if results.empty:
+        return results
+    return results.sort_values(metric, ascending=False).reset_index(drop=True)
+
+#Coordinator and local worker processes on this machine
+def run_local(symbols=SYMBOLS, grid=DEFAULT_GRID, workers=SWEEP_WORKERS, metric='sharpe', block_size=SWEEP_BLOCK_SIZE,
+              max_params=None, authkey=None):
+    authkey = authkey or secrets.token_bytes(32)  #Only the local workers need it
+    units = make_units(symbols, grid, block_size, max_params)
+    prices = {sym: signals_generation.load_prices(sym) for sym in symbols}
+    coordinator = Coordinator(units, ('127.0.0.1', 0), authkey, prices)
+    address = coordinator.start()
+
+    start = time.perf_counter()
+    processes = [multiprocessing.Process(target=run_worker, args=(address, authkey, f"local:{i}")) for i in range(workers)]
+    for process in processes:
+        process.start()
+    table = rank(coordinator.wait(), metric)
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join(timeout=10)
+
+    report(coordinator, table, elapsed, metric)
+    return table
+
+def report(coordinator, table, elapsed, metric, top=10):
+    evaluated = sum(len(coordinator.units[uid]['params']) for uid in coordinator.done)
+    if not table.empty:
+        table.to_csv(RESULTS_PATH, index=False)
+    retries = sum(coordinator.attempts.values())
+    print(f"\n======= SWEEP ({len(coordinator.units)} units, {len(coordinator.workers)} workers) =======")
+    print(f"Evaluated       : {evaluated} parameter sets in {elapsed:.1f}s ({evaluated / elapsed:.1f}/s)")
+    print(f"Retries         : {retries}, failed units: {len(coordinator.failed)}")
+    for worker, count in sorted(coordinator.workers.items()):
+        print(f"  {worker:<24} {count} units")
+    if not table.empty:
+        print(f"\nTop {top} by {metric} → {RESULTS_PATH}")
+        print(table.head(top).to_string(index=False))
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed parameter sweep")
+    parser.add_argument('--role', choices=['local', 'coordinator', 'worker'], default='local')
+    parser.add_argument('--host', default='127.0.0.1', help="Coordinator address (0.0.0.0 to accept remote workers)")
+    parser.add_argument('--port', type=int, default=SWEEP_PORT)
+    parser.add_argument('--workers', type=int, default=SWEEP_WORKERS, help="Local worker processes (role local)")
+    parser.add_argument('--symbols', default=','.join(SYMBOLS))
+    parser.add_argument('--metric', choices=METRICS, default='sharpe')
+    parser.add_argument('--block-size', type=int, default=SWEEP_BLOCK_SIZE)
+    parser.add_argument('--max-params', type=int, default=None, help="Only the first N parameter sets (quick runs)")
+    args = parser.parse_args()
+
+    if args.role == 'worker':
+        evaluated = run_worker((args.host, args.port), cluster_authkey(args.host, 'worker'), connect_timeout=300)
+        print(f"[SWEEP] Worker done: {evaluated} parameter sets")
+        return
+
+    symbols = [s.strip() for s in args.symbols.split(',') if s.strip()]
+    if args.role == 'local':
+        run_local(symbols, DEFAULT_GRID, args.workers, args.metric, args.block_size, args.max_params)
+        return
+
+    units = make_units(symbols, DEFAULT_GRID, args.block_size, args.max_params)
+    prices = {sym: signals_generation.load_prices(sym) for sym in symbols}
+    coordinator = Coordinator(units, (args.host, args.port), cluster_authkey(args.host, 'coordinator'), prices)
+    start = time.perf_counter()
+    table = rank(coordinator.run(), args.metric)
+    report(coordinator, table, time.perf_counter() - start, args.metric)
+
+if __name__ == "__main__":
+    main()